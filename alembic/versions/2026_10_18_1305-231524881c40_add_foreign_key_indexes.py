@@ -0,0 +1,42 @@
+"""Add foreign key indexes
+
+Revision ID: 231524881c40
+Revises: 5d1936327a3a
+Create Date: 2026-10-18 13:05:37.512904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '231524881c40'
+down_revision: Union[str, None] = '5d1936327a3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so every
+# index is built in an autocommit block and the tables stay writable meanwhile.
+# If a build fails, drop the INVALID index it leaves behind before retrying.
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_tweets_user_id_created_at_id', 'tweets', ['user_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_images_tweet_id'), 'images', ['tweet_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_tweet_likes_tweet_id'), 'tweet_likes', ['tweet_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_user_followers_follower'), 'user_followers', ['follower'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_home_timelines_tweet_id'), 'home_timelines', ['tweet_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_home_timelines_author_id'), 'home_timelines', ['author_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_home_timelines_author_id'), table_name='home_timelines', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_home_timelines_tweet_id'), table_name='home_timelines', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_user_followers_follower'), table_name='user_followers', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_tweet_likes_tweet_id'), table_name='tweet_likes', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_images_tweet_id'), table_name='images', postgresql_concurrently=True)
+        op.drop_index('ix_tweets_user_id_created_at_id', table_name='tweets', postgresql_concurrently=True)
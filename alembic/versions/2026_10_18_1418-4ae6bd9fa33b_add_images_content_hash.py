@@ -0,0 +1,30 @@
+"""Add images content hash
+
+Revision ID: 4ae6bd9fa33b
+Revises: 231524881c40
+Create Date: 2026-10-18 14:18:06.240517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4ae6bd9fa33b'
+down_revision: Union[str, None] = '231524881c40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_images_content_hash'), 'images', ['content_hash'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_images_content_hash'), table_name='images', postgresql_concurrently=True)
+    op.drop_column('images', 'content_hash')
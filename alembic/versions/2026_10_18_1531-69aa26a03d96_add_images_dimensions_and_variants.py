@@ -0,0 +1,30 @@
+"""Add images dimensions and variants
+
+Revision ID: 69aa26a03d96
+Revises: 4ae6bd9fa33b
+Create Date: 2026-10-18 15:31:42.918305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '69aa26a03d96'
+down_revision: Union[str, None] = '4ae6bd9fa33b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('width', sa.Integer(), nullable=True))
+    op.add_column('images', sa.Column('height', sa.Integer(), nullable=True))
+    op.add_column('images', sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('images', 'variants')
+    op.drop_column('images', 'height')
+    op.drop_column('images', 'width')
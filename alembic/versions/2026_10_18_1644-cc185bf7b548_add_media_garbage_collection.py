@@ -0,0 +1,43 @@
+"""Add media garbage collection
+
+Revision ID: cc185bf7b548
+Revises: 69aa26a03d96
+Create Date: 2026-10-18 16:44:09.371620
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cc185bf7b548'
+down_revision: Union[str, None] = '69aa26a03d96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Existing images get the migration time as their upload time, so unattached
+# ones are swept only after a full grace period from now.
+
+
+def upgrade() -> None:
+    op.create_table('pending_file_deletions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('src', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('images', sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_images_unattached_created_at', 'images', ['created_at'], unique=False, postgresql_where=sa.text('tweet_id IS NULL'), postgresql_concurrently=True)
+        op.create_index(op.f('ix_images_src'), 'images', ['src'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_images_src'), table_name='images', postgresql_concurrently=True)
+        op.drop_index('ix_images_unattached_created_at', table_name='images', postgresql_where=sa.text('tweet_id IS NULL'), postgresql_concurrently=True)
+    op.drop_column('images', 'created_at')
+    op.drop_table('pending_file_deletions')
@@ -0,0 +1,35 @@
+"""Create media uploads table
+
+Revision ID: 9bb53c9615c1
+Revises: cc185bf7b548
+Create Date: 2026-10-18 17:57:31.408215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9bb53c9615c1'
+down_revision: Union[str, None] = 'cc185bf7b548'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('media_uploads',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_media_uploads_expires_at'), 'media_uploads', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_media_uploads_expires_at'), table_name='media_uploads')
+    op.drop_table('media_uploads')
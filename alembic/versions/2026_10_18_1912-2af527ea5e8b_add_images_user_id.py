@@ -0,0 +1,36 @@
+"""Add images user id
+
+Revision ID: 2af527ea5e8b
+Revises: 9bb53c9615c1
+Create Date: 2026-10-18 19:12:46.150937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2af527ea5e8b'
+down_revision: Union[str, None] = '9bb53c9615c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Images uploaded before this revision have no owner. Those still unattached
+# can no longer be attached to a tweet and are removed by the media sweeper.
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(op.f('images_user_id_fkey'), 'images', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_images_user_id'), 'images', ['user_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_images_user_id'), table_name='images', postgresql_concurrently=True)
+    op.drop_constraint(op.f('images_user_id_fkey'), 'images', type_='foreignkey')
+    op.drop_column('images', 'user_id')
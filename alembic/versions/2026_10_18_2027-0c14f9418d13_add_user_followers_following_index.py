@@ -0,0 +1,33 @@
+"""Add user followers following index
+
+Revision ID: 0c14f9418d13
+Revises: 2af527ea5e8b
+Create Date: 2026-10-18 20:27:31.482906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c14f9418d13'
+down_revision: Union[str, None] = '2af527ea5e8b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The composite index serves the keyset pagination of the users a user follows
+# and makes the single-column index on `follower` redundant.
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_user_followers_follower_user_id', 'user_followers', ['follower', 'user_id'], unique=False, postgresql_concurrently=True)
+        op.drop_index(op.f('ix_user_followers_follower'), table_name='user_followers', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_user_followers_follower'), 'user_followers', ['follower'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_user_followers_follower_user_id', table_name='user_followers', postgresql_concurrently=True)
@@ -0,0 +1,37 @@
+"""Add media uploads user id
+
+Revision ID: 9d9a5a889187
+Revises: 0c14f9418d13
+Create Date: 2026-10-18 21:36:08.271534
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d9a5a889187'
+down_revision: Union[str, None] = '0c14f9418d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Uploads started before this revision have no owner. They can no longer be
+# continued or finalized, and their staging files are removed by the media
+# sweeper once they expire.
+
+
+def upgrade() -> None:
+    op.add_column('media_uploads', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(op.f('media_uploads_user_id_fkey'), 'media_uploads', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_media_uploads_user_id'), 'media_uploads', ['user_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_media_uploads_user_id'), table_name='media_uploads', postgresql_concurrently=True)
+    op.drop_constraint(op.f('media_uploads_user_id_fkey'), 'media_uploads', type_='foreignkey')
+    op.drop_column('media_uploads', 'user_id')
@@ -15,6 +15,14 @@ that handles route requests.
 by view functions.
 5. The 'main' module acts as the central module where the initialization and
 configuration of the web server and its components take place.
+6. The 'cli' module contains administrative commands, such as the repair of
+denormalized counters.
+7. The 'media_sweeper' module deletes unattached images and the files of
+deleted images in the background.
+8. The 'like_buffer' module buffers likes and unlikes in the worker process and
+writes them to the database in bulk.
+9. The 'follow_suggestions' module suggests users to follow from the shared
+follow graph snapshot and keeps the snapshot up to date.
 """
 
 __all__ = ("settings",)
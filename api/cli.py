@@ -0,0 +1,187 @@
+"""
+Administrative commands of the microblog API.
+
+Run them from the project root, for example::
+
+    python -m api.cli reconcile-counters
+    python -m api.cli backfill-timelines
+    python -m api.cli bulk-follow 1 imported_ids.txt
+"""
+
+import argparse
+import asyncio
+import sys
+
+from .core import db_helper, settings
+from .db import likes_qr, timelines_qr, users_qr
+from .follow_suggestions import rebuild_social_graph
+from .media_sweeper import sweep_media
+
+
+async def reconcile_counters(batch_size: int) -> None:
+    """
+    Repair drift of the denormalized like and follow counters.
+
+    Parameters
+    ----------
+    batch_size : int
+        The size of the ID range repaired in one transaction.
+    """
+    session = db_helper.get_scoped_session()
+    try:
+        tweets_repaired = await likes_qr.reconcile_like_counts(session, batch_size=batch_size)
+        users_repaired = await users_qr.reconcile_follow_counts(session, batch_size=batch_size)
+    finally:
+        await session.close()
+    print(f"Repaired like counters of {tweets_repaired} tweets")
+    print(f"Repaired follow counters of {users_repaired} users")
+
+
+async def backfill_timelines(batch_size: int) -> None:
+    """
+    Fill the home timelines from the follows and tweets that predate them.
+
+    Run it once after upgrading past the migration that creates `home_timelines`;
+    later follows and tweets fill the timelines by themselves.
+
+    Parameters
+    ----------
+    batch_size : int
+        The size of the user ID range backfilled in one transaction.
+    """
+    session = db_helper.get_scoped_session()
+    try:
+        inserted = await timelines_qr.backfill_home_timelines(session, batch_size=batch_size)
+    finally:
+        await session.close()
+    print(f"Inserted {inserted} home timeline entries")
+
+
+async def sweep_media_now(batch_size: int) -> None:
+    """
+    Delete expired unattached images and remove the queued files right away.
+
+    Parameters
+    ----------
+    batch_size : int
+        The maximum number of images or files handled in one transaction.
+    """
+    session = db_helper.get_scoped_session()
+    try:
+        images_deleted, files_removed = await sweep_media(session, batch_size=batch_size)
+    finally:
+        await session.close()
+    print(f"Deleted {images_deleted} unattached images")
+    print(f"Removed {files_removed} image files")
+
+
+async def rebuild_social_graph_now() -> None:
+    """Rebuild the follow graph snapshot from `user_followers`."""
+    session = db_helper.get_scoped_session()
+    try:
+        await rebuild_social_graph(session)
+    finally:
+        await session.close()
+    print("Rebuilt the follow graph snapshot")
+
+
+async def bulk_follow(follower_id: int, user_ids: list[int], batch_size: int) -> None:
+    """
+    Make a user follow a list of users, reporting the outcome for every user.
+
+    Parameters
+    ----------
+    follower_id : int
+        The ID of the user who follows the other users.
+    user_ids : list of int
+        The IDs of the users to follow.
+    batch_size : int
+        The number of users followed in one transaction.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    counts: dict[str, int] = {}
+    session = db_helper.get_scoped_session()
+    try:
+        for batch_start in range(0, len(user_ids), batch_size):
+            outcomes = await users_qr.create_user_following_nodes(
+                session,
+                follower_id=follower_id,
+                user_ids=user_ids[batch_start:batch_start + batch_size],
+            )
+            for user_id, outcome in outcomes.items():
+                print(f"{user_id}\t{outcome}")
+                counts[outcome] = counts.get(outcome, 0) + 1
+    finally:
+        await session.close()
+    summary = ", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items()))
+    print(f"User {follower_id}: {summary or 'nothing to do'}")
+
+
+def _read_user_ids(path: str) -> list[int]:
+    """Read user IDs separated by whitespace or commas from a file, or stdin for "-"."""
+    if path == "-":
+        content = sys.stdin.read()
+    else:
+        with open(path) as ids_file:
+            content = ids_file.read()
+    return [int(user_id) for user_id in content.replace(",", " ").split()]
+
+
+def main() -> None:
+    """Parse the command line and run the requested command."""
+    parser = argparse.ArgumentParser(prog="python -m api.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reconcile_parser = commands.add_parser(
+        "reconcile-counters",
+        help="Recompute like and follow counters that drifted from the source tables.",
+    )
+    reconcile_parser.add_argument("--batch-size", type=int, default=10000)
+
+    backfill_parser = commands.add_parser(
+        "backfill-timelines",
+        help="Fill the home timelines from the follows and tweets that predate them.",
+    )
+    backfill_parser.add_argument("--batch-size", type=int, default=10000)
+
+    sweep_parser = commands.add_parser(
+        "sweep-media",
+        help="Delete images never attached to a tweet and the files of deleted images.",
+    )
+    sweep_parser.add_argument("--batch-size", type=int, default=settings.media_sweep_batch_size)
+
+    follow_parser = commands.add_parser(
+        "bulk-follow",
+        help="Make a user follow the users listed in a file, such as an imported follow list.",
+    )
+    follow_parser.add_argument("follower_id", type=int)
+    follow_parser.add_argument(
+        "ids_file",
+        help='File of user IDs separated by whitespace or commas, "-" for stdin.',
+    )
+    follow_parser.add_argument(
+        "--batch-size", type=int, default=settings.bulk_follow_max_ids,
+    )
+
+    commands.add_parser(
+        "rebuild-social-graph",
+        help="Rebuild the follow graph snapshot used for follow suggestions.",
+    )
+
+    args = parser.parse_args()
+    if args.command == "reconcile-counters":
+        asyncio.run(reconcile_counters(args.batch_size))
+    elif args.command == "backfill-timelines":
+        asyncio.run(backfill_timelines(args.batch_size))
+    elif args.command == "sweep-media":
+        asyncio.run(sweep_media_now(args.batch_size))
+    elif args.command == "bulk-follow":
+        asyncio.run(
+            bulk_follow(args.follower_id, _read_user_ids(args.ids_file), args.batch_size),
+        )
+    elif args.command == "rebuild-social-graph":
+        asyncio.run(rebuild_social_graph_now())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,25 @@ Components of the package.
 1. The 'config' module contains the main configurations of the
 microblog application.
 2. The 'dbhelper' module ensures interaction with the database.
+3. The 'auth_cache' module caches the users authenticated by API key.
+4. The 'imaging' module renders the derivatives of uploaded images on a
+process pool.
+5. The 'render_cache' module keeps the images resized on demand on disk.
+6. The 'social_graph' module keeps a compact snapshot of the follow graph
+shared by the worker processes.
 """
 
 __all__ = (
+    "api_key_cache",
     "db_helper",
+    "render_cache",
     "settings",
+    "social_graph",
     "test_db_helper",
 )
 
+from .auth_cache import api_key_cache
 from .config import settings
 from .dbhelper import db_helper, test_db_helper
+from .render_cache import render_cache
+from .social_graph import social_graph
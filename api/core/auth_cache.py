@@ -0,0 +1,204 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from .config import settings
+
+_MISSING = object()
+
+
+class ApiKeyCache:
+    """
+    In-process TTL and LRU cache of the users authenticated by API key.
+
+    Known keys are kept for `ttl` seconds and unknown keys for `negative_ttl`
+    seconds, so repeated requests with a wrong key do not reach the database
+    either. Both kinds are kept in separate maps, each evicting its least
+    recently used key beyond its own size limit, so a flood of wrong keys cannot
+    evict the known ones. Every worker process has its own cache and is only
+    invalidated by the changes it commits itself, so `ttl` bounds how long
+    another worker may serve a user that was changed or deleted.
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups answered with a cached user.
+    negative_hits : int
+        The number of lookups answered with a cached unknown key.
+    misses : int
+        The number of lookups that had to query the database.
+
+    Methods
+    -------
+    get(self, api_key: str)
+        Returns the cached user, None for a cached unknown key, or `MISSING`.
+    set(self, api_key: str, user: Any)
+        Caches the user of an API key, or None for an unknown key.
+    invalidate(self, api_key: str)
+        Forgets an API key.
+    invalidate_user(self, user_id: int)
+        Forgets every API key cached for a user.
+    clear(self)
+        Forgets every API key and resets the counters.
+    stats(self)
+        Returns the counters and the sizes of the cache.
+    """
+
+    MISSING = _MISSING
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        negative_max_size: int,
+        negative_ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize an empty cache.
+
+        Parameters
+        ----------
+        max_size : int
+            The maximum number of cached known API keys.
+        ttl : float
+            The lifetime of a cached user, in seconds.
+        negative_max_size : int
+            The maximum number of cached unknown API keys.
+        negative_ttl : float
+            The lifetime of a cached unknown key, in seconds.
+        clock : callable
+            The source of the current time, in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_max_size = negative_max_size
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._unknown_keys: OrderedDict[str, float] = OrderedDict()
+        self._keys_by_user: dict[int, set[str]] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, api_key: str) -> Any:
+        """
+        Look up an API key.
+
+        Parameters
+        ----------
+        api_key : str
+            The API key of the request.
+
+        Returns
+        -------
+        Any
+            The cached user, None if the key is cached as unknown, or `MISSING`
+            if the key has to be looked up in the database.
+        """
+        now = self._clock()
+        entry = self._entries.get(api_key)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(api_key)
+            self.hits += 1
+            return entry[1]
+
+        expires_at = self._unknown_keys.get(api_key)
+        if expires_at is not None and expires_at > now:
+            self._unknown_keys.move_to_end(api_key)
+            self.negative_hits += 1
+            return None
+
+        if entry is not None or expires_at is not None:
+            self.invalidate(api_key)
+        self.misses += 1
+        return self.MISSING
+
+    def set(self, api_key: str, user: Any) -> None:
+        """
+        Cache the result of an API key lookup.
+
+        Parameters
+        ----------
+        api_key : str
+            The API key of the request.
+        user : Any
+            The user with an `id` attribute, or None if the key is unknown.
+        """
+        self.invalidate(api_key)
+        if user is None:
+            self._unknown_keys[api_key] = self._clock() + self.negative_ttl
+            while len(self._unknown_keys) > self.negative_max_size:
+                self._unknown_keys.popitem(last=False)
+            return
+
+        self._entries[api_key] = (self._clock() + self.ttl, user)
+        self._keys_by_user.setdefault(user.id, set()).add(api_key)
+        while len(self._entries) > self.max_size:
+            self.invalidate(next(iter(self._entries)))
+
+    def invalidate(self, api_key: str) -> None:
+        """
+        Forget an API key.
+
+        Parameters
+        ----------
+        api_key : str
+            The API key to forget.
+        """
+        self._unknown_keys.pop(api_key, None)
+        entry = self._entries.pop(api_key, None)
+        if entry is None:
+            return
+        user_keys = self._keys_by_user.get(entry[1].id, set())
+        user_keys.discard(api_key)
+        if not user_keys:
+            self._keys_by_user.pop(entry[1].id, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Forget every API key cached for a user.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the changed or deleted user.
+        """
+        for api_key in list(self._keys_by_user.get(user_id, ())):
+            self.invalidate(api_key)
+
+    def clear(self) -> None:
+        """Forget every API key and reset the counters."""
+        self._entries.clear()
+        self._unknown_keys.clear()
+        self._keys_by_user.clear()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return the counters and the sizes of the cache.
+
+        Returns
+        -------
+        dict of str to int
+            The keys "size" (cached users), "negative_size" (cached unknown keys),
+            "hits", "negative_hits" and "misses".
+        """
+        return {
+            "size": len(self._entries),
+            "negative_size": len(self._unknown_keys),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+        }
+
+
+api_key_cache = ApiKeyCache(
+    max_size=settings.auth_cache_size,
+    ttl=settings.auth_cache_ttl,
+    negative_max_size=settings.auth_cache_negative_size,
+    negative_ttl=settings.auth_cache_negative_ttl,
+)
@@ -1,9 +1,174 @@
+import asyncio
+import time
 from asyncio import current_task
+from typing import Sequence
 
-from sqlalchemy.ext.asyncio import async_scoped_session, async_sessionmaker, create_async_engine
+from sqlalchemy import Float, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_scoped_session,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from .config import settings
 
+_REPLICATION_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """,
+).columns(lag=Float)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Connection pool that measures how long checkouts take.
+
+    The time is counted from the checkout request until a connection is handed
+    out, so it includes both waiting for a free connection and opening a new one.
+
+    Attributes
+    ----------
+    checkouts : int
+        The number of completed checkouts.
+    timeouts : int
+        The number of checkouts that failed after `pool_timeout`.
+    wait_time_total : float
+        The total time spent in checkouts, in seconds.
+    wait_time_max : float
+        The longest checkout, in seconds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the pool with zeroed counters.
+
+        Parameters
+        ----------
+        *args
+            Positional arguments of `AsyncAdaptedQueuePool`.
+        **kwargs
+            Keyword arguments of `AsyncAdaptedQueuePool`.
+        """
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        self.checkouts += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        return connection
+
+
+def _create_engine(url: str, echo: bool = False) -> AsyncEngine:
+    """
+    Create an engine with the pool configured by the `db_pool_*` settings.
+
+    Parameters
+    ----------
+    url : str
+        The URL for connecting to the database.
+    echo : bool
+        Flag indicating whether SQL queries should be logged.
+
+    Returns
+    -------
+    AsyncEngine
+        The asynchronous database engine.
+    """
+    return create_async_engine(
+        url=url,
+        echo=echo,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            "timeout": settings.db_connect_timeout,
+            "command_timeout": settings.db_command_timeout,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "statement_cache_size": settings.db_statement_cache_size,
+        },
+    )
+
+
+def _create_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    """
+    Create the session factory bound to an engine.
+
+    Parameters
+    ----------
+    engine : AsyncEngine
+        The engine the sessions are bound to.
+
+    Returns
+    -------
+    async_sessionmaker
+        The factory for creating asynchronous sessions.
+    """
+    return async_sessionmaker(
+        bind=engine,
+        autoflush=False,
+        autocommit=False,
+        expire_on_commit=False,
+    )
+
+
+class Replica:
+    """
+    A read replica of the primary database.
+
+    Attributes
+    ----------
+    engine : sqlalchemy.ext.asyncio.AsyncEngine
+        The asynchronous engine connected to the replica.
+    session_factory : sqlalchemy.ext.asyncio.async_sessionmaker
+        The factory for creating sessions bound to the replica.
+    healthy : bool
+        Whether the replica is in rotation. Replicas join the rotation after
+        their first successful health check.
+    lag : float or None
+        The replication lag measured by the last health check, in seconds, or None
+        if the replica is unreachable or not streaming from the primary.
+    """
+
+    def __init__(self, url: str, echo: bool = False):
+        """
+        Initialize a replica out of rotation.
+
+        Parameters
+        ----------
+        url : str
+            The URL for connecting to the replica.
+        echo : bool
+            Flag indicating whether SQL queries should be logged.
+        """
+        self.engine = _create_engine(url, echo=echo)
+        self.session_factory = _create_session_factory(self.engine)
+        self.healthy = False
+        self.lag: float | None = None
+
 
 class DatabaseHelper:
     """
@@ -11,6 +176,7 @@ class DatabaseHelper:
 
     This class provides methods for creating and configuring
     an asynchronous database engine and managed sessions.
+    Reads may be routed to replicas, while writes always go to the primary.
 
     Attributes
     ----------
@@ -20,40 +186,50 @@ class DatabaseHelper:
         The factory for creating asynchronous sessions.
     sc_session : sqlalchemy.ext.asyncio.async_scoped_session
         The managed session associated with the current task.
+    replicas : list of Replica
+        The read replicas of the primary database.
 
     Methods
     -------
-    init(self, url: str, echo: bool = False)
+    init(self, url: str, echo: bool = False, replica_urls: Sequence[str] = ())
         Initializes an instance of DatabaseHelper with the specified parameters.
     get_scoped_session(self)
         Returns a new managed session associated with the current task.
+    get_scoped_read_session(self, last_write_at: float | None = None)
+        Returns a new managed session for reading, bound to a replica if possible.
+    check_replicas(self)
+        Measures the lag of the replicas and updates the rotation.
+    monitor_replicas(self, interval: float)
+        Checks the replicas periodically until cancelled.
+    pool_stats(self)
+        Returns the live statistics of the connection pool.
+    replica_stats(self)
+        Returns the state of every replica.
     """
 
-    def __init__(self, url: str, echo: bool = False):
+    def __init__(self, url: str, echo: bool = False, replica_urls: Sequence[str] = ()):
         """
         Initialize an instance of DatabaseHelper.
 
+        The connection pool is configured with the `db_pool_*` and connection
+        settings of `settings`.
+
         Parameters
         ----------
         url : str
             The URL for connecting to the database.
         echo : bool
             Flag indicating whether SQL queries should be logged.
+        replica_urls : sequence of str
+            The URLs for connecting to the read replicas.
         """
-        self.engine = create_async_engine(
-            url=url,
-            echo=echo,
-        )
-        self.session_factory = async_sessionmaker(
-            bind=self.engine,
-            autoflush=False,
-            autocommit=False,
-            expire_on_commit=False,
-        )
+        self.engine = _create_engine(url, echo=echo)
+        self.session_factory = _create_session_factory(self.engine)
         self.sc_session = async_scoped_session(
             session_factory=self.session_factory,
             scopefunc=current_task,
         )
+        self.replicas = [Replica(replica_url, echo=echo) for replica_url in replica_urls]
 
     def get_scoped_session(self):
         """
@@ -69,9 +245,129 @@ class DatabaseHelper:
             scopefunc=current_task,
         )
 
+    def get_scoped_read_session(self, last_write_at: float | None = None):
+        """
+        Return a new managed session for reading, associated with the current task.
+
+        The session is bound to the healthy replica with the fewest checked out
+        connections. It falls back to the primary when no replica is healthy or
+        when the client wrote within `settings.db_read_your_writes_window` seconds,
+        so users always see their own writes.
+
+        Parameters
+        ----------
+        last_write_at : float, optional
+            The UNIX time of the last write of the client, taken from the
+            `settings.db_last_write_cookie` cookie.
+
+        Returns
+        -------
+        sqlalchemy.ext.asyncio.async_scoped_session
+            The managed session.
+        """
+        healthy_replicas = [replica for replica in self.replicas if replica.healthy]
+        pinned = (
+            last_write_at is not None
+            and time.time() - last_write_at < settings.db_read_your_writes_window
+        )
+        if not healthy_replicas or pinned:
+            return self.get_scoped_session()
+
+        replica = min(
+            healthy_replicas,
+            key=lambda candidate: candidate.engine.pool.checkedout(),  # type: ignore
+        )
+        return async_scoped_session(
+            session_factory=replica.session_factory,
+            scopefunc=current_task,
+        )
+
+    async def check_replicas(self) -> None:
+        """
+        Measure the replication lag of every replica and update the rotation.
+
+        A replica stays in rotation while its lag is at most
+        `settings.db_replica_max_lag` seconds. Unreachable replicas are dropped, and
+        so are replicas whose WAL receiver is not streaming, since they stop
+        receiving changes. A streaming replica that has replayed all the WAL it
+        received counts as not lagging, even if the primary has been idle for a
+        while. The status of the WAL receiver is only visible to roles with
+        `pg_read_all_stats`, so the replicas must be accessed with such a role.
+        """
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    replica.lag = await conn.scalar(_REPLICATION_LAG_QUERY)
+            except (SQLAlchemyError, OSError):
+                replica.healthy, replica.lag = False, None
+            else:
+                replica.healthy = (
+                    replica.lag is not None and replica.lag <= settings.db_replica_max_lag
+                )
+
+    async def monitor_replicas(self, interval: float) -> None:
+        """
+        Check the replicas every `interval` seconds until cancelled.
+
+        Parameters
+        ----------
+        interval : float
+            The number of seconds between two health checks.
+        """
+        while True:
+            await self.check_replicas()
+            await asyncio.sleep(interval)
+
+    def pool_stats(self) -> dict[str, int | float]:
+        """
+        Return the live statistics of the connection pool.
+
+        Returns
+        -------
+        dict of str to int or float
+            The pool size, the numbers of idle, checked out and overflow connections,
+            and the checkout counters with wait times in milliseconds.
+        """
+        pool = self.engine.pool
+        stats: dict[str, int | float] = {
+            "size": pool.size(),  # type: ignore
+            "checked_in": pool.checkedin(),  # type: ignore
+            "checked_out": pool.checkedout(),  # type: ignore
+            "overflow": max(pool.overflow(), 0),  # type: ignore
+        }
+        if isinstance(pool, InstrumentedQueuePool):
+            stats.update(
+                checkouts=pool.checkouts,
+                timeouts=pool.timeouts,
+                wait_time_total_ms=round(pool.wait_time_total * 1000, 3),
+                wait_time_max_ms=round(pool.wait_time_max * 1000, 3),
+            )
+        return stats
+
+    def replica_stats(self) -> list[dict[str, bool | float | int | None]]:
+        """
+        Return the state of every replica.
+
+        Returns
+        -------
+        list of dict
+            For every replica, in configuration order, whether it is in rotation,
+            its last measured lag in seconds and its checked out connections.
+        """
+        return [
+            {
+                "healthy": replica.healthy,
+                "lag": replica.lag,
+                "checked_out": replica.engine.pool.checkedout(),  # type: ignore
+            }
+            for replica in self.replicas
+        ]
+
 
 db_helper = DatabaseHelper(
     url=settings.db_url,
+    echo=settings.db_echo,
+    replica_urls=settings.db_replica_urls,
 )
 test_db_helper = DatabaseHelper(
     url=settings.test_db_url,
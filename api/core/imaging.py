@@ -0,0 +1,242 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+from .config import settings
+
+_executor: ProcessPoolExecutor | None = None
+_pending_slots: asyncio.Semaphore | None = None
+
+
+def render_variants(
+    image_path: str,
+    content_hash: str,
+    variant_sizes: dict[str, int],
+    quality: int,
+) -> dict:
+    """
+    Render the WebP derivatives of an image next to the original file.
+
+    Every variant is scaled down to fit a square of its size, never up, with the
+    EXIF orientation applied and no metadata copied. Variants already on disk are
+    not rendered again, so identical uploads share their derivatives. Each worker
+    writes under a temporary name of its own and renames the file once complete,
+    so workers rendering the same upload do not write into each other's files.
+    This function runs in a worker process of the image pool.
+
+    Parameters
+    ----------
+    image_path : str
+        The path of the original image.
+    content_hash : str
+        The content hash of the original image, used to name the variants.
+    variant_sizes : dict of str to int
+        The maximum width and height of every variant, by variant name.
+    quality : int
+        The WebP quality of the variants.
+
+    Returns
+    -------
+    dict
+        The keys "width" and "height" of the original and the key "variants"
+        mapping every variant name to the file name, width and height of the variant.
+
+    Raises
+    ------
+    PIL.UnidentifiedImageError
+        If the file is not an image Pillow can read.
+    """
+    image_dir = os.path.dirname(image_path)
+    variants = {}
+    with PILImage.open(image_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in {"RGB", "RGBA"}:
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for name, size in variant_sizes.items():
+            file_name = f"{content_hash}_{name}.webp"
+            variant_path = os.path.join(image_dir, file_name)
+            if os.path.exists(variant_path):
+                with PILImage.open(variant_path) as variant:
+                    width, height = variant.size
+            else:
+                variant = image.copy()
+                variant.thumbnail((size, size), PILImage.Resampling.LANCZOS)
+                partial_path = f"{variant_path}.{os.getpid()}.part"
+                variant.save(partial_path, format="WEBP", quality=quality)
+                os.replace(partial_path, variant_path)
+                width, height = variant.size
+            variants[name] = {"file_name": file_name, "width": width, "height": height}
+
+        return {"width": image.width, "height": image.height, "variants": variants}
+
+
+def render_resized(
+    image_path: str,
+    target_path: str,
+    max_width: int | None,
+    max_height: int | None,
+    image_format: str,
+    quality: int,
+) -> None:
+    """
+    Render an image scaled down to fit a box, in the given format.
+
+    The EXIF orientation is applied and no metadata is copied. The file is
+    written under a temporary name and renamed once complete, so a reader never
+    sees a partial image. This function runs in a worker process of the image pool.
+
+    Parameters
+    ----------
+    image_path : str
+        The path of the original image.
+    target_path : str
+        The path of the rendered image.
+    max_width : int | None
+        The maximum width of the rendered image, or None for no limit.
+    max_height : int | None
+        The maximum height of the rendered image, or None for no limit.
+    image_format : str
+        The Pillow name of the format of the rendered image, such as "WEBP".
+    quality : int
+        The quality of lossy formats.
+
+    Raises
+    ------
+    PIL.UnidentifiedImageError
+        If the file is not an image Pillow can read.
+    """
+    with PILImage.open(image_path) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in {"RGBA", "LA"} or "transparency" in image.info
+        if image_format == "JPEG" or not has_alpha:
+            image = image.convert("RGB")
+        elif image.mode != "RGBA":
+            image = image.convert("RGBA")
+        image.thumbnail(
+            (max_width or image.width, max_height or image.height),
+            PILImage.Resampling.LANCZOS,
+        )
+        partial_path = f"{target_path}.{os.getpid()}.part"
+        image.save(partial_path, format=image_format, quality=quality)
+        os.replace(partial_path, target_path)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """
+    Return the image process pool, starting it on first use.
+
+    Returns
+    -------
+    ProcessPoolExecutor
+        The pool of `settings.image_workers` worker processes.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.image_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def create_variants(image_path: str, content_hash: str) -> dict:
+    """
+    Render the derivatives of an image on the process pool.
+
+    Parameters
+    ----------
+    image_path : str
+        The path of the original image.
+    content_hash : str
+        The content hash of the original image.
+
+    Returns
+    -------
+    dict
+        The dimensions of the original and its variants, as returned by `render_variants`.
+    """
+    return await _run_in_pool(
+        render_variants,
+        image_path,
+        content_hash,
+        settings.image_variant_sizes,
+        settings.image_webp_quality,
+    )
+
+
+async def resize(
+    image_path: str,
+    target_path: str,
+    max_width: int | None,
+    max_height: int | None,
+    image_format: str,
+) -> None:
+    """
+    Render a resized copy of an image on the process pool.
+
+    Parameters
+    ----------
+    image_path : str
+        The path of the original image.
+    target_path : str
+        The path of the rendered image.
+    max_width : int | None
+        The maximum width of the rendered image, or None for no limit.
+    max_height : int | None
+        The maximum height of the rendered image, or None for no limit.
+    image_format : str
+        The Pillow name of the format of the rendered image, such as "WEBP".
+    """
+    await _run_in_pool(
+        render_resized,
+        image_path,
+        target_path,
+        max_width,
+        max_height,
+        image_format,
+        settings.image_webp_quality,
+    )
+
+
+async def _run_in_pool(function: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a function on the image process pool.
+
+    At most `settings.image_queue_size` calls are submitted to the pool at once;
+    further calls wait, so memory stays bounded under bursts of uploads.
+
+    Parameters
+    ----------
+    function : callable
+        A picklable function of this module.
+    *args : Any
+        The arguments of the function.
+
+    Returns
+    -------
+    Any
+        The return value of the function.
+    """
+    global _pending_slots
+    if _pending_slots is None:
+        _pending_slots = asyncio.Semaphore(settings.image_queue_size)
+    async with _pending_slots:
+        return await asyncio.get_running_loop().run_in_executor(
+            _get_executor(),
+            function,
+            *args,
+        )
+
+
+def shutdown_executor() -> None:
+    """Stop the image process pool, if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1,224 @@
+import asyncio
+import os
+from contextlib import suppress
+from typing import Awaitable, Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+
+
+class RenderCache:
+    """
+    Size-bounded on-disk cache of images rendered on demand.
+
+    A cached file is looked up by name and its access time is refreshed on every
+    hit, without relying on the `atime` mount options of the file system. When the
+    files take more than `max_bytes`, the least recently accessed ones are removed.
+    Concurrent requests for a file that is being rendered wait for the same render
+    instead of starting their own.
+
+    Attributes
+    ----------
+    cache_dir : str
+        The directory of the cached files.
+    max_bytes : int
+        The maximum total size of the cached files.
+    hits : int
+        The number of requests answered with a cached file.
+    misses : int
+        The number of requests that started a render.
+    shared : int
+        The number of requests that waited for a render started by another request.
+    evictions : int
+        The number of files removed to stay below `max_bytes`.
+
+    Methods
+    -------
+    get_or_render(self, name: str, render: Callable[[str], Awaitable[None]])
+        Returns the path of a cached file, rendering it first if needed.
+    stats(self)
+        Returns the counters and the size of the cache.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Initialize a cache over a directory.
+
+        Parameters
+        ----------
+        cache_dir : str
+            The directory of the cached files.
+        max_bytes : int
+            The maximum total size of the cached files.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self._size: int | None = None
+        self._renders: dict[str, asyncio.Task] = {}
+        self._eviction_lock = asyncio.Lock()
+
+    async def get_or_render(
+        self,
+        name: str,
+        render: Callable[[str], Awaitable[None]],
+    ) -> str:
+        """
+        Return the path of a cached file, rendering it first if needed.
+
+        The render runs in its own task, so a client that disconnects does not
+        cancel it for the other requests waiting on it.
+
+        Parameters
+        ----------
+        name : str
+            The file name of the rendered image in the cache directory.
+        render : callable
+            A coroutine function writing the rendered image to the given path.
+
+        Returns
+        -------
+        str
+            The path of the cached file.
+        """
+        path = os.path.join(self.cache_dir, name)
+        if name not in self._renders:
+            try:
+                await run_in_threadpool(os.utime, path)
+            except FileNotFoundError:
+                pass
+            else:
+                self.hits += 1
+                return path
+
+        # Another request may have started the render while the file was looked up.
+        pending_render = self._renders.get(name)
+        if pending_render is not None:
+            self.shared += 1
+            return await asyncio.shield(pending_render)
+
+        self.misses += 1
+        pending_render = asyncio.create_task(self._render(path, render))
+        self._renders[name] = pending_render
+        pending_render.add_done_callback(lambda _: self._forget(name, pending_render))
+        return await asyncio.shield(pending_render)
+
+    def _forget(self, name: str, finished_render: asyncio.Task) -> None:
+        """
+        Drop a finished render, so the next request looks up the file again.
+
+        Parameters
+        ----------
+        name : str
+            The file name of the rendered image.
+        finished_render : asyncio.Task
+            The finished render task.
+        """
+        self._renders.pop(name, None)
+        if not finished_render.cancelled():
+            # Mark a failure as retrieved even if every waiting request disconnected.
+            finished_render.exception()
+
+    async def _render(self, path: str, render: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Render a file into the cache and evict old files if the cache is full.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file to render.
+        render : callable
+            A coroutine function writing the rendered image to the given path.
+
+        Returns
+        -------
+        str
+            The path of the rendered file.
+        """
+        await render(path)
+        async with self._eviction_lock:
+            if self._size is None:
+                self._size = await run_in_threadpool(self._scan_size)
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._size = await run_in_threadpool(self._evict, path)
+        return path
+
+    def _scan_size(self) -> int:
+        """
+        Sum the sizes of the cached files.
+
+        Returns
+        -------
+        int
+            The total size of the cached files in bytes.
+        """
+        with os.scandir(self.cache_dir) as entries:
+            return sum(
+                entry.stat().st_size
+                for entry in entries
+                if entry.is_file() and not entry.name.startswith(".")
+                and not entry.name.endswith(".part")
+            )
+
+    def _evict(self, keep_path: str) -> int:
+        """
+        Remove the least recently accessed files until the cache fits `max_bytes`.
+
+        Parameters
+        ----------
+        keep_path : str
+            The path of the file just rendered, which is never removed.
+
+        Returns
+        -------
+        int
+            The total size of the remaining files in bytes.
+        """
+        with os.scandir(self.cache_dir) as entries:
+            cached_files = [
+                (entry.stat().st_atime, entry.stat().st_size, entry.path)
+                for entry in entries
+                if entry.is_file() and not entry.name.startswith(".")
+                and not entry.name.endswith(".part")
+            ]
+        size = sum(file_size for _, file_size, _ in cached_files)
+        for _, file_size, file_path in sorted(cached_files):
+            if size <= self.max_bytes:
+                break
+            if file_path == keep_path:
+                continue
+            with suppress(FileNotFoundError):
+                os.remove(file_path)
+                self.evictions += 1
+            size -= file_size
+        return size
+
+    def stats(self) -> dict[str, int | None]:
+        """
+        Return the counters and the size of the cache.
+
+        Returns
+        -------
+        dict of str to int or None
+            The keys "size_bytes", which is None until the first render, "hits",
+            "misses", "shared" and "evictions".
+        """
+        return {
+            "size_bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "evictions": self.evictions,
+        }
+
+
+render_cache = RenderCache(
+    cache_dir=settings.dir_rendered_images,
+    max_bytes=settings.render_cache_max_bytes,
+)
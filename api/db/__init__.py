@@ -15,19 +15,32 @@ __all__ = (
     "User",
     "Tweet",
     "Image",
+    "PendingFileDeletion",
+    "MediaUpload",
     "TweetLike",
+    "TimelineEntry",
     "UserFactory",
     "create_fake_data_bd",
     "tweets_qr",
     "users_qr",
     "medias_qr",
     "likes_qr",
+    "timelines_qr",
     "TestUser",
     "TweetFactory",
     "UserOut",
 )
 
-from .db_queries import likes_qr, medias_qr, tweets_qr, users_qr
+from .db_queries import likes_qr, medias_qr, timelines_qr, tweets_qr, users_qr
 from .fake_db_data import TestUser, TweetFactory, UserFactory, create_fake_data_bd
-from .models import Base, Image, Tweet, TweetLike, User
+from .models import (
+    Base,
+    Image,
+    MediaUpload,
+    PendingFileDeletion,
+    TimelineEntry,
+    Tweet,
+    TweetLike,
+    User,
+)
 from .schemas import UserOut
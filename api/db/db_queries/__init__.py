@@ -2,5 +2,6 @@
 Package 'db_queries'.
 
 Each component of the package contains CRUD operations corresponding
-to its named router.
+to its named router. The 'query_helpers' module holds the query building
+blocks they share.
 """
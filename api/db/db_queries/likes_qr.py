@@ -1,8 +1,10 @@
-from sqlalchemy import select
+from collections import Counter
+
+from sqlalchemy import bindparam, delete, func, literal, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import TweetLike
-from .tweets_qr import get_tweet
+from ..models import Tweet, TweetLike
 
 
 async def get_tweet_like(
@@ -43,6 +45,13 @@ async def create_tweet_like(
     """
     Create a like for a tweet if not already liked.
 
+    The like is inserted with `INSERT ... SELECT ... ON CONFLICT DO NOTHING
+    RETURNING`, which inserts nothing if the tweet does not exist or is already
+    liked, so no row is read beforehand. On PostgreSQL the denormalized
+    `Tweet.like_count` is incremented by the same statement through a
+    data-modifying CTE; on other databases it is incremented by a second
+    statement, only when a like was inserted.
+
     Parameters
     ----------
     session : AsyncSession
@@ -57,23 +66,38 @@ async def create_tweet_like(
     bool
         True if the tweet like was successfully created, False otherwise.
     """
-    tweet = await get_tweet(session=session, tweet_id=tweet_id)
-
-    if not tweet:
-        return False
-
-    tweet_like = await get_tweet_like(session, tweet_id, current_user_id)
-
-    if tweet_like:
-        return False
-
-    new_tweet_like = TweetLike(
-        tweet_id=tweet_id,
-        user_id=current_user_id,
+    connection = await session.connection()
+    is_postgresql = connection.dialect.name == "postgresql"
+    insert_tweet_like = postgresql.insert if is_postgresql else sqlite.insert
+    insert_like = (
+        insert_tweet_like(TweetLike)
+        .from_select(
+            ["user_id", "tweet_id"],
+            select(literal(current_user_id), Tweet.id).where(Tweet.id == tweet_id),
+        )
+        .on_conflict_do_nothing()
+        .returning(TweetLike.tweet_id)
     )
-    session.add(new_tweet_like)
+    if is_postgresql:
+        liked = insert_like.cte("liked")
+        liked_tweet_id = await session.scalar(
+            update(Tweet)
+            .where(Tweet.id == liked.c.tweet_id)
+            .values(like_count=Tweet.like_count + 1)
+            .returning(Tweet.id)
+            .execution_options(synchronize_session=False),
+        )
+    else:
+        liked_tweet_id = await session.scalar(insert_like)
+        if liked_tweet_id is not None:
+            await session.execute(
+                update(Tweet)
+                .where(Tweet.id == liked_tweet_id)
+                .values(like_count=Tweet.like_count + 1),
+            )
+
     await session.commit()
-    return True
+    return liked_tweet_id is not None
 
 
 async def delete_tweet_like(
@@ -84,6 +108,10 @@ async def delete_tweet_like(
     """
     Delete a like for a tweet if it exists.
 
+    The like is deleted with `DELETE ... RETURNING`, so it is not loaded first.
+    The denormalized `Tweet.like_count` is decremented by the same statement on
+    PostgreSQL and by a second one on other databases, only when a like was deleted.
+
     Parameters
     ----------
     session : AsyncSession
@@ -98,14 +126,191 @@ async def delete_tweet_like(
     bool
         True if the tweet like was successfully deleted, False otherwise.
     """
-    tweet_like = await get_tweet_like(
-        session=session,
-        tweet_id=tweet_id,
-        user_id=current_user_id,
+    connection = await session.connection()
+    delete_like = (
+        delete(TweetLike)
+        .where(
+            TweetLike.tweet_id == tweet_id,
+            TweetLike.user_id == current_user_id,
+        )
+        .returning(TweetLike.tweet_id)
     )
+    if connection.dialect.name == "postgresql":
+        unliked = delete_like.cte("unliked")
+        unliked_tweet_id = await session.scalar(
+            update(Tweet)
+            .where(Tweet.id == unliked.c.tweet_id)
+            .values(like_count=Tweet.like_count - 1)
+            .returning(Tweet.id)
+            .execution_options(synchronize_session=False),
+        )
+    else:
+        unliked_tweet_id = await session.scalar(delete_like)
+        if unliked_tweet_id is not None:
+            await session.execute(
+                update(Tweet)
+                .where(Tweet.id == unliked_tweet_id)
+                .values(like_count=Tweet.like_count - 1),
+            )
 
-    if not tweet_like:
-        return False
-    await session.delete(tweet_like)
     await session.commit()
-    return True
+    return unliked_tweet_id is not None
+
+
+async def get_like_state(
+    session: AsyncSession,
+    tweet_id: int,
+    user_id: int,
+) -> bool | None:
+    """
+    Tell whether a user likes a tweet, with one statement.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    tweet_id : int
+        The ID of the tweet.
+    user_id : int
+        The ID of the user.
+
+    Returns
+    -------
+    bool or None
+        True if the user likes the tweet, False if not and None if the tweet
+        does not exist.
+    """
+    liked = (
+        select(TweetLike.tweet_id)
+        .where(TweetLike.tweet_id == tweet_id, TweetLike.user_id == user_id)
+        .exists()
+    )
+    return await session.scalar(select(liked).select_from(Tweet).where(Tweet.id == tweet_id))
+
+
+async def apply_like_changes(
+    session: AsyncSession,
+    likes: list[tuple[int, int]],
+    unlikes: list[tuple[int, int]],
+) -> int:
+    """
+    Write a batch of likes and unlikes in one transaction.
+
+    The likes are inserted with one `INSERT ... ON CONFLICT DO NOTHING RETURNING`
+    and the unlikes deleted with one `DELETE ... RETURNING`; likes of tweets that
+    no longer exist are skipped. The denormalized `Tweet.like_count` of every
+    tweet is then shifted once by the number of rows actually inserted and deleted.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    likes : list of tuple of (int, int)
+        The `(user_id, tweet_id)` pairs to like.
+    unlikes : list of tuple of (int, int)
+        The `(user_id, tweet_id)` pairs to unlike.
+
+    Returns
+    -------
+    int
+        The number of likes inserted or deleted.
+    """
+    connection = await session.connection()
+    insert_tweet_like = (
+        postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+    )
+    deltas: Counter[int] = Counter()
+    changed_count = 0
+    if likes:
+        existing_ids = set(
+            await session.scalars(
+                select(Tweet.id).where(Tweet.id.in_({tweet_id for _, tweet_id in likes})),
+            ),
+        )
+        like_rows = [
+            {"user_id": user_id, "tweet_id": tweet_id}
+            for user_id, tweet_id in likes
+            if tweet_id in existing_ids
+        ]
+        if like_rows:
+            liked_ids = list(
+                await session.scalars(
+                    insert_tweet_like(TweetLike)
+                    .values(like_rows)
+                    .on_conflict_do_nothing()
+                    .returning(TweetLike.tweet_id),
+                ),
+            )
+            deltas.update(liked_ids)
+            changed_count += len(liked_ids)
+    if unlikes:
+        unliked_ids = list(
+            await session.scalars(
+                delete(TweetLike)
+                .where(tuple_(TweetLike.user_id, TweetLike.tweet_id).in_(unlikes))
+                .returning(TweetLike.tweet_id)
+                .execution_options(synchronize_session=False),
+            ),
+        )
+        deltas.subtract(unliked_ids)
+        changed_count += len(unliked_ids)
+
+    tweets_table = Tweet.__table__
+    shifts = [
+        {"shifted_id": tweet_id, "delta": delta}
+        for tweet_id, delta in deltas.items()
+        if delta
+    ]
+    if shifts:
+        await session.execute(
+            update(tweets_table)
+            .where(tweets_table.c.id == bindparam("shifted_id"))
+            .values(like_count=tweets_table.c.like_count + bindparam("delta")),
+            shifts,
+        )
+    await session.commit()
+    return changed_count
+
+
+async def reconcile_like_counts(
+    session: AsyncSession,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Repair drift between `Tweet.like_count` and the rows of `tweet_likes`.
+
+    Tweets are processed in ID ranges of `batch_size`, each range in its own
+    transaction, so locks are held only briefly on a large table.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    batch_size : int
+        The size of the tweet ID range repaired in one transaction.
+
+    Returns
+    -------
+    int
+        The number of tweets whose counter was corrected.
+    """
+    max_id = await session.scalar(select(func.max(Tweet.id)))
+    actual_count = (
+        select(func.count())
+        .where(TweetLike.tweet_id == Tweet.id)
+        .scalar_subquery()
+    )
+    repaired = 0
+    for range_start in range(0, (max_id or 0) + 1, batch_size):
+        result = await session.execute(
+            update(Tweet)
+            .where(
+                Tweet.id > range_start,
+                Tweet.id <= range_start + batch_size,
+                Tweet.like_count != actual_count,
+            )
+            .values(like_count=actual_count),
+        )
+        await session.commit()
+        repaired += result.rowcount
+    return repaired
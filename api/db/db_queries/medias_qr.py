@@ -1,18 +1,28 @@
-from sqlalchemy import update
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import Image
+from ..models import Image, MediaUpload, PendingFileDeletion
 
 
 async def create_media(
     session: AsyncSession,
     image_src: str,
+    content_hash: str | None = None,
+    width: int | None = None,
+    height: int | None = None,
+    variants: dict | None = None,
+    user_id: int | None = None,
 ) -> Image:
     """
     Create a new media entry in the database.
 
     This function creates a new media object with the given image source URL,
-    stores it in the database, and returns the created media object.
+    stores it in the database, and returns the created media object. If an image
+    with the same content hash is already stored, its source is reused, so every
+    upload of the same content points to a single file.
 
     Parameters
     ----------
@@ -20,29 +30,133 @@ async def create_media(
         The asynchronous session for database operations.
     image_src : str
         The URL or path to the image source that will be stored in the database.
+    content_hash : str, optional
+        The SHA-256 hash of the image file.
+    width : int, optional
+        The width of the image in pixels.
+    height : int, optional
+        The height of the image in pixels.
+    variants : dict, optional
+        The derivatives of the image by name, each with its `src`, `width` and `height`.
+    user_id : int, optional
+        The ID of the user uploading the image.
 
     Returns
     -------
     Image
         The newly created media object.
     """
-    new_image = Image(src=image_src)
+    if content_hash is not None:
+        stored_src = await session.scalar(
+            select(Image.src).where(Image.content_hash == content_hash).limit(1),
+        )
+        image_src = stored_src or image_src
+
+    new_image = Image(
+        src=image_src,
+        content_hash=content_hash,
+        width=width,
+        height=height,
+        variants=variants,
+        user_id=user_id,
+    )
     session.add(new_image)
     await session.commit()
     await session.refresh(new_image)
     return new_image
 
 
+async def create_medias(
+    session: AsyncSession,
+    images: list[dict],
+    user_id: int | None = None,
+) -> list[int]:
+    """
+    Create several media entries in the database with one statement.
+
+    The sources of the images already stored with the same content are looked up
+    in one query and reused, as in `create_media`. The rows are then written with
+    a single multi-row `INSERT ... RETURNING` and committed once.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    images : list of dict
+        The keyword arguments of `create_media` for every image, without the session
+        and the user.
+    user_id : int, optional
+        The ID of the user uploading the images.
+
+    Returns
+    -------
+    list of int
+        The IDs of the created media entries, in the order of `images`.
+    """
+    content_hashes = {image["content_hash"] for image in images if image.get("content_hash")}
+    stored_srcs = {}
+    if content_hashes:
+        stored_srcs = dict(
+            (
+                await session.execute(
+                    select(Image.content_hash, func.min(Image.src))
+                    .where(Image.content_hash.in_(content_hashes))
+                    .group_by(Image.content_hash),
+                )
+            ).all(),
+        )
+
+    media_ids = (
+        await session.scalars(
+            insert(Image).returning(Image.id, sort_by_parameter_order=True),
+            [
+                {
+                    "src": stored_srcs.get(image.get("content_hash"), image["image_src"]),
+                    "content_hash": image.get("content_hash"),
+                    "width": image.get("width"),
+                    "height": image.get("height"),
+                    "variants": image.get("variants"),
+                    "user_id": user_id,
+                }
+                for image in images
+            ],
+        )
+    ).all()
+    await session.commit()
+    return list(media_ids)
+
+
+async def get_media(session: AsyncSession, media_id: int) -> Image | None:
+    """
+    Retrieve a media entry by its ID.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    media_id : int
+        The ID of the media entry.
+
+    Returns
+    -------
+    Image or None
+        The media object if found, otherwise None.
+    """
+    return await session.get(Image, media_id)
+
+
 async def update_data_medias(
     session: AsyncSession,
     tweet_id: int,
     tweet_media_ids: list[int],
-) -> None:
+    user_id: int,
+) -> list[int]:
     """
-    Update media entries with a tweet ID in the database.
+    Attach media entries to a tweet, without committing.
 
-    This function updates multiple media objects with the given tweet ID,
-    associating each media object with the tweet.
+    The media entries are updated with one set-based statement, and only those
+    uploaded by the user and not attached to a tweet yet are attached; the
+    caller compares the returned IDs with the requested ones.
 
     Parameters
     ----------
@@ -52,9 +166,304 @@ async def update_data_medias(
         The ID of the tweet to associate with the media entries.
     tweet_media_ids : list of int
         A list of media IDs that need to be updated with the tweet ID.
+    user_id : int
+        The ID of the user attaching the media entries, who must have uploaded them.
+
+    Returns
+    -------
+    list of int
+        The IDs of the attached media entries.
+    """
+    attached_ids = await session.scalars(
+        update(Image)
+        .where(
+            Image.id.in_(tweet_media_ids),
+            Image.tweet_id.is_(None),
+            Image.user_id == user_id,
+        )
+        .values(tweet_id=tweet_id)
+        .returning(Image.id)
+        .execution_options(synchronize_session=False),
+    )
+    return list(attached_ids)
+
+
+async def delete_unattached_medias(
+    session: AsyncSession,
+    grace_period: timedelta,
+    batch_size: int,
+) -> int:
+    """
+    Delete one batch of images that were never attached to a tweet.
+
+    The oldest unattached images uploaded more than `grace_period` ago, by the clock of
+    the database, are found through
+    the partial index `ix_images_unattached_created_at` and deleted, and their files
+    are queued in `pending_file_deletions` in the same transaction. Rows locked by a
+    concurrent transaction, such as a tweet being created with them, are skipped.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    grace_period : timedelta
+        The age after which unattached images are deleted.
+    batch_size : int
+        The maximum number of images deleted.
+
+    Returns
+    -------
+    int
+        The number of deleted images.
+    """
+    expired_ids = (
+        select(Image.id)
+        .where(Image.tweet_id.is_(None), Image.created_at < func.now() - grace_period)
+        .order_by(Image.created_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    deleted_srcs = (
+        await session.scalars(
+            delete(Image)
+            .where(Image.id.in_(expired_ids), Image.tweet_id.is_(None))
+            .returning(Image.src)
+            .execution_options(synchronize_session=False),
+        )
+    ).all()
+    if deleted_srcs:
+        await queue_file_deletions(session, image_srcs=deleted_srcs)
+    await session.commit()
+    return len(deleted_srcs)
+
+
+async def queue_file_deletions(session: AsyncSession, image_srcs: list[str]) -> None:
+    """
+    Queue image files for removal, without committing.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    image_srcs : list of str
+        The source paths of the files to remove.
+    """
+    await session.execute(
+        insert(PendingFileDeletion),
+        [{"src": image_src} for image_src in image_srcs],
+    )
+
+
+async def take_file_deletions(
+    session: AsyncSession,
+    batch_size: int,
+) -> tuple[int, list[str]]:
+    """
+    Take one batch of queued file removals off the queue.
+
+    Files still used by an image, because another upload had the same content,
+    are dropped from the queue without being returned. The batch is committed
+    before the caller removes the files, so a crash in between leaves at most one
+    batch of files behind and never removes a file twice.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    batch_size : int
+        The maximum number of queued removals taken.
+
+    Returns
+    -------
+    tuple of (int, list of str)
+        The number of queued removals taken and the source paths of the files no
+        image uses anymore.
     """
+    pending = (
+        await session.execute(
+            select(PendingFileDeletion.id, PendingFileDeletion.src)
+            .order_by(PendingFileDeletion.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True),
+        )
+    ).all()
+    if not pending:
+        return 0, []
+
+    pending_srcs = {row.src for row in pending}
+    used_srcs = set(
+        await session.scalars(select(Image.src).where(Image.src.in_(pending_srcs)).distinct()),
+    )
     await session.execute(
-        update(Image),
-        [{"id": id, "tweet_id": tweet_id} for id in tweet_media_ids],
+        delete(PendingFileDeletion).where(PendingFileDeletion.id.in_([row.id for row in pending])),
+    )
+    await session.commit()
+    return len(pending), sorted(pending_srcs - used_srcs)
+
+
+async def create_upload(
+    session: AsyncSession,
+    user_id: int,
+    file_name: str,
+    size: int,
+    ttl: timedelta,
+) -> str:
+    """
+    Create a resumable upload.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the user starting the upload.
+    file_name : str
+        The name of the file to upload.
+    size : int
+        The total size of the file in bytes.
+    ttl : timedelta
+        The time after which the upload expires, by the clock of the database.
+
+    Returns
+    -------
+    str
+        The ID of the upload.
+    """
+    upload_id = uuid.uuid4().hex
+    await session.execute(
+        insert(MediaUpload).values(
+            id=upload_id,
+            user_id=user_id,
+            file_name=file_name,
+            size=size,
+            offset=0,
+            expires_at=func.now() + ttl,
+        ),
+    )
+    await session.commit()
+    return upload_id
+
+
+async def get_upload(
+    session: AsyncSession,
+    upload_id: str,
+    user_id: int,
+) -> MediaUpload | None:
+    """
+    Retrieve a resumable upload of a user that has not expired.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    upload_id : str
+        The ID of the upload.
+    user_id : int
+        The ID of the user asking for the upload.
+
+    Returns
+    -------
+    MediaUpload or None
+        The upload if found, started by the user and not expired, otherwise None.
+    """
+    return await session.scalar(
+        select(MediaUpload).where(
+            MediaUpload.id == upload_id,
+            MediaUpload.user_id == user_id,
+            MediaUpload.expires_at > func.now(),
+        ),
+    )
+
+
+async def advance_upload(
+    session: AsyncSession,
+    upload_id: str,
+    offset: int,
+    new_offset: int,
+) -> bool:
+    """
+    Record that the bytes of an upload up to `new_offset` were received.
+
+    The offset only moves if it is still `offset`, so of two requests writing the
+    same chunk concurrently only one advances it.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    upload_id : str
+        The ID of the upload.
+    offset : int
+        The offset the received bytes were written at.
+    new_offset : int
+        The offset after the received bytes.
+
+    Returns
+    -------
+    bool
+        True if the offset was advanced, False if the upload expired or its offset
+        changed meanwhile.
+    """
+    result = await session.execute(
+        update(MediaUpload)
+        .where(
+            MediaUpload.id == upload_id,
+            MediaUpload.offset == offset,
+            MediaUpload.expires_at > func.now(),
+        )
+        .values(offset=new_offset),
+    )
+    await session.commit()
+    return result.rowcount == 1  # type: ignore
+
+
+async def delete_upload(session: AsyncSession, upload_id: str) -> None:
+    """
+    Delete a resumable upload, without committing.
+
+    It is deleted in the transaction creating its media entry, so a finalized
+    upload is never left behind.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    upload_id : str
+        The ID of the upload.
+    """
+    await session.execute(delete(MediaUpload).where(MediaUpload.id == upload_id))
+
+
+async def delete_expired_uploads(session: AsyncSession, batch_size: int) -> list[str]:
+    """
+    Delete one batch of expired resumable uploads.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    batch_size : int
+        The maximum number of uploads deleted.
+
+    Returns
+    -------
+    list of str
+        The IDs of the deleted uploads, whose staging files can be removed.
+    """
+    expired_ids = (
+        select(MediaUpload.id)
+        .where(MediaUpload.expires_at <= func.now())
+        .order_by(MediaUpload.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
     )
+    deleted_ids = (
+        await session.scalars(
+            delete(MediaUpload)
+            .where(MediaUpload.id.in_(expired_ids), MediaUpload.expires_at <= func.now())
+            .returning(MediaUpload.id)
+            .execution_options(synchronize_session=False),
+        )
+    ).all()
     await session.commit()
+    return list(deleted_ids)
@@ -0,0 +1,31 @@
+from sqlalchemy import Integer, any_, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def match_ids(session: AsyncSession, column, ids: list[int]):
+    """
+    Build a filter matching an ID column against a list of IDs.
+
+    On PostgreSQL the list is sent as one array parameter of `column = ANY(...)`,
+    so every batch size shares one prepared statement; other databases get an
+    `IN` list.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    column : InstrumentedAttribute
+        The integer column to match, such as `Tweet.id`.
+    ids : list of int
+        The accepted IDs.
+
+    Returns
+    -------
+    ColumnElement
+        A boolean SQL expression.
+    """
+    connection = await session.connection()
+    if connection.dialect.name == "postgresql":
+        return column == any_(literal(ids, ARRAY(Integer)))
+    return column.in_(ids)
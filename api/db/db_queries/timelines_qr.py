@@ -0,0 +1,405 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, literal, select, tuple_, union, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...core import settings
+from ..models import Follower, TimelineEntry, Tweet, User
+from . import tweets_qr
+
+
+async def _count_followers(session: AsyncSession, author_id: int) -> int:
+    """
+    Count the followers of an author.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    author_id : int
+        The ID of the author.
+
+    Returns
+    -------
+    int
+        The number of followers of the author.
+    """
+    followers_count = await session.scalar(
+        select(User.follower_count).where(User.id == author_id),
+    )
+    return followers_count or 0
+
+
+async def _insert_entries(session: AsyncSession, entries) -> int:
+    """
+    Copy the selected tweets into home timelines, skipping those already there.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    entries : Select
+        A query returning the recipient ID, tweet ID, author ID and creation time
+        of every timeline entry to insert.
+
+    Returns
+    -------
+    int
+        The number of inserted entries.
+    """
+    connection = await session.connection()
+    insert_entry = postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+    result = await session.execute(
+        insert_entry(TimelineEntry)
+        .from_select(["user_id", "tweet_id", "author_id", "created_at"], entries)
+        .on_conflict_do_nothing(),
+    )
+    return result.rowcount
+
+
+def _celebrities_followed_by(user_id: int):
+    """
+    Build a query selecting the followed authors that are not fanned out on write.
+
+    Parameters
+    ----------
+    user_id : int
+        The ID of the user whose followed authors are checked.
+
+    Returns
+    -------
+    Select
+        A query returning the IDs of followed authors with more followers than
+        `settings.timeline_fanout_threshold`.
+    """
+    return (
+        select(Follower.user_id)
+        .join(User, User.id == Follower.user_id)
+        .where(
+            Follower.follower == user_id,
+            User.follower_count > settings.timeline_fanout_threshold,
+        )
+    )
+
+
+async def fan_out_tweet(
+    session: AsyncSession,
+    tweet_id: int,
+    author_id: int,
+) -> None:
+    """
+    Push a new tweet into the home timelines of its author and followers.
+
+    Authors with more followers than `settings.timeline_fanout_threshold` only get
+    the tweet in their own timeline; their followers pick it up at read time.
+    The caller is responsible for committing the transaction.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    tweet_id : int
+        The ID of the new tweet.
+    author_id : int
+        The ID of the author of the tweet.
+    """
+    recipients = select(literal(author_id).label("recipient_id"))
+    if await _count_followers(session, author_id) <= settings.timeline_fanout_threshold:
+        recipients = recipients.union(
+            select(Follower.follower).where(Follower.user_id == author_id),
+        )
+
+    recipients_subq = recipients.subquery()
+    await session.execute(
+        insert(TimelineEntry).from_select(
+            ["user_id", "tweet_id", "author_id", "created_at"],
+            select(
+                recipients_subq.c.recipient_id,
+                Tweet.id,
+                Tweet.user_id,
+                Tweet.created_at,
+            ).join_from(recipients_subq, Tweet, Tweet.id == tweet_id),
+        ),
+    )
+
+
+async def backfill_author(
+    session: AsyncSession,
+    user_id: int,
+    author_id: int,
+) -> None:
+    """
+    Copy the latest tweets of a newly followed author into a home timeline.
+
+    Nothing is copied for authors above the fan-out threshold, since their tweets
+    are merged at read time. Tweets already in the timeline are skipped. The
+    caller is responsible for committing.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the user who started following the author.
+    author_id : int
+        The ID of the followed author.
+    """
+    if await _count_followers(session, author_id) > settings.timeline_fanout_threshold:
+        return
+
+    latest_tweets = (
+        select(literal(user_id), Tweet.id, Tweet.user_id, Tweet.created_at)
+        .where(Tweet.user_id == author_id)
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+        .limit(settings.timeline_backfill_size)
+    )
+    await _insert_entries(session, latest_tweets)
+
+
+async def backfill_authors(
+    session: AsyncSession,
+    user_id: int,
+    author_ids: list[int],
+) -> None:
+    """
+    Copy the latest tweets of several newly followed authors into a home timeline.
+
+    The tweets of all authors are copied with one `INSERT ... SELECT`, which ranks
+    the tweets of every author with a window function. Authors above the fan-out
+    threshold and tweets already in the timeline are skipped, like in
+    `backfill_author`. The caller is responsible for committing.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the user who started following the authors.
+    author_ids : list of int
+        The IDs of the followed authors.
+    """
+    ranked_tweets = (
+        select(
+            Tweet.id,
+            Tweet.user_id,
+            Tweet.created_at,
+            func.row_number().over(
+                partition_by=Tweet.user_id,
+                order_by=(Tweet.created_at.desc(), Tweet.id.desc()),
+            ).label("position"),
+        )
+        .join(User, User.id == Tweet.user_id)
+        .where(
+            Tweet.user_id.in_(author_ids),
+            User.id.in_(author_ids),
+            User.follower_count <= settings.timeline_fanout_threshold,
+        )
+        .subquery()
+    )
+    latest_tweets = select(
+        literal(user_id),
+        ranked_tweets.c.id,
+        ranked_tweets.c.user_id,
+        ranked_tweets.c.created_at,
+    ).where(ranked_tweets.c.position <= settings.timeline_backfill_size)
+    await _insert_entries(session, latest_tweets)
+
+
+async def backfill_home_timelines(
+    session: AsyncSession,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Fill the home timelines from the follows and tweets that predate them.
+
+    Every timeline gets the latest `settings.timeline_backfill_size` tweets of
+    its owner and of every followed author below the fan-out threshold, as if
+    the owner had just started following them. Tweets already in a timeline are
+    skipped, so the backfill can be repeated. Users are processed in ID ranges
+    of `batch_size`, each range in its own transaction.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    batch_size : int
+        The size of the user ID range backfilled in one transaction.
+
+    Returns
+    -------
+    int
+        The number of inserted timeline entries.
+    """
+    max_id = await session.scalar(select(func.max(User.id)))
+    inserted = 0
+    for range_start in range(0, (max_id or 0) + 1, batch_size):
+        range_end = range_start + batch_size
+        author_ids = sorted(set(await session.scalars(
+            union(
+                select(User.id).where(User.id > range_start, User.id <= range_end),
+                select(Follower.user_id).where(
+                    Follower.follower > range_start,
+                    Follower.follower <= range_end,
+                ),
+            ),
+        )))
+        if not author_ids:
+            continue
+        ranked_tweets = (
+            select(
+                Tweet.id,
+                Tweet.user_id,
+                Tweet.created_at,
+                User.follower_count,
+                func.row_number().over(
+                    partition_by=Tweet.user_id,
+                    order_by=(Tweet.created_at.desc(), Tweet.id.desc()),
+                ).label("position"),
+            )
+            .join(User, User.id == Tweet.user_id)
+            .where(Tweet.user_id.in_(author_ids), User.id.in_(author_ids))
+            .subquery()
+        )
+        followed_tweets = (
+            select(
+                Follower.follower,
+                ranked_tweets.c.id,
+                ranked_tweets.c.user_id,
+                ranked_tweets.c.created_at,
+            )
+            .join(ranked_tweets, ranked_tweets.c.user_id == Follower.user_id)
+            .where(
+                Follower.follower > range_start,
+                Follower.follower <= range_end,
+                ranked_tweets.c.follower_count <= settings.timeline_fanout_threshold,
+                ranked_tweets.c.position <= settings.timeline_backfill_size,
+            )
+        )
+        own_tweets = select(
+            ranked_tweets.c.user_id,
+            ranked_tweets.c.id,
+            ranked_tweets.c.user_id,
+            ranked_tweets.c.created_at,
+        ).where(
+            ranked_tweets.c.user_id > range_start,
+            ranked_tweets.c.user_id <= range_end,
+            ranked_tweets.c.position <= settings.timeline_backfill_size,
+        )
+        inserted += await _insert_entries(session, union_all(followed_tweets, own_tweets))
+        await session.commit()
+    return inserted
+
+
+async def remove_author(
+    session: AsyncSession,
+    user_id: int,
+    author_id: int,
+) -> None:
+    """
+    Remove the tweets of an unfollowed author from a home timeline.
+
+    The caller is responsible for committing the transaction.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the user who stopped following the author.
+    author_id : int
+        The ID of the unfollowed author.
+    """
+    await session.execute(
+        delete(TimelineEntry).where(
+            TimelineEntry.user_id == user_id,
+            TimelineEntry.author_id == author_id,
+        ),
+    )
+
+
+async def remove_tweet(session: AsyncSession, tweet_id: int) -> None:
+    """
+    Remove a tweet from every home timeline it was fanned out to.
+
+    The caller is responsible for committing the transaction.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    tweet_id : int
+        The ID of the deleted tweet.
+    """
+    await session.execute(
+        delete(TimelineEntry).where(TimelineEntry.tweet_id == tweet_id),
+    )
+
+
+async def get_home_timeline_page(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: tuple[datetime, int] | None = None,
+) -> tuple[list[Tweet], bool]:
+    """
+    Retrieve one page of a user's home timeline using keyset pagination.
+
+    The materialized entries are read with a range scan over the user's part of
+    `ix_home_timelines_user_created_at` and merged with the latest tweets of the
+    followed authors that are not fanned out on write.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the user whose timeline is read.
+    limit : int
+        The maximum number of tweets in the page.
+    cursor : tuple of (datetime, int), optional
+        The `(created_at, id)` key of the last tweet of the previous page.
+
+    Returns
+    -------
+    tuple of (list of Tweet, bool)
+        The tweets of the page and a flag telling whether more tweets follow.
+    """
+    entries = (
+        select(TimelineEntry.tweet_id, TimelineEntry.created_at)
+        .where(TimelineEntry.user_id == user_id)
+        .order_by(TimelineEntry.created_at.desc(), TimelineEntry.tweet_id.desc())
+        .limit(limit + 1)
+    )
+    celebrity_tweets = (
+        select(Tweet.id, Tweet.created_at)
+        .where(Tweet.user_id.in_(_celebrities_followed_by(user_id)))
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        entries = entries.where(
+            tuple_(TimelineEntry.created_at, TimelineEntry.tweet_id) < tuple_(*cursor),
+        )
+        celebrity_tweets = celebrity_tweets.where(
+            tuple_(Tweet.created_at, Tweet.id) < tuple_(*cursor),
+        )
+
+    merged = union(
+        entries.subquery().select(),
+        celebrity_tweets.subquery().select(),
+    ).subquery()
+    page_ids = (
+        select(merged.c.tweet_id)
+        .order_by(merged.c.created_at.desc(), merged.c.tweet_id.desc())
+        .limit(limit + 1)
+    )
+    stmt = (
+        select(Tweet)
+        .options(*tweets_qr.feed_options(viewer_id=user_id))
+        .where(Tweet.id.in_(page_ids))
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+    )
+
+    tweets = list(await session.scalars(stmt))
+    return tweets[:limit], len(tweets) > limit
@@ -1,8 +1,77 @@
-from sqlalchemy import select
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import (
+    Text,
+    case,
+    cast,
+    delete,
+    exists,
+    false,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, with_expression
+
+from ...core import settings
+from ..models import Image, PendingFileDeletion, Tweet, TweetLike, User
+from . import medias_qr, timelines_qr
+from .query_helpers import match_ids
+
+
+def _liked_by_me(viewer_id: int | None):
+    """
+    Build the expression telling whether the viewing user liked a tweet.
+
+    Parameters
+    ----------
+    viewer_id : int, optional
+        The ID of the user viewing the feed. If omitted, the expression is False.
 
-from ..models import Image, Tweet
+    Returns
+    -------
+    ColumnElement
+        A boolean SQL expression correlated to `Tweet`.
+    """
+    if viewer_id is None:
+        return false()
+    return exists().where(
+        TweetLike.tweet_id == Tweet.id,
+        TweetLike.user_id == viewer_id,
+    )
+
+
+def feed_options(viewer_id: int | None = None) -> tuple:
+    """
+    Build the loader options shared by every query that renders tweets in a feed.
+
+    The author and attachments are loaded with `selectinload`, while likes are
+    represented by the denormalized `Tweet.like_count` and a `liked_by_me` flag
+    computed for the viewing user, so no `TweetLike` rows are loaded.
+
+    Parameters
+    ----------
+    viewer_id : int, optional
+        The ID of the user viewing the feed. If omitted, `liked_by_me` is False.
+
+    Returns
+    -------
+    tuple
+        Loader options to be passed to `Select.options`.
+    """
+    return (
+        selectinload(Tweet.author),
+        selectinload(Tweet.attachments).load_only(
+            Image.src, Image.width, Image.height, Image.variants,
+        ),
+        with_expression(Tweet.liked_by_me, _liked_by_me(viewer_id)),
+    )
 
 
 async def get_tweet(
@@ -28,13 +97,46 @@ async def get_tweet(
     return await session.scalar(tweet_stmt)
 
 
+async def get_tweets_by_ids(
+    session: AsyncSession,
+    tweet_ids: list[int],
+    viewer_id: int | None = None,
+) -> list[Tweet]:
+    """
+    Retrieve the tweets with the given IDs, loaded like a feed page.
+
+    The tweets are read with one primary key lookup, their authors and
+    attachments with one query each.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    tweet_ids : list of int
+        The IDs of the tweets.
+    viewer_id : int, optional
+        The ID of the user viewing the tweets, used to compute `liked_by_me`.
+
+    Returns
+    -------
+    list of Tweet
+        The existing tweets among the given IDs, in no particular order.
+    """
+    stmt = (
+        select(Tweet)
+        .options(*feed_options(viewer_id))
+        .where(await match_ids(session, Tweet.id, tweet_ids))
+    )
+    return list(await session.scalars(stmt))
+
+
 async def get_all_tweets(session: AsyncSession) -> list[Tweet]:
     """
     Retrieve all tweets from the database.
 
     This function retrieves all tweets from the database in descending order
-    of their creation date. It also loads related entities, such as the author,
-    likes, and attachments with optimized loading strategies.
+    of their creation date. It also loads related entities, such as the author
+    and attachments with optimized loading strategies.
 
     Parameters
     ----------
@@ -48,28 +150,255 @@ async def get_all_tweets(session: AsyncSession) -> list[Tweet]:
     """
     stmt = (
         select(Tweet)
-        .options(
-            selectinload(Tweet.author),
-            selectinload(Tweet.tweet_likes),
-            selectinload(Tweet.attachments).load_only(Image.src),
-        )
+        .options(*feed_options())
         .order_by(Tweet.created_at.desc())
     )
     tweets = await session.scalars(stmt)
     return list(tweets)
 
 
+async def get_tweets_page(
+    session: AsyncSession,
+    limit: int,
+    cursor: tuple[datetime, int] | None = None,
+    viewer_id: int | None = None,
+) -> tuple[list[Tweet], bool]:
+    """
+    Retrieve one page of the feed using keyset pagination.
+
+    Tweets are ordered by `(created_at, id)` in descending order, so the page is
+    read with a single range scan over the `ix_tweets_created_at_id` index no
+    matter how deep the client has scrolled. One extra row is requested to find
+    out whether another page exists.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    limit : int
+        The maximum number of tweets in the page.
+    cursor : tuple of (datetime, int), optional
+        The `(created_at, id)` key of the last tweet of the previous page.
+        If omitted, the first page is returned.
+    viewer_id : int, optional
+        The ID of the user viewing the feed, used to compute `liked_by_me`.
+
+    Returns
+    -------
+    tuple of (list of Tweet, bool)
+        The tweets of the page and a flag telling whether more tweets follow.
+    """
+    stmt = (
+        select(Tweet)
+        .options(*feed_options(viewer_id))
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(tuple_(Tweet.created_at, Tweet.id) < tuple_(*cursor))
+
+    tweets = list(await session.scalars(stmt))
+    return tweets[:limit], len(tweets) > limit
+
+
+async def stream_tweets(
+    session: AsyncSession,
+    cursor: tuple[datetime, int] | None = None,
+    viewer_id: int | None = None,
+    limit: int | None = None,
+) -> AsyncIterator[Tweet]:
+    """
+    Stream the feed from a server-side cursor.
+
+    Rows are fetched in batches of `settings.feed_stream_batch_size`, and the
+    authors and attachments are loaded per batch, so memory use does not depend
+    on the number of tweets streamed.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    cursor : tuple of (datetime, int), optional
+        The `(created_at, id)` key of the tweet to start after.
+    viewer_id : int, optional
+        The ID of the user viewing the feed, used to compute `liked_by_me`.
+    limit : int, optional
+        The maximum number of tweets to stream. If omitted, the whole feed is streamed.
+
+    Yields
+    ------
+    Tweet
+        The tweets in feed order.
+    """
+    stmt = (
+        select(Tweet)
+        .options(*feed_options(viewer_id))
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+        .execution_options(yield_per=settings.feed_stream_batch_size)
+    )
+    if cursor is not None:
+        stmt = stmt.where(tuple_(Tweet.created_at, Tweet.id) < tuple_(*cursor))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    tweets = await session.stream_scalars(stmt)
+    try:
+        async for tweet in tweets:
+            yield tweet
+    finally:
+        await tweets.close()
+
+
+async def get_tweets_page_json(
+    session: AsyncSession,
+    limit: int,
+    cursor: tuple[datetime, int] | None = None,
+    viewer_id: int | None = None,
+) -> tuple[str, tuple[datetime, int] | None]:
+    """
+    Render one page of the feed as a JSON array in a single SQL statement.
+
+    The page is selected exactly like in `get_tweets_page`, but the tweets, their
+    authors and attachments are serialized by the database (`json_build_object`
+    and `json_agg` on PostgreSQL, `json_object` and `json_group_array` on SQLite),
+    so no ORM objects are created. Each element matches `schemas.TweetOut`.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    limit : int
+        The maximum number of tweets in the page.
+    cursor : tuple of (datetime, int), optional
+        The `(created_at, id)` key of the last tweet of the previous page.
+    viewer_id : int, optional
+        The ID of the user viewing the feed, used to compute `liked_by_me`.
+
+    Returns
+    -------
+    tuple of (str, tuple of (datetime, int) or None)
+        The JSON array of the tweets of the page and the `(created_at, id)` key of
+        its last tweet if more tweets follow, otherwise None.
+    """
+    connection = await session.connection()
+    is_postgresql = connection.dialect.name == "postgresql"
+    if is_postgresql:
+        json_object, json_array = func.json_build_object, func.json_agg
+        empty_array = literal_column("'[]'::json")
+        empty_object = literal_column("'{}'::json")
+    else:
+        json_object, json_array = func.json_object, func.json_group_array
+        empty_array = literal("[]")
+        empty_object = literal("{}")
+
+    def embed(json_value):
+        # SQLite returns JSON from subqueries as plain text, which would be escaped
+        # as a string by `json_object` unless it is parsed again with `json()`.
+        return json_value if is_postgresql else func.json(json_value)
+
+    def ordered_array(json_value, order_by):
+        if is_postgresql:
+            json_value = aggregate_order_by(json_value, order_by)
+        return func.coalesce(json_array(json_value), empty_array)
+
+    page_stmt = (
+        select(
+            Tweet.id,
+            Tweet.content,
+            Tweet.user_id,
+            Tweet.created_at,
+            Tweet.like_count,
+            _liked_by_me(viewer_id).label("liked_by_me"),
+            func.row_number()
+            .over(order_by=(Tweet.created_at.desc(), Tweet.id.desc()))
+            .label("position"),
+        )
+        .order_by(Tweet.created_at.desc(), Tweet.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        page_stmt = page_stmt.where(tuple_(Tweet.created_at, Tweet.id) < tuple_(*cursor))
+    page = page_stmt.cte("page")
+
+    media_json = json_object(
+        "src", Image.src,
+        "width", Image.width,
+        "height", Image.height,
+        "variants", embed(func.coalesce(Image.variants, empty_object)),
+    )
+    images = select(Image.id, Image.tweet_id, Image.src, media_json.label("media")).where(
+        Image.tweet_id.in_(select(page.c.id)),
+    )
+    if not is_postgresql:
+        # `json_group_array` has no ORDER BY, it aggregates in the order of its input.
+        images = images.order_by(Image.tweet_id, Image.id)
+    images = images.subquery()
+    attachments = (
+        select(
+            images.c.tweet_id,
+            ordered_array(images.c.src, images.c.id).label("srcs"),
+            ordered_array(embed(images.c.media), images.c.id).label("media"),
+        )
+        .group_by(images.c.tweet_id)
+        .cte("attachments")
+    )
+    author = (
+        select(json_object("id", User.id, "name", User.name))
+        .where(User.id == page.c.user_id)
+        .scalar_subquery()
+    )
+    liked_by_me = page.c.liked_by_me
+    if not is_postgresql:
+        liked_by_me = func.json(case((page.c.liked_by_me, "true"), else_="false"))
+    tweet_json = json_object(
+        "id", page.c.id,
+        "content", page.c.content,
+        "attachments", embed(func.coalesce(attachments.c.srcs, empty_array)),
+        "media", embed(func.coalesce(attachments.c.media, empty_array)),
+        "author", embed(author),
+        "like_count", page.c.like_count,
+        "liked_by_me", liked_by_me,
+    )
+    page_rows = (
+        select(page.c.position, tweet_json.label("tweet"))
+        .outerjoin(attachments, attachments.c.tweet_id == page.c.id)
+        .where(page.c.position <= limit)
+        .order_by(page.c.position)
+        .subquery()
+    )
+
+    stmt = select(
+        cast(
+            select(ordered_array(embed(page_rows.c.tweet), page_rows.c.position))
+            .scalar_subquery(),
+            Text,
+        ),
+        select(func.count()).select_from(page).scalar_subquery(),
+        select(page.c.created_at).where(page.c.position == limit).scalar_subquery(),
+        select(page.c.id).where(page.c.position == limit).scalar_subquery(),
+    )
+    tweets, rows_count, last_created_at, last_id = (await session.execute(stmt)).one()
+    if rows_count <= limit:
+        return tweets, None
+    return tweets, (last_created_at, last_id)
+
+
 async def create_tweet(
     session: AsyncSession,
     tweet_content: str,
     current_user_id: int,
-) -> int:
+    tweet_media_ids: list[int] | None = None,
+) -> int | None:
     """
     Create a new tweet in the database.
 
     This function creates a new tweet with the specified content and associates
-    it with the current user. After committing the transaction, it returns the
-    ID of the newly created tweet.
+    it with the current user. The tweet is inserted with `INSERT ... RETURNING`,
+    its media entries are attached with one set-based `UPDATE`, and the tweet is
+    fanned out to the home timelines of the author and their followers, all in
+    one transaction. If a media entry does not exist, was not uploaded by the user
+    or is already attached to a tweet, the transaction is rolled back, so a tweet
+    is never created without its media.
 
     Parameters
     ----------
@@ -79,20 +408,37 @@ async def create_tweet(
         The content of the tweet.
     current_user_id : int
         The ID of the user creating the tweet.
+    tweet_media_ids : list of int, optional
+        The IDs of the media entries to attach to the tweet.
 
     Returns
     -------
-    int
-        The ID of the newly created tweet.
+    int | None
+        The ID of the newly created tweet, or None if its media cannot be attached.
     """
-    tweet = Tweet(
-        content=tweet_content,
-        user_id=current_user_id,
+    tweet_id = await session.scalar(
+        insert(Tweet)
+        .values(content=tweet_content, user_id=current_user_id)
+        .returning(Tweet.id),
+    )
+    if tweet_media_ids:
+        attached_ids = await medias_qr.update_data_medias(
+            session,
+            tweet_id=tweet_id,  # type: ignore
+            tweet_media_ids=tweet_media_ids,
+            user_id=current_user_id,
+        )
+        if len(attached_ids) != len(set(tweet_media_ids)):
+            await session.rollback()
+            return None
+
+    await timelines_qr.fan_out_tweet(
+        session,
+        tweet_id=tweet_id,  # type: ignore
+        author_id=current_user_id,
     )
-    session.add(tweet)
     await session.commit()
-    await session.refresh(tweet)
-    return tweet.id
+    return tweet_id
 
 
 async def delete_tweet(
@@ -104,8 +450,13 @@ async def delete_tweet(
     Delete a tweet from the database.
 
     This function deletes a tweet with the specified ID, if it belongs to the
-    current user. If the tweet does not exist or does not belong to the user,
-    an HTTP 404 exception is raised.
+    current user, and removes it from the home timelines it was fanned out to.
+    The files of its images, deleted by the cascade, are queued for removal.
+    The tweet is deleted with `DELETE ... RETURNING` without being loaded first;
+    on PostgreSQL the files are queued by the same statement through a
+    data-modifying CTE, and the timeline entries go with the foreign key cascade.
+    If the tweet does not exist or does not belong to the user, an HTTP 404
+    exception is raised.
 
     Parameters
     ----------
@@ -123,14 +474,39 @@ async def delete_tweet(
         not exist or does not belong to the current user, the function returns False.
 
     """
-    stmt = select(Tweet).where(
-        Tweet.id == tweet_id,
-        Tweet.user_id == current_user_id,
+    connection = await session.connection()
+    delete_stmt = (
+        delete(Tweet)
+        .where(
+            Tweet.id == tweet_id,
+            Tweet.user_id == current_user_id,
+        )
+        .returning(Tweet.id)
     )
-    tweet = await session.scalar(stmt)
-    if not tweet:
-        return False
+    if connection.dialect.name == "postgresql":
+        deleted = delete_stmt.cte("deleted")
+        queued = insert(PendingFileDeletion).from_select(
+            ["src"],
+            select(Image.src).where(Image.tweet_id.in_(select(deleted.c.id))),
+        ).cte("queued")
+        deleted_id = await session.scalar(select(deleted.c.id).add_cte(queued))
+    else:
+        await session.execute(
+            insert(PendingFileDeletion).from_select(
+                ["src"],
+                select(Image.src)
+                .join(Tweet, Tweet.id == Image.tweet_id)
+                .where(Tweet.id == tweet_id, Tweet.user_id == current_user_id),
+            ),
+        )
+        deleted_id = await session.scalar(
+            delete_stmt.execution_options(synchronize_session=False),
+        )
+        if deleted_id is not None:
+            await timelines_qr.remove_tweet(session, tweet_id=tweet_id)
 
-    await session.delete(tweet)
+    if deleted_id is None:
+        await session.rollback()
+        return False
     await session.commit()
     return True
@@ -1,9 +1,14 @@
-from sqlalchemy import select
-from sqlalchemy.exc import IntegrityError
+from typing import AsyncIterator
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, case, delete, func, literal, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 
-from ..models import Follower, User
+from ...core import settings, social_graph
+from ..models import Follower, TimelineEntry, User
+from . import timelines_qr
+from .query_helpers import match_ids
 
 
 async def get_user_by_id(
@@ -56,13 +61,17 @@ async def get_current_user(
     return user if user else None
 
 
-async def get_full_user_info_by_id(session: AsyncSession, user_id: int) -> User | None:
+async def get_full_user_info_by_id(
+    session: AsyncSession,
+    user_id: int,
+    page_size: int,
+) -> dict | None:
     """
-    Retrieve a user based on the provided user ID.
+    Retrieve the profile of a user based on the provided user ID.
 
-    This function fetches a user from the database using their user ID. The
-    resulting user includes their followers and following relationships.
-    If no user is found, it returns None.
+    The profile holds the denormalized follower/following counters and the first
+    page of both lists, each read with a bounded range scan, so its cost does not
+    depend on the size of the audience. If no user is found, it returns None.
 
     Parameters
     ----------
@@ -70,22 +79,214 @@ async def get_full_user_info_by_id(session: AsyncSession, user_id: int) -> User
         The asynchronous session for database operations.
     user_id : int
         The ID of the user to be retrieved.
+    page_size : int
+        The number of followers and followed users embedded in the profile.
 
     Returns
     -------
-    User | None
-        The user object with their followers and following relationships if a
-        matching user is found, else None.
+    dict | None
+        The profile in the shape of `UserWithFollowersAndFollowing` if a matching
+        user is found, else None.
+    """
+    user = await get_user_by_id(session, user_id=user_id)
+    if user is None:
+        return None
+
+    followers, more_followers = await get_followers_page(session, user_id, limit=page_size)
+    following, more_following = await get_following_page(session, user_id, limit=page_size)
+    return {
+        "id": user.id,
+        "name": user.name,
+        "follower_count": user.follower_count,
+        "following_count": user.following_count,
+        "followers": followers,
+        "following": following,
+        "followers_next_cursor": followers[-1].id if more_followers else None,
+        "following_next_cursor": following[-1].id if more_following else None,
+    }
+
+
+async def get_followers_page(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: int | None = None,
+) -> tuple[list[User], bool]:
+    """
+    Retrieve one page of the followers of a user using keyset pagination.
+
+    The followers are ordered by ID and read with a range scan over the user's
+    part of the primary key of `user_followers`.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the followed user.
+    limit : int
+        The maximum number of users in the page.
+    cursor : int, optional
+        The ID of the last follower of the previous page.
+
+    Returns
+    -------
+    tuple of (list of User, bool)
+        The followers of the page and a flag telling whether more followers follow.
     """
     stmt = (
         select(User)
-        .options(
-            joinedload(User.followers),
-            joinedload(User.following),
-        )
-        .where(User.id == user_id)
+        .join(Follower, Follower.follower == User.id)
+        .where(Follower.user_id == user_id)
+        .order_by(Follower.follower)
+        .limit(limit + 1)
     )
-    return await session.scalar(stmt)
+    if cursor is not None:
+        stmt = stmt.where(Follower.follower > cursor)
+
+    users = list(await session.scalars(stmt))
+    return users[:limit], len(users) > limit
+
+
+async def get_following_page(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: int | None = None,
+) -> tuple[list[User], bool]:
+    """
+    Retrieve one page of the users followed by a user using keyset pagination.
+
+    The followed users are ordered by ID and read with a range scan over the
+    user's part of `ix_user_followers_follower_user_id`.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the following user.
+    limit : int
+        The maximum number of users in the page.
+    cursor : int, optional
+        The ID of the last followed user of the previous page.
+
+    Returns
+    -------
+    tuple of (list of User, bool)
+        The followed users of the page and a flag telling whether more users follow.
+    """
+    stmt = (
+        select(User)
+        .join(Follower, Follower.user_id == User.id)
+        .where(Follower.follower == user_id)
+        .order_by(Follower.user_id)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(Follower.user_id > cursor)
+
+    users = list(await session.scalars(stmt))
+    return users[:limit], len(users) > limit
+
+
+async def get_relationships(
+    session: AsyncSession,
+    user_id: int,
+    other_ids: list[int],
+) -> dict[int, tuple[bool, bool]]:
+    """
+    Retrieve the follow relationships between a user and other users.
+
+    Both directions are read with one statement, which looks the followed users
+    up in `ix_user_followers_follower_user_id` and the followers in the primary
+    key of `user_followers`.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the user.
+    other_ids : list of int
+        The IDs of the other users.
+
+    Returns
+    -------
+    dict of int to tuple of (bool, bool)
+        For every other user, whether the user follows them and whether they
+        follow the user.
+    """
+    stmt = select(Follower.user_id, Follower.follower).where(
+        or_(
+            and_(Follower.follower == user_id, Follower.user_id.in_(other_ids)),
+            and_(Follower.user_id == user_id, Follower.follower.in_(other_ids)),
+        ),
+    )
+    following, followed_by = set(), set()
+    for followed_id, follower_id in await session.execute(stmt):
+        if follower_id == user_id:
+            following.add(followed_id)
+        if followed_id == user_id:
+            followed_by.add(follower_id)
+    return {
+        other_id: (other_id in following, other_id in followed_by)
+        for other_id in other_ids
+    }
+
+
+async def get_users_by_ids(
+    session: AsyncSession,
+    user_ids: list[int],
+) -> list[User]:
+    """
+    Retrieve the users with the given IDs with one primary key lookup.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_ids : list of int
+        The IDs of the users.
+
+    Returns
+    -------
+    list of User
+        The existing users among the given IDs, ordered by ID.
+    """
+    stmt = (
+        select(User)
+        .where(await match_ids(session, User.id, user_ids))
+        .order_by(User.id)
+    )
+    return list(await session.scalars(stmt))
+
+
+async def stream_follow_edges(session: AsyncSession) -> AsyncIterator[tuple[int, int]]:
+    """
+    Stream all follow relationships ordered by follower and followed user.
+
+    The rows are read from a server-side cursor in the order of
+    `ix_user_followers_follower_user_id`, so neither the database nor the
+    application sorts or holds the whole table.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+
+    Yields
+    ------
+    tuple of (int, int)
+        The ID of the following user and the ID of the followed user.
+    """
+    stmt = (
+        select(Follower.follower, Follower.user_id)
+        .order_by(Follower.follower, Follower.user_id)
+        .execution_options(yield_per=settings.feed_stream_batch_size)
+    )
+    async for follower_id, user_id in await session.stream(stmt):
+        yield follower_id, user_id
 
 
 async def get_user_following_node(
@@ -121,12 +322,21 @@ async def create_user_following_node(
     session: AsyncSession,
     user_id: int,
     follower_id: int,
-) -> bool:
+) -> bool | None:
     """
     Create a follower relation between two users.
 
     This function establishes a relationship where the user with the given
-    follower_id starts following the user with the given user_id.
+    follower_id starts following the user with the given user_id. The latest
+    tweets of the followed user are copied into the follower's home timeline and
+    the denormalized follower/following counters are incremented. The follow is
+    recorded in the journal of the follow graph snapshot once committed.
+
+    The relation is inserted with `INSERT ... SELECT ... ON CONFLICT DO NOTHING
+    RETURNING`, which inserts nothing if the followed user does not exist or is
+    already followed, so nothing is read beforehand. On PostgreSQL the counters
+    are incremented by the same statement through a data-modifying CTE. Only when
+    nothing was inserted is the followed user looked up, to tell both cases apart.
 
     Parameters
     ----------
@@ -139,21 +349,136 @@ async def create_user_following_node(
 
     Returns
     -------
-    bool
-        True if the follower relationship is successfully created, False otherwise.
+    bool or None
+        True if the follower relationship is successfully created, False if it
+        already exists and None if the user to be followed does not exist.
     """
-    new_user_following_node = Follower(
-        user_id=user_id,
-        follower=follower_id,
+    connection = await session.connection()
+    is_postgresql = connection.dialect.name == "postgresql"
+    insert_follower = postgresql.insert if is_postgresql else sqlite.insert
+    insert_node = (
+        insert_follower(Follower)
+        .from_select(
+            ["user_id", "follower"],
+            select(User.id, literal(follower_id)).where(User.id == user_id),
+        )
+        .on_conflict_do_nothing()
+        .returning(Follower.user_id, Follower.follower)
     )
-    session.add(new_user_following_node)
-    try:
-        await session.commit()
-    except IntegrityError:
-        return False
+    if is_postgresql:
+        followed = (await session.execute(
+            _follow_counters_update(insert_node.cte("followed"), delta=1),
+        )).first()
+    else:
+        followed = (await session.execute(insert_node)).first()
+        if followed is not None:
+            await _shift_follow_counters(
+                session, follower_id=follower_id, user_id=user_id, delta=1,
+            )
+
+    if followed is None:
+        await session.rollback()
+        user = await get_user_by_id(session, user_id=user_id)
+        return None if user is None else False
+
+    await timelines_qr.backfill_author(
+        session,
+        user_id=follower_id,
+        author_id=user_id,
+    )
+    await session.commit()
+    await run_in_threadpool(social_graph.record, follower_id, user_id, followed=True)
     return True
 
 
+async def create_user_following_nodes(
+    session: AsyncSession,
+    follower_id: int,
+    user_ids: list[int],
+) -> dict[int, str]:
+    """
+    Make a user follow several users in one transaction.
+
+    The relations are inserted with one `INSERT ... SELECT ... ON CONFLICT DO
+    NOTHING RETURNING`, which skips missing and already followed users and the
+    follower. Only if some other users were skipped are they looked up, with one
+    query, to tell both cases apart. The counters are then updated with one statement per side, and
+    the latest tweets of the new authors are copied into the follower's home
+    timeline with one statement.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    follower_id : int
+        The ID of the user who wants to follow the other users.
+    user_ids : list of int
+        The IDs of the users to be followed.
+
+    Returns
+    -------
+    dict of int to str
+        The outcome for every requested user, in request order: "followed",
+        "already_following", "not_found" or "self".
+    """
+    connection = await session.connection()
+    is_postgresql = connection.dialect.name == "postgresql"
+    insert_follower = postgresql.insert if is_postgresql else sqlite.insert
+    followed_ids = set(await session.scalars(
+        insert_follower(Follower)
+        .from_select(
+            ["user_id", "follower"],
+            select(User.id, literal(follower_id)).where(
+                User.id.in_(user_ids),
+                User.id != follower_id,
+            ),
+        )
+        .on_conflict_do_nothing()
+        .returning(Follower.user_id),
+    ))
+    skipped_ids = [
+        user_id for user_id in user_ids
+        if user_id not in followed_ids and user_id != follower_id
+    ]
+    existing_ids = set()
+    if skipped_ids:
+        existing_ids = set(await session.scalars(
+            select(User.id).where(User.id.in_(skipped_ids)),
+        ))
+
+    if followed_ids:
+        await session.execute(
+            update(User)
+            .where(User.id.in_(sorted(followed_ids)))
+            .values(follower_count=User.follower_count + 1),
+        )
+        await session.execute(
+            update(User)
+            .where(User.id == follower_id)
+            .values(following_count=User.following_count + len(followed_ids)),
+        )
+        await timelines_qr.backfill_authors(
+            session,
+            user_id=follower_id,
+            author_ids=sorted(followed_ids),
+        )
+    await session.commit()
+    await run_in_threadpool(
+        social_graph.record_many,
+        [(follower_id, user_id, True) for user_id in user_ids if user_id in followed_ids],
+    )
+
+    outcomes = {}
+    for user_id in user_ids:
+        if user_id in followed_ids:
+            outcomes[user_id] = "followed"
+        elif user_id == follower_id:
+            outcomes[user_id] = "self"
+        else:
+            outcomes[user_id] = "already_following" if user_id in existing_ids else "not_found"
+    return outcomes
+
+
 async def delete_user_following_node(
     session: AsyncSession,
     follower_id: int,
@@ -163,8 +488,14 @@ async def delete_user_following_node(
     Delete a following relationship between two users.
 
     This function removes the relationship where the user with the given
-    follower_id stops following the user with the given user_id.
-    Raises an HTTP exception if such a relationship is not found.
+    follower_id stops following the user with the given user_id, together with
+    the tweets of that user in the follower's home timeline, and decrements the
+    denormalized follower/following counters. The unfollow is recorded in the
+    journal of the follow graph snapshot once committed.
+
+    The relation is deleted with `DELETE ... RETURNING`, so it is not loaded
+    first. On PostgreSQL the timeline entries and the counters are updated by
+    the same statement through data-modifying CTEs.
 
     Parameters
     ----------
@@ -180,14 +511,156 @@ async def delete_user_following_node(
     bool
         True if the following relationship was successfully deleted, False otherwise.
     """
-    user_following_node = await get_user_following_node(
-        session=session,
-        user_id=user_id,
-        follower_id=follower_id,
+    connection = await session.connection()
+    delete_node = (
+        delete(Follower)
+        .where(
+            Follower.user_id == user_id,
+            Follower.follower == follower_id,
+        )
+        .returning(Follower.user_id, Follower.follower)
     )
+    if connection.dialect.name == "postgresql":
+        unfollowed = delete_node.cte("unfollowed")
+        removed_entries = delete(TimelineEntry).where(
+            tuple_(TimelineEntry.user_id, TimelineEntry.author_id).in_(
+                select(unfollowed.c.follower, unfollowed.c.user_id),
+            ),
+        ).cte("removed_entries")
+        counters_update = _follow_counters_update(unfollowed, delta=-1).add_cte(removed_entries)
+        was_following = (await session.execute(counters_update)).first() is not None
+    else:
+        was_following = (await session.execute(delete_node)).first() is not None
+        if was_following:
+            await timelines_qr.remove_author(
+                session,
+                user_id=follower_id,
+                author_id=user_id,
+            )
+            await _shift_follow_counters(
+                session, follower_id=follower_id, user_id=user_id, delta=-1,
+            )
 
-    if not user_following_node:
-        return False
-    await session.delete(user_following_node)
     await session.commit()
-    return True
+    if was_following:
+        await run_in_threadpool(social_graph.record, follower_id, user_id, followed=False)
+    return was_following
+
+
+def _follow_counters_update(changed_nodes, delta: int):
+    """
+    Build a statement adjusting the counters of both sides of changed follow relationships.
+
+    Parameters
+    ----------
+    changed_nodes : CTE
+        A data-modifying CTE returning the `user_id` and `follower` of the inserted
+        or deleted relationships.
+    delta : int
+        The value added to the counters (1 on follow, -1 on unfollow).
+
+    Returns
+    -------
+    Update
+        An `UPDATE ... FROM` statement returning the IDs of the updated users, none
+        if no relationship was changed.
+    """
+    return (
+        update(User)
+        .where(User.id.in_((changed_nodes.c.user_id, changed_nodes.c.follower)))
+        .values(
+            follower_count=User.follower_count
+            + case((User.id == changed_nodes.c.user_id, delta), else_=0),
+            following_count=User.following_count
+            + case((User.id == changed_nodes.c.follower, delta), else_=0),
+        )
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _shift_follow_counters(
+    session: AsyncSession,
+    follower_id: int,
+    user_id: int,
+    delta: int,
+) -> None:
+    """
+    Adjust the denormalized counters of both sides of a follow relationship.
+
+    The caller is responsible for committing the transaction.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    follower_id : int
+        The ID of the following user, whose `following_count` is adjusted.
+    user_id : int
+        The ID of the followed user, whose `follower_count` is adjusted.
+    delta : int
+        The value added to both counters (1 on follow, -1 on unfollow).
+    """
+    await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(follower_count=User.follower_count + delta),
+    )
+    await session.execute(
+        update(User)
+        .where(User.id == follower_id)
+        .values(following_count=User.following_count + delta),
+    )
+
+
+async def reconcile_follow_counts(
+    session: AsyncSession,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Repair drift between the follow counters of users and `user_followers`.
+
+    Users are processed in ID ranges of `batch_size`, each range in its own
+    transaction, so locks are held only briefly on a large table.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    batch_size : int
+        The size of the user ID range repaired in one transaction.
+
+    Returns
+    -------
+    int
+        The number of users whose counters were corrected.
+    """
+    max_id = await session.scalar(select(func.max(User.id)))
+    actual_followers = (
+        select(func.count())
+        .where(Follower.user_id == User.id)
+        .scalar_subquery()
+    )
+    actual_following = (
+        select(func.count())
+        .where(Follower.follower == User.id)
+        .scalar_subquery()
+    )
+    repaired = 0
+    for range_start in range(0, (max_id or 0) + 1, batch_size):
+        result = await session.execute(
+            update(User)
+            .where(
+                User.id > range_start,
+                User.id <= range_start + batch_size,
+                (User.follower_count != actual_followers)
+                | (User.following_count != actual_following),
+            )
+            .values(
+                follower_count=actual_followers,
+                following_count=actual_following,
+            ),
+        )
+        await session.commit()
+        repaired += result.rowcount
+    return repaired
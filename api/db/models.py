@@ -1,8 +1,8 @@
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import ForeignKey, String, func
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import JSON, BigInteger, ForeignKey, Index, String, func, text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, query_expression, relationship
 
 
 class Base(DeclarativeBase):
@@ -30,6 +30,10 @@ class Follower(Base):
     """
 
     __tablename__ = "user_followers"
+    __table_args__ = (
+        Index("ix_user_followers_follower_user_id", "follower", "user_id"),
+    )
+
     user_id: Mapped[int] = mapped_column(
         ForeignKey(
             "users.id",
@@ -60,6 +64,10 @@ class User(Base):
         The name of the user, with a maximum length of 50 characters.
     api_key : str
         The unique API key for the user, with a maximum length of 30 characters.
+    follower_count : int
+        The denormalized number of users following this user.
+    following_count : int
+        The denormalized number of users this user follows.
     following : List[User]
         The list of users that this user is following.
     followers : List[User]
@@ -74,6 +82,8 @@ class User(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50))
     api_key: Mapped[str] = mapped_column(String(30), unique=True)
+    follower_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    following_count: Mapped[int] = mapped_column(default=0, server_default="0")
 
     following: Mapped[List["User"]] = relationship(
         secondary="user_followers",
@@ -118,15 +128,26 @@ class Tweet(Base):
         The timestamp when the tweet was created.
     user_id : int
         The ID of the user who created the tweet.
+    like_count : int
+        The denormalized number of likes of the tweet.
+    liked_by_me : bool | None
+        Whether the viewing user liked the tweet; only loaded by feed queries.
     attachments : List[Image]
         The list of images attached to the tweet.
     author : User
         The user who created the tweet.
     tweet_likes : List[TweetLike]
         The list of likes associated with the tweet.
+    table_args : tuple
+        The composite index on (created_at, id) backing the keyset-paginated feed
+        and the index on (user_id, created_at, id) for the tweets of an author.
     """
 
     __tablename__ = "tweets"
+    __table_args__ = (
+        Index("ix_tweets_created_at_id", "created_at", "id"),
+        Index("ix_tweets_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     content: Mapped[str] = mapped_column(
@@ -138,6 +159,8 @@ class Tweet(Base):
     user_id: Mapped[int] = mapped_column(
         ForeignKey("users.id"),
     )
+    like_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    liked_by_me: Mapped[bool | None] = query_expression()
     attachments: Mapped[List["Image"]] = relationship(
         lazy="noload",
         cascade="all, delete-orphan",
@@ -166,11 +189,36 @@ class Image(Base):
         The unique identifier for the image.
     tweet_id : int | None
         The ID of the tweet the image is attached to; can be nullable.
+    user_id : int | None
+        The ID of the user who uploaded the image, the only one who can attach it to a
+        tweet; None for images uploaded before uploads were authenticated.
     src : str
-        The source URL or path of the image.
+        The source URL or path of the image, indexed to find the images sharing a file.
+    content_hash : str | None
+        The SHA-256 hash of the image file, shared by every upload of the same content;
+        None for images stored before content addressing.
+    width : int | None
+        The width of the original image in pixels.
+    height : int | None
+        The height of the original image in pixels.
+    variants : dict | None
+        The WebP derivatives of the image by name, each with its `src`, `width` and
+        `height`; None for images stored before derivatives were rendered.
+    created_at : datetime
+        The upload time of the image, used to delete images never attached to a tweet.
+    table_args : tuple
+        The partial index on `created_at` of the images not attached to a tweet,
+        which the media sweeper scans for expired uploads.
     """
 
     __tablename__ = "images"
+    __table_args__ = (
+        Index(
+            "ix_images_unattached_created_at",
+            "created_at",
+            postgresql_where=text("tweet_id IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     tweet_id: Mapped[int] = mapped_column(
@@ -179,8 +227,95 @@ class Image(Base):
             ondelete="CASCADE",
         ),
         nullable=True,
+        index=True,
+    )
+    user_id: Mapped[int | None] = mapped_column(
+        ForeignKey(
+            "users.id",
+            ondelete="CASCADE",
+        ),
+        index=True,
     )
+    src: Mapped[str] = mapped_column(index=True)
+    content_hash: Mapped[str | None] = mapped_column(String(64), index=True)
+    width: Mapped[int | None]
+    height: Mapped[int | None]
+    variants: Mapped[dict | None] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(
+        insert_default=func.now(),
+        server_default=func.now(),
+    )
+
+
+class PendingFileDeletion(Base):
+    """
+    A model representing an image file queued for removal from the disk.
+
+    Rows are written in the transaction that deletes the images, so a file is
+    never forgotten, and the media sweeper removes the file later, unless another
+    image with the same content still uses it.
+
+    Attributes
+    ----------
+    tablename : str
+        The name of the table in the database.
+    id : int
+        The unique identifier for the queued removal.
+    src : str
+        The source path of the image file to remove.
+    created_at : datetime
+        The time the removal was queued.
+    """
+
+    __tablename__ = "pending_file_deletions"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
     src: Mapped[str]
+    created_at: Mapped[datetime] = mapped_column(insert_default=func.now())
+
+
+class MediaUpload(Base):
+    """
+    A model representing a resumable upload in progress.
+
+    The received bytes are kept in a staging file named after the upload, and
+    `offset` only advances once they are written to it, so a client resumes from
+    `offset` after a dropped connection. Uploads not finalized before `expires_at`
+    are deleted by the media sweeper with their staging files.
+
+    Attributes
+    ----------
+    tablename : str
+        The name of the table in the database.
+    id : str
+        The random token identifying the upload, also the name of its staging file.
+    user_id : int | None
+        The ID of the user who started the upload, the only one who can continue,
+        inspect or finalize it; None for uploads started before they were owned.
+    file_name : str
+        The name of the uploaded file, which gives its type.
+    size : int
+        The total size of the file in bytes.
+    offset : int
+        The number of bytes received so far.
+    expires_at : datetime
+        The time after which the upload is abandoned, indexed for the media sweeper.
+    """
+
+    __tablename__ = "media_uploads"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int | None] = mapped_column(
+        ForeignKey(
+            "users.id",
+            ondelete="CASCADE",
+        ),
+        index=True,
+    )
+    file_name: Mapped[str]
+    size: Mapped[int] = mapped_column(BigInteger)
+    offset: Mapped[int] = mapped_column(BigInteger, default=0)
+    expires_at: Mapped[datetime] = mapped_column(index=True)
 
 
 class TweetLike(Base):
@@ -216,7 +351,62 @@ class TweetLike(Base):
             ondelete="CASCADE",
         ),
         primary_key=True,
+        index=True,
     )
 
     user: Mapped["User"] = relationship(back_populates="tweet_likes")
     tweet: Mapped["Tweet"] = relationship(back_populates="tweet_likes")
+
+
+class TimelineEntry(Base):
+    """
+    A model representing a tweet materialized into a user's home timeline.
+
+    Rows are written when a tweet is created (fan-out-on-write) and when a user
+    starts following an author, so reading a home timeline page is a single
+    range scan over `ix_home_timelines_user_created_at`.
+
+    Attributes
+    ----------
+    tablename : str
+        The name of the table in the database.
+    user_id : int
+        The ID of the user who owns the timeline.
+    tweet_id : int
+        The ID of the tweet in the timeline.
+    author_id : int
+        The ID of the author of the tweet, used to drop entries on unfollow.
+    created_at : datetime
+        The creation time of the tweet, copied to keep the timeline ordered.
+    table_args : tuple
+        The composite index on (user_id, created_at, tweet_id).
+    """
+
+    __tablename__ = "home_timelines"
+    __table_args__ = (
+        Index("ix_home_timelines_user_created_at", "user_id", "created_at", "tweet_id"),
+    )
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey(
+            "users.id",
+            ondelete="CASCADE",
+        ),
+        primary_key=True,
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey(
+            "tweets.id",
+            ondelete="CASCADE",
+        ),
+        primary_key=True,
+        index=True,
+    )
+    author_id: Mapped[int] = mapped_column(
+        ForeignKey(
+            "users.id",
+            ondelete="CASCADE",
+        ),
+        index=True,
+    )
+    created_at: Mapped[datetime]
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -30,29 +32,76 @@ class UserWithFollowersAndFollowing(UserOut):
         A list of users who follow this user. Default is an empty list.
     following : list[UserOut], optional
         A list of users whom this user follows. Default is an empty list.
+    follower_count : int, optional
+        The number of users who follow this user. Default is 0.
+    following_count : int, optional
+        The number of users whom this user follows. Default is 0.
+    followers_next_cursor : int | None, optional
+        The cursor of the next page of followers, or None if all of them are listed.
+    following_next_cursor : int | None, optional
+        The cursor of the next page of followed users, or None if all of them are listed.
     """
 
     followers: list[UserOut] = []
     following: list[UserOut] = []
+    follower_count: int = 0
+    following_count: int = 0
+    followers_next_cursor: int | None = None
+    following_next_cursor: int | None = None
 
 
-class LikeOut(BaseModel):
+class SuggestionOut(UserOut):
     """
-    A like output model.
+    A user suggested to follow.
 
     Attributes
     ----------
-    user_id : int
-        The unique identifier of the user who liked the tweet.
-    tweet_id : int
-        The unique identifier of the tweet that was liked.
+    mutual_count : int
+        The number of followed users who follow the suggested user.
+    follows_you : bool
+        Whether the suggested user follows the current user.
     """
 
-    class Config:
-        from_attributes = True
+    mutual_count: int
+    follows_you: bool
+
+
+class RelationshipOut(BaseModel):
+    """
+    The follow relationship between the current user and another user.
+
+    Attributes
+    ----------
+    following : bool
+        Whether the current user follows the other user.
+    followed_by : bool
+        Whether the other user follows the current user.
+    mutual : bool
+        Whether both users follow each other.
+    """
+
+    following: bool
+    followed_by: bool
+    mutual: bool
 
-    user_id: int
-    tweet_id: int
+
+class ImageVariantOut(BaseModel):
+    """
+    An output model of a resized WebP derivative of an image.
+
+    Attributes
+    ----------
+    src : str
+        The source URL of the derivative.
+    width : int
+        The width of the derivative in pixels.
+    height : int
+        The height of the derivative in pixels.
+    """
+
+    src: str
+    width: int
+    height: int
 
 
 class ImageOut(BaseModel):
@@ -63,12 +112,22 @@ class ImageOut(BaseModel):
     ----------
     src : str
         The source URL of the image.
+    width : int | None, optional
+        The width of the image in pixels. Default is None.
+    height : int | None, optional
+        The height of the image in pixels. Default is None.
+    variants : dict[str, ImageVariantOut], optional
+        The derivatives of the image by name ("thumbnail", "feed", "full").
+        Default is an empty dict.
     """
 
     class Config:
         from_attributes = True
 
     src: str
+    width: int | None = None
+    height: int | None = None
+    variants: dict[str, ImageVariantOut] = {}
 
 
 class TweetOut(BaseModel):
@@ -83,10 +142,16 @@ class TweetOut(BaseModel):
         The content of the tweet.
     attachments : list[str], optional
         A list of attachment URLs associated with the tweet. Default is an empty list.
+    media : list[ImageOut], optional
+        The attachments with their dimensions and derivatives, in the order of
+        `attachments`, so clients can pick the smallest suitable size.
+        Default is an empty list.
     author : UserOut
         The author of the tweet.
-    likes : list[LikeOut], optional
-        A list of likes associated with the tweet. Default is an empty list.
+    like_count : int, optional
+        The number of likes of the tweet. Default is 0.
+    liked_by_me : bool, optional
+        Whether the current user liked the tweet. Default is False.
     """
 
     class Config:
@@ -95,8 +160,10 @@ class TweetOut(BaseModel):
     id: int
     content: str
     attachments: list[str] = []
+    media: list[ImageOut] = []
     author: UserOut
-    likes: list[LikeOut] = []
+    like_count: int = 0
+    liked_by_me: bool = False
 
 
 class UserResponse(BaseModel):
@@ -115,6 +182,96 @@ class UserResponse(BaseModel):
     user: UserWithFollowersAndFollowing
 
 
+class UsersPageResponse(BaseModel):
+    """
+    A response model for a page of followers or followed users.
+
+    Attributes
+    ----------
+    result : bool
+        The result of the request.
+    users : list[UserOut]
+        The users of the page, ordered by ID.
+    next_cursor : int | None
+        The cursor of the next page, or None if this is the last page.
+    """
+
+    result: bool
+    users: list[UserOut] = []
+    next_cursor: int | None = None
+
+
+class SuggestionsResponse(BaseModel):
+    """
+    A response model for follow suggestions.
+
+    Attributes
+    ----------
+    result : bool
+        The result of the request.
+    users : list[SuggestionOut]
+        The suggested users, best first.
+    """
+
+    result: bool
+    users: list[SuggestionOut] = []
+
+
+class RelationshipsResponse(BaseModel):
+    """
+    A response model for a batch relationship lookup.
+
+    Attributes
+    ----------
+    result : bool
+        The result of the request.
+    relationships : dict[int, RelationshipOut]
+        The relationship with every requested user, by user ID.
+    """
+
+    result: bool
+    relationships: dict[int, RelationshipOut] = {}
+
+
+class BulkFollowResponse(BaseModel):
+    """
+    A response model for a bulk follow request.
+
+    Attributes
+    ----------
+    result : bool
+        The result of the request.
+    followed_count : int
+        The number of users followed by the request.
+    outcomes : dict[int, str]
+        The outcome for every requested user, by user ID: "followed",
+        "already_following", "not_found" or "self".
+    """
+
+    result: bool
+    followed_count: int
+    outcomes: dict[int, Literal["followed", "already_following", "not_found", "self"]] = {}
+
+
+class UsersBatchResponse(BaseModel):
+    """
+    A response model for a batch lookup of users.
+
+    Attributes
+    ----------
+    result : bool
+        The result of the request.
+    users : list[UserOut]
+        The existing users, in request order.
+    missing_ids : list[int]
+        The requested IDs of users that do not exist, in request order.
+    """
+
+    result: bool
+    users: list[UserOut] = []
+    missing_ids: list[int] = []
+
+
 class TweetsResponse(BaseModel):
     """
     A response model for tweet-related API requests.
@@ -125,7 +282,29 @@ class TweetsResponse(BaseModel):
         The result of the request.
     tweets : list[TweetOut]
         A list of tweets.
+    next_cursor : str | None
+        The cursor of the next feed page, or None if this is the last page.
+    """
+
+    result: bool
+    tweets: list[TweetOut] = []
+    next_cursor: str | None = None
+
+
+class TweetsBatchResponse(BaseModel):
+    """
+    A response model for a batch lookup of tweets.
+
+    Attributes
+    ----------
+    result : bool
+        The result of the request.
+    tweets : list[TweetOut]
+        The existing tweets, in request order.
+    missing_ids : list[int]
+        The requested IDs of tweets that do not exist, in request order.
     """
 
     result: bool
     tweets: list[TweetOut] = []
+    missing_ids: list[int] = []
@@ -1,11 +1,15 @@
+from datetime import datetime
 from typing import Annotated, AsyncGenerator
 
-from fastapi import Depends, Header
+from fastapi import Depends, Header, Query, Request, status
 from fastapi.exceptions import HTTPException
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from .core import db_helper
-from .db import User, users_qr
+from .core import api_key_cache, db_helper, settings
+from .db import User, UserOut, users_qr
+from .routers.router_helpers import decode_cursor
 
 
 async def scoped_session_db() -> AsyncGenerator[AsyncSession, None]:
@@ -26,14 +30,45 @@ async def scoped_session_db() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
+async def scoped_read_session_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provide a scoped database session for read-only FastAPI endpoints.
+
+    The session is bound to a read replica, unless no replica is healthy or the
+    `settings.db_last_write_cookie` cookie tells that the client wrote recently;
+    then the primary is used.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming HTTP request.
+
+    Yields
+    ------
+    AsyncSession
+        An asynchronous session object for read operations.
+    """
+    try:
+        last_write_at = float(request.cookies.get(settings.db_last_write_cookie, ""))
+    except ValueError:
+        last_write_at = None
+    session = db_helper.get_scoped_read_session(last_write_at=last_write_at)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
 async def get_current_user_by_api_key(
     session: Annotated[AsyncSession, Depends(scoped_session_db)],
     api_key: Annotated[str, Header(max_length=30)],
-) -> User:
+) -> UserOut:
     """
     Get the current user based on the provided API key.
 
-    This dependency retrieves a user from the database using an API key from the request's header.
+    This dependency retrieves a user using an API key from the request's header.
+    Lookups go through `api_key_cache`, so the database is only queried for keys
+    that are not cached; unknown keys are cached as well for a short time.
     If the user is not found, an HTTP 404 error is raised.
 
     Parameters
@@ -45,18 +80,170 @@ async def get_current_user_by_api_key(
 
     Returns
     -------
-    User
-        The user object corresponding to the provided API key.
+    UserOut
+        The user corresponding to the provided API key.
 
     Raises
     ------
     HTTPException
         If no user is found with the provided API key
     """
-    user = await users_qr.get_current_user(session, api_key=api_key)
+    user = api_key_cache.get(api_key)
+    if user is api_key_cache.MISSING:
+        db_user = await users_qr.get_current_user(session, api_key=api_key)
+        user = None if db_user is None else UserOut.model_validate(db_user, from_attributes=True)
+        api_key_cache.set(api_key, user)
     if user is None:
         raise HTTPException(
             status_code=404,
             detail=f"User with api_key: {api_key} not found",
         )
     return user
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changed_users(session: Session, flush_context) -> None:
+    """
+    Remember the users a flush inserted, changed or deleted until the transaction ends.
+
+    Parameters
+    ----------
+    session : Session
+        The flushed session.
+    flush_context : UOWTransaction
+        The internal state of the flush.
+    """
+    changed_users = session.info.setdefault("changed_users", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, User):
+            changed_users.add((instance.id, instance.api_key))
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_cached_users(session: Session) -> None:
+    """
+    Drop the users changed by a committed transaction from `api_key_cache`.
+
+    Both the keys cached for a user and its current API key are forgotten, so
+    that a new or changed key is not answered from the negative cache. Nothing
+    is dropped before the commit, so a concurrent request cannot cache the old
+    row again in the meantime. Other worker processes are not notified, their
+    cached users expire after `settings.auth_cache_ttl` seconds.
+
+    Parameters
+    ----------
+    session : Session
+        The committed session.
+    """
+    for user_id, api_key in session.info.pop("changed_users", ()):
+        api_key_cache.invalidate_user(user_id)
+        api_key_cache.invalidate(api_key)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def forget_changed_users(session: Session, previous_transaction) -> None:
+    """
+    Forget the users changed by a rolled back transaction, which stay valid in the cache.
+
+    Parameters
+    ----------
+    session : Session
+        The rolled back session.
+    previous_transaction : SessionTransaction
+        The transaction that was rolled back.
+    """
+    if previous_transaction.parent is None:
+        session.info.pop("changed_users", None)
+
+
+async def get_page_key(
+    cursor: Annotated[str | None, Query()] = None,
+) -> tuple[datetime, int] | None:
+    """
+    Decode the `cursor` query parameter of a keyset-paginated endpoint.
+
+    Parameters
+    ----------
+    cursor : str, optional
+        The cursor returned with the previous page.
+
+    Returns
+    -------
+    tuple of (datetime, int) or None
+        The `(created_at, id)` key the requested page starts after, or None for
+        the first page.
+
+    Raises
+    ------
+    HTTPException
+        If the cursor is malformed (422 status).
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid cursor",
+        )
+
+
+async def get_batch_ids(
+    ids: Annotated[str, Query(min_length=1)],
+) -> list[int]:
+    """
+    Parse the comma-separated `ids` query parameter of a batch endpoint.
+
+    Parameters
+    ----------
+    ids : str
+        The requested IDs, such as `2,5,7`.
+
+    Returns
+    -------
+    list of int
+        The requested IDs in request order, without duplicates.
+
+    Raises
+    ------
+    HTTPException
+        If an ID is not a positive integer or more than `settings.batch_max_ids`
+        IDs are requested (422 status).
+    """
+    try:
+        batch_ids = list(dict.fromkeys(int(batch_id) for batch_id in ids.split(",")))
+    except ValueError:
+        batch_ids = []
+    if not batch_ids or min(batch_ids) < 1:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids should be a comma-separated list of positive integers",
+        )
+    if len(batch_ids) > settings.batch_max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.batch_max_ids} ids can be requested at once",
+        )
+    return batch_ids
+
+
+async def get_optional_batch_ids(
+    ids: Annotated[str | None, Query(min_length=1)] = None,
+) -> list[int] | None:
+    """
+    Parse the `ids` query parameter of an endpoint that also works without it.
+
+    Parameters
+    ----------
+    ids : str, optional
+        The requested IDs, such as `2,5,7`.
+
+    Returns
+    -------
+    list of int or None
+        The requested IDs as parsed by `get_batch_ids`, or None if they are omitted.
+    """
+    if ids is None:
+        return None
+    return await get_batch_ids(ids)
@@ -0,0 +1,128 @@
+"""
+Follow suggestions computed from the shared follow graph snapshot.
+
+The snapshot in `settings.dir_social_graph` is built from `user_followers` when
+it is missing and compacted in the background once
+`settings.social_graph_compact_events` follows and unfollows are waiting in its
+journal. Only one worker process rebuilds or compacts it at a time; the others
+pick the new snapshot up on their next suggestion. The blocking file operations
+and the ranking run in the thread pool, off the event loop.
+"""
+
+import asyncio
+import os
+from array import array
+from contextlib import ExitStack, suppress
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .core import db_helper, settings, social_graph
+from .db import users_qr
+
+
+async def rebuild_social_graph(session: AsyncSession, if_missing: bool = False) -> bool:
+    """
+    Replace the follow graph snapshot with the content of `user_followers`.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    if_missing : bool, optional
+        Whether to skip the rebuild if another worker built the snapshot while this
+        one waited for the graph.
+
+    Returns
+    -------
+    bool
+        True if the snapshot was rebuilt.
+    """
+    with ExitStack() as stack:
+        rebuilding = await run_in_threadpool(
+            stack.enter_context,
+            social_graph.rebuilding(if_missing=if_missing),
+        )
+        if not rebuilding:
+            return False
+        follower_ids, user_ids = array("i"), array("i")
+        async for follower_id, user_id in users_qr.stream_follow_edges(session):
+            follower_ids.append(follower_id)
+            user_ids.append(user_id)
+        await run_in_threadpool(
+            social_graph.write_snapshot,
+            max(follower_ids + user_ids, default=0) + 1,
+            zip(follower_ids, user_ids),
+        )
+    return True
+
+
+async def suggest_users(session: AsyncSession, user_id: int, limit: int) -> list[dict]:
+    """
+    Suggest users to follow, ranked by the number of followed users who follow them.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    user_id : int
+        The ID of the user the suggestions are for.
+    limit : int
+        The maximum number of suggestions.
+
+    Returns
+    -------
+    list of dict
+        The suggested users in the shape of `SuggestionOut`, best first.
+    """
+    ranked = await run_in_threadpool(social_graph.suggest, user_id, limit)
+    users = await users_qr.get_users_by_ids(
+        session,
+        user_ids=[candidate_id for candidate_id, _, _ in ranked],
+    )
+    names = {user.id: user.name for user in users}
+    return [
+        {
+            "id": candidate_id,
+            "name": names[candidate_id],
+            "mutual_count": mutual_count,
+            "follows_you": follows_you,
+        }
+        for candidate_id, mutual_count, follows_you in ranked
+        if candidate_id in names
+    ]
+
+
+async def _build_in_new_session() -> None:
+    """Build the missing snapshot through a session of its own."""
+    session = db_helper.get_scoped_session()
+    try:
+        await rebuild_social_graph(session, if_missing=True)
+    finally:
+        await session.close()
+
+
+async def run_social_graph_maintainer(interval: float) -> None:
+    """
+    Keep the follow graph snapshot up to date until cancelled.
+
+    The snapshot is built on start if it does not exist yet, by the first worker
+    to hold the graph, then compacted every `interval` seconds if enough journal
+    entries are waiting. A build that fails, for instance because the database
+    is unreachable, is retried after `interval` seconds; nothing is compacted
+    until it succeeds.
+
+    Parameters
+    ----------
+    interval : float
+        The number of seconds between two checks of the journal.
+    """
+    while True:
+        with suppress(SQLAlchemyError, OSError):
+            if not os.path.exists(social_graph.snapshot_path):
+                await _build_in_new_session()
+            pending_events = await run_in_threadpool(social_graph.pending_events)
+            if pending_events >= settings.social_graph_compact_events:
+                await run_in_threadpool(social_graph.compact)
+        await asyncio.sleep(interval)
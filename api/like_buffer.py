@@ -0,0 +1,293 @@
+"""
+Write-behind buffering of likes and unlikes.
+
+With `settings.like_buffer_enabled`, the like endpoints only record the intent
+of the user in the buffer of the worker process. Intents are coalesced per
+(user, tweet), so a burst of likes and unlikes of the same tweet ends up as at
+most one row change, and are written in bulk every
+`settings.like_buffer_flush_interval` seconds, as soon as
+`settings.like_buffer_max_size` intents are waiting, and on shutdown. The feed
+endpoints apply the pending intents of the viewer to `liked_by_me` and
+`like_count`, so users see their own likes immediately.
+"""
+
+import asyncio
+from contextlib import suppress
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .core import db_helper, settings
+from .db import likes_qr
+
+
+class LikeBuffer:
+    """
+    In-process buffer of the likes and unlikes not written to the database yet.
+
+    Every (user, tweet) pair keeps only the latest intent. The intents being
+    flushed stay visible until their transaction is committed, and are put
+    back, behind any newer intent, if it fails.
+
+    Methods
+    -------
+    add(self, user_id: int, tweet_id: int, liked: bool)
+        Records the latest intent of a user for a tweet.
+    get(self, user_id: int, tweet_id: int)
+        Returns the pending intent of a user for a tweet, or None.
+    pending_for(self, user_id: int)
+        Returns the pending intents of a user by tweet ID.
+    take(self)
+        Hands the pending intents over to a flush.
+    finish(self, flushed: bool)
+        Ends a flush, putting its intents back if they were not written.
+    wait_full(self)
+        Waits until `max_size` intents are pending.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Initialize an empty buffer.
+
+        Parameters
+        ----------
+        max_size : int
+            The number of pending intents that makes the buffer full.
+        """
+        self.max_size = max_size
+        self._pending: dict[int, dict[int, bool]] = {}
+        self._flushing: dict[int, dict[int, bool]] = {}
+        self._size = 0
+        self._full = asyncio.Event()
+
+    def __len__(self) -> int:
+        """Return the number of pending intents."""
+        return self._size
+
+    def add(self, user_id: int, tweet_id: int, liked: bool) -> None:
+        """
+        Record the latest intent of a user for a tweet.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the user.
+        tweet_id : int
+            The ID of the tweet.
+        liked : bool
+            True for a like, False for an unlike.
+        """
+        user_intents = self._pending.setdefault(user_id, {})
+        if tweet_id not in user_intents:
+            self._size += 1
+        user_intents[tweet_id] = liked
+        if self._size >= self.max_size:
+            self._full.set()
+
+    def get(self, user_id: int, tweet_id: int) -> bool | None:
+        """
+        Return the pending intent of a user for a tweet.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the user.
+        tweet_id : int
+            The ID of the tweet.
+
+        Returns
+        -------
+        bool or None
+            True for a pending like, False for a pending unlike and None if the
+            database is up to date.
+        """
+        for intents in (self._pending, self._flushing):
+            liked = intents.get(user_id, {}).get(tweet_id)
+            if liked is not None:
+                return liked
+        return None
+
+    def pending_for(self, user_id: int) -> dict[int, bool]:
+        """
+        Return the pending intents of a user.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the user.
+
+        Returns
+        -------
+        dict of int to bool
+            The pending intent for every tweet ID, True for a like.
+        """
+        return {**self._flushing.get(user_id, {}), **self._pending.get(user_id, {})}
+
+    def take(self) -> dict[int, dict[int, bool]]:
+        """
+        Hand the pending intents over to a flush.
+
+        Returns
+        -------
+        dict of int to dict of int to bool
+            The intents by user ID and tweet ID.
+        """
+        self._flushing, self._pending = self._pending, {}
+        self._size = 0
+        self._full.clear()
+        return self._flushing
+
+    def finish(self, flushed: bool) -> None:
+        """
+        End a flush.
+
+        Parameters
+        ----------
+        flushed : bool
+            Whether the intents taken by the flush were committed. If not, they
+            are put back, unless a newer intent was recorded meanwhile.
+        """
+        if not flushed:
+            for user_id, intents in self._flushing.items():
+                for tweet_id, liked in intents.items():
+                    if tweet_id not in self._pending.get(user_id, {}):
+                        self.add(user_id, tweet_id, liked)
+        self._flushing = {}
+
+    async def wait_full(self) -> None:
+        """Wait until `max_size` intents are pending."""
+        await self._full.wait()
+
+
+like_buffer = LikeBuffer(max_size=settings.like_buffer_max_size)
+
+
+async def submit_like(
+    session: AsyncSession,
+    tweet_id: int,
+    user_id: int,
+    liked: bool,
+) -> bool:
+    """
+    Record a like or an unlike in the buffer.
+
+    The current state is taken from the buffer, or read from the database with
+    one statement if nothing is pending, so the endpoints answer as if the
+    intent were written directly.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    tweet_id : int
+        The ID of the tweet.
+    user_id : int
+        The ID of the user.
+    liked : bool
+        True to like the tweet, False to unlike it.
+
+    Returns
+    -------
+    bool
+        True if the intent was recorded, False if the tweet does not exist or is
+        already in the requested state.
+    """
+    current = like_buffer.get(user_id, tweet_id)
+    if current is None:
+        current = await likes_qr.get_like_state(session, tweet_id=tweet_id, user_id=user_id)
+        if current is None:
+            return False
+    if current == liked:
+        return False
+    like_buffer.add(user_id, tweet_id, liked)
+    return True
+
+
+def apply_pending_like(user_id: int | None, tweet_id: int, liked_by_me: bool, like_count: int):
+    """
+    Apply the pending intent of a viewer to the like state of a tweet.
+
+    Parameters
+    ----------
+    user_id : int or None
+        The ID of the viewer.
+    tweet_id : int
+        The ID of the tweet.
+    liked_by_me : bool
+        Whether the viewer likes the tweet according to the database.
+    like_count : int
+        The number of likes of the tweet according to the database.
+
+    Returns
+    -------
+    tuple of (bool, int)
+        The `liked_by_me` and `like_count` of the tweet as seen by the viewer.
+    """
+    if user_id is None:
+        return liked_by_me, like_count
+    liked = like_buffer.get(user_id, tweet_id)
+    if liked is None or liked == liked_by_me:
+        return liked_by_me, like_count
+    return liked, like_count + (1 if liked else -1)
+
+
+async def flush_likes(session: AsyncSession) -> int:
+    """
+    Write the pending intents to the database in one transaction.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+
+    Returns
+    -------
+    int
+        The number of likes inserted or deleted.
+    """
+    likes, unlikes = [], []
+    for user_id, user_intents in like_buffer.take().items():
+        for tweet_id, liked in user_intents.items():
+            (likes if liked else unlikes).append((user_id, tweet_id))
+    changed_count, flushed = 0, False
+    try:
+        if likes or unlikes:
+            changed_count = await likes_qr.apply_like_changes(
+                session, likes=likes, unlikes=unlikes,
+            )
+        flushed = True
+    except SQLAlchemyError:
+        # The intents are put back and retried by the next flush.
+        await session.rollback()
+    finally:
+        like_buffer.finish(flushed)
+    return changed_count
+
+
+async def _flush_in_new_session() -> None:
+    """Flush the buffer through a session of its own."""
+    session = db_helper.get_scoped_session()
+    try:
+        await flush_likes(session)
+    finally:
+        await session.close()
+
+
+async def run_like_flusher(interval: float) -> None:
+    """
+    Flush the buffer every `interval` seconds, or once it is full, until cancelled.
+
+    The buffer is flushed a last time when the task is cancelled on shutdown.
+
+    Parameters
+    ----------
+    interval : float
+        The maximum number of seconds between two flushes.
+    """
+    try:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(like_buffer.wait_full(), timeout=interval)
+            await _flush_in_new_session()
+    finally:
+        await _flush_in_new_session()
@@ -1,14 +1,22 @@
-from contextlib import asynccontextmanager
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import HTTPException, RequestValidationError
 from fastapi.responses import JSONResponse
 from sqlalchemy import select
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from .core import db_helper, settings
+from .core import db_helper, imaging, settings
 from .db import User, create_fake_data_bd
-from .routers import media, tweets, users
+from .follow_suggestions import run_social_graph_maintainer
+from .like_buffer import run_like_flusher
+from .media_sweeper import run_media_sweeper
+from .routers import media, metrics, storage, tweets, users
 
 
 @asynccontextmanager
@@ -17,7 +25,11 @@ async def lifespan(app: FastAPI):
     Asynchronous context manager.
 
     It can be removed or changed. This function is designed to fill the
-    database with fake data.
+    database with fake data. It also runs the health checks of the read
+    replicas, the media sweeper, the follow graph maintainer and, if enabled,
+    the like buffer flusher while the application is up, and on shutdown
+    flushes the buffered likes, stops the image processes and closes the media
+    storage.
 
     Parameters
     ----------
@@ -36,7 +48,32 @@ async def lifespan(app: FastAPI):
     await session.close()
     if not user:
         await create_fake_data_bd()
+
+    replicas_monitor = None
+    if db_helper.replicas:
+        replicas_monitor = asyncio.create_task(
+            db_helper.monitor_replicas(settings.db_replica_check_interval),
+        )
+    media_sweeper = asyncio.create_task(run_media_sweeper(settings.media_sweep_interval))
+    graph_maintainer = asyncio.create_task(
+        run_social_graph_maintainer(settings.social_graph_check_interval),
+    )
+    like_flusher = None
+    if settings.like_buffer_enabled:
+        like_flusher = asyncio.create_task(
+            run_like_flusher(settings.like_buffer_flush_interval),
+        )
     yield
+    if replicas_monitor is not None:
+        replicas_monitor.cancel()
+    media_sweeper.cancel()
+    graph_maintainer.cancel()
+    if like_flusher is not None:
+        like_flusher.cancel()
+        with suppress(asyncio.CancelledError):
+            await like_flusher
+    imaging.shutdown_executor()
+    await storage.media_storage.aclose()
 
 
 app = FastAPI(
@@ -70,9 +107,46 @@ app = FastAPI(
 )
 
 
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    """
+    Route the reads of a client who just wrote to the primary database.
+
+    Every request of an authenticated user that may change data sets the
+    `settings.db_last_write_cookie` cookie to the current time. For the next
+    `settings.db_read_your_writes_window` seconds the reads of the client go to
+    the primary, whichever worker process handles them, so their own likes,
+    follows and tweets are visible even while the replicas catch up.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming HTTP request.
+    call_next : callable
+        The next handler of the request.
+
+    Returns
+    -------
+    Response
+        The response of the next handler.
+    """
+    response = await call_next(request)
+    api_key = request.headers.get("api-key")
+    if api_key is not None and request.method not in {"GET", "HEAD", "OPTIONS"}:
+        response.set_cookie(
+            settings.db_last_write_cookie,
+            f"{time.time():.3f}",
+            max_age=math.ceil(settings.db_read_your_writes_window),
+            httponly=True,
+            samesite="lax",
+        )
+    return response
+
+
 app.include_router(users.router)
 app.include_router(tweets.router)
 app.include_router(media.router)
+app.include_router(metrics.router)
 
 
 @app.exception_handler(HTTPException)
@@ -149,67 +223,114 @@ async def validation_exception_handler(
     )
 
 
-@app.middleware("http")
-async def max_upload_size(request: Request, call_next):
-    """
-    Middleware to enforce maximum upload size in FastAPI applications.
-
-    This middleware checks if the incoming request contains a file that exceeds
-    the allowable size limit (1MB). If the file is too large, it returns a JSON
-    response with a 413 status code and an appropriate error message.
-
-    Parameters
-    ----------
-    request : Request
-        The incoming HTTP request.
-    call_next : function
-        The next middleware or endpoint to be called if the request passes the size check.
+class UploadTooLargeError(Exception):
+    """Raised while reading a request body that exceeds the upload size limit."""
 
-    Returns
-    -------
-    JSONResponse or Response
-        A response object, either with a 413 status code and error details if the file
-        is too large, or the response from the next middleware/endpoint if the file size
-        is within the acceptable limit.
 
+class MaxUploadSizeMiddleware:
     """
-    try:
-        if is_file_too_large(request):
-            return JSONResponse(
-                status_code=413,
-                content={
-                    "result": False,
-                    "error_type": "error max size",
-                    "error_message": "File too large. Maximum allowed size is 1MB",
-                },
-            )
-    except (ValueError, KeyError):
-        pass
-    return await call_next(request)
-
+    ASGI middleware enforcing the maximum size of multipart uploads.
 
-def is_file_too_large(request: Request) -> bool:
+    Requests declaring a larger `Content-Length` are rejected before their body
+    is read. Bodies without a trustworthy length, such as chunked uploads, are
+    counted as they arrive: once the limit of the path is exceeded, reading stops
+    and a 413 response replaces whatever the application answered.
     """
-    Check if the uploaded file in the request exceeds the maximum allowable size.
 
-    This function inspects the 'Content-Type' and 'Content-Length' headers of the incoming request
-    to determine if it contains a file that is too large. It specifically checks for files
-    submitted through multipart/form-data encoding.
-
-    Parameters
-    ----------
-    request : Request
-        The incoming HTTP request containing the file upload.
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_size: int,
+        path_max_sizes: dict[str, int] | None = None,
+    ):
+        """
+        Wrap an ASGI application.
+
+        Parameters
+        ----------
+        app : ASGIApp
+            The wrapped application.
+        max_size : int
+            The maximum size of a multipart body, in bytes.
+        path_max_sizes : dict of str to int, optional
+            The maximum sizes of the multipart bodies sent to specific paths,
+            overriding `max_size`.
+        """
+        self.app = app
+        self.max_size = max_size
+        self.path_max_sizes = path_max_sizes or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Handle a request, cutting off multipart bodies above the size limit.
+
+        Parameters
+        ----------
+        scope : Scope
+            The connection scope.
+        receive : Receive
+            The channel receiving the request body.
+        send : Send
+            The channel sending the response.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if "multipart/form-data" not in headers.get("content-type", ""):
+            await self.app(scope, receive, send)
+            return
+
+        max_size = self.path_max_sizes.get(scope["path"], self.max_size)
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_size:
+            await self._reject(scope, receive, send, max_size)
+            return
+
+        received_size = 0
+        too_large = False
+
+        async def limited_receive() -> Message:
+            nonlocal received_size, too_large
+            message = await receive()
+            received_size += len(message.get("body", b""))
+            if received_size > max_size:
+                too_large = True
+                raise UploadTooLargeError
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            if not too_large:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            too_large = True
+        if too_large:
+            await self._reject(scope, receive, send, max_size)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send, max_size: int) -> None:
+        response = JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={
+                "result": False,
+                "error_type": "error max size",
+                "error_message": "File too large. Maximum allowed size is {0}MB".format(
+                    max_size // (1024 * 1024),
+                ),
+            },
+        )
+        await response(scope, receive, send)
 
-    Returns
-    -------
-    bool
-        True if the file exceeds the maximum allowable size, False otherwise.
-    """
-    content_type = request.headers.get("content-type")
-    content_length = request.headers.get("content-length")
 
-    is_multipart = content_type and "multipart/form-data" in content_type
-    if is_multipart and content_length:
-        return int(content_length) > settings.max_file_size_bytes
-    return False
+app.add_middleware(
+    MaxUploadSizeMiddleware,
+    max_size=settings.max_file_size_bytes,
+    # Batch uploads may take the size of a file for each of their files.
+    path_max_sizes={
+        f"{media.router.prefix}/batch": (
+            settings.max_file_size_bytes * settings.media_batch_max_files
+        ),
+    },
+)
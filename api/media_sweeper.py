@@ -0,0 +1,165 @@
+"""
+Garbage collection of uploaded media.
+
+Images uploaded but never attached to a tweet are deleted after
+`settings.media_orphan_grace_period`, and the files of deleted images are
+removed from the media storage, in batches of `settings.media_sweep_batch_size`.
+Resumable uploads not finalized in time are deleted with their staged data.
+"""
+
+import asyncio
+import os
+import re
+import time
+from contextlib import suppress
+from datetime import timedelta
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .core import db_helper, render_cache, settings
+from .db import medias_qr
+from .routers import storage
+
+CONTENT_HASH = re.compile("[0-9a-f]{64}")
+
+
+async def remove_image_files(image_src: str) -> bool:
+    """
+    Remove the file of an image with its derivatives and resized copies.
+
+    The original and its WebP derivatives are deleted from the media storage and
+    the resized copies from the local render cache. A file that a new upload of the
+    same content matched within the last `settings.media_file_reuse_window` seconds
+    is kept, since the image of that upload may not be committed yet.
+
+    Parameters
+    ----------
+    image_src : str
+        The source URL of the image file.
+
+    Returns
+    -------
+    bool
+        False if the file was kept because it was reused recently, otherwise True.
+    """
+    media_storage = storage.media_storage
+    key = media_storage.key(image_src)
+    modified_at = await media_storage.modified_at(key)
+    if modified_at is None:
+        return True
+    if modified_at > time.time() - settings.media_file_reuse_window:
+        return False
+
+    await media_storage.delete(key)
+    shard_dir, file_name = os.path.split(key)
+    stem = os.path.splitext(file_name)[0]
+    if not CONTENT_HASH.fullmatch(stem):
+        # Files stored before content addressing have no derivatives.
+        return True
+    for variant_name in settings.image_variant_sizes:
+        await media_storage.delete(os.path.join(shard_dir, f"{stem}_{variant_name}.webp"))
+    await run_in_threadpool(_remove_rendered_images, stem)
+    return True
+
+
+def _remove_rendered_images(content_hash: str) -> None:
+    """
+    Remove the resized copies of an image from the render cache.
+
+    Parameters
+    ----------
+    content_hash : str
+        The content hash of the image.
+    """
+    rendered_paths = []
+    with suppress(FileNotFoundError), os.scandir(render_cache.cache_dir) as entries:
+        rendered_paths = [
+            entry.path for entry in entries if entry.name.startswith(f"{content_hash}_")
+        ]
+    for rendered_path in rendered_paths:
+        with suppress(FileNotFoundError):
+            os.remove(rendered_path)
+
+
+async def sweep_media(session: AsyncSession, batch_size: int) -> tuple[int, int]:
+    """
+    Delete expired unattached images and uploads and remove the queued files.
+
+    Every batch is a separate transaction, so locks are held briefly whatever
+    the size of the backlog.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The asynchronous session for database operations.
+    batch_size : int
+        The maximum number of images or files handled in one transaction.
+
+    Returns
+    -------
+    tuple of (int, int)
+        The numbers of deleted images and of removed files, including staged uploads.
+    """
+    grace_period = timedelta(seconds=settings.media_orphan_grace_period)
+    deleted_count = batch_size
+    images_deleted = 0
+    while deleted_count == batch_size:
+        deleted_count = await medias_qr.delete_unattached_medias(
+            session,
+            grace_period=grace_period,
+            batch_size=batch_size,
+        )
+        images_deleted += deleted_count
+
+    files_removed = 0
+    reused_srcs: list[str] = []
+    taken_count = batch_size
+    while taken_count == batch_size:
+        taken_count, image_srcs = await medias_qr.take_file_deletions(
+            session,
+            batch_size=batch_size,
+        )
+        for image_src in image_srcs:
+            if await remove_image_files(image_src):
+                files_removed += 1
+            else:
+                reused_srcs.append(image_src)
+
+    expired_count = batch_size
+    while expired_count == batch_size:
+        expired_ids = await medias_qr.delete_expired_uploads(session, batch_size=batch_size)
+        expired_count = len(expired_ids)
+        for upload_id in expired_ids:
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(settings.dir_staged_uploads, f"{upload_id}.part"))
+                files_removed += 1
+
+    if reused_srcs:
+        # Checked again on the next run, once the new image is committed or abandoned.
+        await medias_qr.queue_file_deletions(session, image_srcs=reused_srcs)
+        await session.commit()
+    return images_deleted, files_removed
+
+
+async def run_media_sweeper(interval: float) -> None:
+    """
+    Sweep the media every `interval` seconds until cancelled.
+
+    Parameters
+    ----------
+    interval : float
+        The number of seconds between two sweeps.
+    """
+    while True:
+        session = db_helper.get_scoped_session()
+        try:
+            await sweep_media(session, batch_size=settings.media_sweep_batch_size)
+        except (SQLAlchemyError, OSError, httpx.HTTPError):
+            # The next sweep retries the batches that were not committed.
+            await session.rollback()
+        finally:
+            await session.close()
+        await asyncio.sleep(interval)
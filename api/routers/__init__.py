@@ -21,6 +21,15 @@ Modules
     uploading, retrieving, updating, and handling any additional media-related
     functionalities.
 
+- 'storage':
+    The `storage` module stores the media files, either on the local
+    filesystem or in an S3-compatible bucket that clients can upload to
+    directly with presigned URLs.
+
+- 'metrics':
+    The `metrics` module exposes internal counters of the application, such as
+    the hit rate of the authentication cache.
+
 - 'utils':
     The `utils` module contains helper functions for processing data obtained
     through the routes.
@@ -1,11 +1,40 @@
-from typing import Annotated
+import asyncio
+import os
+from datetime import timedelta
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.responses import FileResponse, Response
+from PIL import Image as PILImage
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import medias_qr
-from ..dependencies import scoped_session_db
-from .router_helpers import save_tweet_image
+from ..core import settings
+from ..db import MediaUpload, UserOut, medias_qr
+from ..dependencies import get_current_user_by_api_key, scoped_read_session_db, scoped_session_db
+from . import storage
+from .router_helpers import (
+    IMAGE_CONTENT_TYPES,
+    IMAGE_EXTENSIONS,
+    RENDER_FORMATS,
+    get_resized_image,
+    parse_image_key,
+    store_staged_upload,
+    store_tweet_image,
+    upload_tweet_image,
+    write_upload_chunk,
+)
 
 router = APIRouter(
     prefix="/api/medias",
@@ -16,19 +45,213 @@ router = APIRouter(
 @router.post("/")
 async def load_media(
     file: Annotated[UploadFile, File()],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
     session: Annotated[AsyncSession, Depends(scoped_session_db)],
 ):
     """
     Upload and save a media file.
 
-    This endpoint allows uploading a media file. The file is saved and a record is created in the
-    database. Only supported file types are allowed.
+    This endpoint allows uploading a media file. The file is saved under its content hash and a
+    record is created in the database. Only supported file types are allowed. Resized WebP
+    derivatives without EXIF metadata are rendered on the image process pool, so the event
+    loop is not blocked, and recorded with the dimensions of the image. The image and its
+    derivatives are then put into the media storage. Clients can bypass this endpoint for
+    large files with `/api/medias/presign` and `/api/medias/register`.
 
     Parameters
     ----------
     file : UploadFile
         The media file to be uploaded.
 
+    current_user : UserOut
+        The currently authenticated user uploading the media.
+
+    session : AsyncSession
+        The database session used for creating the media record.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status and the ID of the created media record.
+
+    Raises
+    ------
+    HTTPException
+        If the file type is not supported or the file cannot be decoded as an image,
+        a 415 Unsupported Media Type status will be returned.
+    """
+    stored_image = await upload_tweet_image(file)
+    if not stored_image:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="File type not supported",
+        )
+
+    media = await medias_qr.create_media(
+        session,
+        user_id=current_user.id,
+        **stored_image,  # type: ignore
+    )
+
+    return {
+        "result": True,
+        "media_id": media.id,
+    }
+
+
+@router.post("/batch")
+async def load_medias(
+    files: Annotated[list[UploadFile], File()],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+):
+    """
+    Upload and save several media files in one request.
+
+    The files are written to disk and their derivatives rendered concurrently, then
+    all the media records are created with one bulk insert and a single commit, so
+    composing a tweet with several images takes one round trip. The batch is atomic:
+    if any file is not a supported image, no record is created and the files already
+    stored are queued for removal by the media sweeper.
+
+    Parameters
+    ----------
+    files : list of UploadFile
+        The media files to be uploaded, at most `settings.media_batch_max_files`.
+    current_user : UserOut
+        The currently authenticated user uploading the media.
+    session : AsyncSession
+        The database session used for creating the media records.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status and the IDs of the created media
+        records, in the order of the files.
+
+    Raises
+    ------
+    HTTPException
+        If there are too many files, a 422 Unprocessable Entity status will be returned;
+        if a file is larger than `settings.max_file_size_bytes`, a 413 Request Entity Too
+        Large status will be returned; if a file type is not supported or a file cannot be
+        decoded as an image, a 415 Unsupported Media Type status will be returned.
+    """
+    if len(files) > settings.media_batch_max_files:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Too many files. Maximum allowed is {settings.media_batch_max_files}",
+        )
+    if any(file.size and file.size > settings.max_file_size_bytes for file in files):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large. Maximum allowed size is {0}MB".format(
+                settings.max_file_size_bytes // (1024 * 1024),
+            ),
+        )
+
+    stored_images = await asyncio.gather(*(upload_tweet_image(file) for file in files))
+    if not all(stored_images):
+        stored_srcs = [image["image_src"] for image in stored_images if image]  # type: ignore
+        if stored_srcs:
+            await medias_qr.queue_file_deletions(session, image_srcs=stored_srcs)
+            await session.commit()
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="File type not supported",
+        )
+
+    media_ids = await medias_qr.create_medias(
+        session,
+        images=stored_images,  # type: ignore
+        user_id=current_user.id,
+    )
+
+    return {
+        "result": True,
+        "media_ids": media_ids,
+    }
+
+
+@router.post("/presign")
+async def presign_media_upload(
+    content_hash: Annotated[str, Body(pattern="^[0-9a-f]{64}$")],
+    content_type: Annotated[str, Body()],
+    size: Annotated[int, Body(ge=1, le=settings.max_direct_upload_bytes)],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+):
+    """
+    Return a presigned request uploading a media file directly to the media storage.
+
+    The file does not pass through the API workers. The storage only accepts a body of
+    the announced size whose SHA-256 hash is `content_hash`, so the returned key always
+    addresses the announced content. Once uploaded, the file is registered with
+    `/api/medias/register`.
+
+    Parameters
+    ----------
+    content_hash : str
+        The hexadecimal SHA-256 hash of the file.
+    content_type : str
+        The media type of the file, such as "image/jpeg".
+    size : int
+        The size of the file in bytes, at most `settings.max_direct_upload_bytes`.
+    current_user : UserOut
+        The currently authenticated user uploading the media.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status, the storage key of the file and the
+        URL, method and headers of the upload request.
+
+    Raises
+    ------
+    HTTPException
+        If the media type is not supported, a 415 Unsupported Media Type status will be
+        returned; if the media storage does not accept direct uploads, a 501 Not
+        Implemented status will be returned.
+    """
+    media_storage = storage.media_storage
+    if not media_storage.supports_presigned_uploads:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Direct uploads are not supported by the media storage",
+        )
+    extension = IMAGE_CONTENT_TYPES.get(content_type)
+    if extension is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="File type not supported",
+        )
+
+    key = os.path.join(content_hash[:2], content_hash[2:4], f"{content_hash}{extension}")
+    return {
+        "result": True,
+        "key": key,
+        "upload": media_storage.presign_upload(key, content_type, size, content_hash),
+    }
+
+
+@router.post("/register")
+async def register_media(
+    key: Annotated[str, Body(embed=True)],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+):
+    """
+    Register a media file uploaded directly to the media storage.
+
+    A copy of the file is fetched to render its WebP derivatives on the image process
+    pool; the derivatives are put next to it in the storage and a record is created in
+    the database. A file that cannot be decoded as an image is deleted from the storage.
+
+    Parameters
+    ----------
+    key : str
+        The storage key returned by `/api/medias/presign`.
+    current_user : UserOut
+        The currently authenticated user uploading the media.
     session : AsyncSession
         The database session used for creating the media record.
 
@@ -40,11 +263,32 @@ async def load_media(
     Raises
     ------
     HTTPException
-        If the file type is not supported, a 415 Unsupported Media Type status will be returned.
+        If the key is malformed, a 422 Unprocessable Entity status will be returned; if no
+        file was uploaded under the key, a 404 Not Found status will be returned; if the
+        file cannot be decoded as an image, a 415 Unsupported Media Type status will be
+        returned.
     """
-    image_src: str = await save_tweet_image(file)  # type: ignore
+    content_hash = parse_image_key(key)
+    if content_hash is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Malformed media key: {key}",
+        )
 
-    if not image_src:
+    try:
+        async with storage.media_storage.local_copy(key) as image_path:
+            stored_image = await store_tweet_image(
+                image_path,
+                key,
+                content_hash,
+                upload_original=False,
+            )
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"File with key: {key} does not exist.",
+        )
+    if not stored_image:
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             detail="File type not supported",
@@ -52,10 +296,384 @@ async def load_media(
 
     media = await medias_qr.create_media(
         session,
-        image_src=image_src,
+        user_id=current_user.id,
+        **stored_image,  # type: ignore
     )
 
     return {
         "result": True,
         "media_id": media.id,
     }
+
+
+@router.post("/uploads")
+async def create_media_upload(
+    file_name: Annotated[str, Body()],
+    size: Annotated[int, Body(ge=1, le=settings.max_resumable_upload_bytes)],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+):
+    """
+    Start a resumable upload of a media file.
+
+    Large files are sent in chunks with `PATCH /api/medias/uploads/{upload_id}`, which
+    can be resumed from the current offset after a dropped connection, and turned into
+    a media record with `POST /api/medias/uploads/{upload_id}/finalize`. The received
+    data is kept in `settings.dir_staged_uploads` until the upload is finalized or
+    expires after `settings.upload_session_ttl` seconds.
+
+    Parameters
+    ----------
+    file_name : str
+        The name of the file, which gives its type.
+    size : int
+        The size of the file in bytes, at most `settings.max_resumable_upload_bytes`.
+    current_user : UserOut
+        The currently authenticated user uploading the media.
+    session : AsyncSession
+        The database session used for creating the upload.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status, the ID of the upload and its offset.
+
+    Raises
+    ------
+    HTTPException
+        If the file type is not supported, a 415 Unsupported Media Type status will be
+        returned.
+    """
+    if os.path.splitext(file_name)[1].lower() not in IMAGE_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="File type not supported",
+        )
+
+    upload_id = await medias_qr.create_upload(
+        session,
+        user_id=current_user.id,
+        file_name=file_name,
+        size=size,
+        ttl=timedelta(seconds=settings.upload_session_ttl),
+    )
+    with open(_staging_path(upload_id), "wb"):
+        pass
+
+    return {
+        "result": True,
+        "upload_id": upload_id,
+        "offset": 0,
+    }
+
+
+@router.get("/uploads/{upload_id}")
+async def get_media_upload(
+    upload_id: Annotated[str, Path(pattern="^[0-9a-f]{32}$")],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+):
+    """
+    Return the offset a resumable upload continues from.
+
+    Parameters
+    ----------
+    upload_id : str
+        Path parameter for the upload ID.
+    current_user : UserOut
+        The currently authenticated user, who must have started the upload.
+    session : AsyncSession
+        The database session used for reading the upload.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status, the offset and the size of the upload.
+
+    Raises
+    ------
+    HTTPException
+        If the upload does not exist, expired or was started by another user, a 404 Not
+        Found status will be returned.
+    """
+    upload = await _get_upload_or_404(session, upload_id, user_id=current_user.id)
+    return {
+        "result": True,
+        "offset": upload.offset,
+        "size": upload.size,
+    }
+
+
+@router.patch("/uploads/{upload_id}")
+async def patch_media_upload(
+    upload_id: Annotated[str, Path(pattern="^[0-9a-f]{32}$")],
+    upload_offset: Annotated[int, Header(ge=0)],
+    request: Request,
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+):
+    """
+    Append a chunk to a resumable upload.
+
+    The request body is the chunk, written to the staging file while it arrives, and
+    the `Upload-Offset` header is the offset it starts at, which must be the current
+    offset of the upload. No database connection is held while the body streams. If
+    the connection drops, the bytes already received are kept.
+
+    Parameters
+    ----------
+    upload_id : str
+        Path parameter for the upload ID.
+    upload_offset : int
+        The `Upload-Offset` header, the offset the chunk starts at.
+    request : Request
+        The request carrying the chunk.
+    current_user : UserOut
+        The currently authenticated user, who must have started the upload.
+    session : AsyncSession
+        The database session used for reading and advancing the upload.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status and the new offset of the upload.
+
+    Raises
+    ------
+    HTTPException
+        If the upload does not exist, expired or was started by another user, a 404 Not
+        Found status will be returned; if the offset is not the current offset, a 409
+        Conflict status will be returned;
+        if the chunk goes beyond the size of the upload, a 413 Request Entity Too Large
+        status will be returned.
+    """
+    upload = await _get_upload_or_404(session, upload_id, user_id=current_user.id)
+    if upload_offset != upload.offset:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload offset is {upload.offset}",
+        )
+    await session.close()
+
+    written = await write_upload_chunk(
+        request.stream(),
+        _staging_path(upload_id),
+        upload_offset,
+        upload.size - upload_offset,
+    )
+    if written is None:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Chunk exceeds the upload size of {upload.size} bytes",
+        )
+    if not await medias_qr.advance_upload(
+        session,
+        upload_id=upload_id,
+        offset=upload_offset,
+        new_offset=upload_offset + written,
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload changed while the chunk was written",
+        )
+
+    return {
+        "result": True,
+        "offset": upload_offset + written,
+    }
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_media_upload(
+    upload_id: Annotated[str, Path(pattern="^[0-9a-f]{32}$")],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+):
+    """
+    Turn a complete resumable upload into a media record.
+
+    The staged file is stored under its content hash with its WebP derivatives, as
+    with `POST /api/medias/`, and the upload is deleted in the transaction creating
+    the media record.
+
+    Parameters
+    ----------
+    upload_id : str
+        Path parameter for the upload ID.
+    current_user : UserOut
+        The currently authenticated user, who must have started the upload.
+    session : AsyncSession
+        The database session used for finalizing the upload.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status and the ID of the created media record.
+
+    Raises
+    ------
+    HTTPException
+        If the upload does not exist, expired or was started by another user, a 404 Not
+        Found status will be returned; if not all its bytes were received, a 409 Conflict
+        status will be returned; if the file cannot be decoded as an image, a 415
+        Unsupported Media Type status will be returned.
+    """
+    upload = await _get_upload_or_404(session, upload_id, user_id=current_user.id)
+    if upload.offset != upload.size:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is incomplete: {upload.offset} of {upload.size} bytes received",
+        )
+    await session.close()
+
+    try:
+        stored_image = await store_staged_upload(_staging_path(upload_id), upload.file_name)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is already finalized",
+        )
+    await medias_qr.delete_upload(session, upload_id=upload_id)
+    if not stored_image:
+        await session.commit()
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="File type not supported",
+        )
+
+    media = await medias_qr.create_media(
+        session,
+        user_id=current_user.id,
+        **stored_image,  # type: ignore
+    )
+
+    return {
+        "result": True,
+        "media_id": media.id,
+    }
+
+
+@router.get("/{id}")
+async def get_resized_media(
+    id: Annotated[int, Path(ge=1)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    w: Annotated[int | None, Query(ge=1, le=settings.image_max_render_size)] = None,
+    h: Annotated[int | None, Query(ge=1, le=settings.image_max_render_size)] = None,
+    fmt: Annotated[Literal["webp", "jpeg", "png"], Query()] = "webp",
+):
+    """
+    Return a media image resized to fit a box, in the requested format.
+
+    The image is rendered from the stored original the first time a box and format
+    are requested, off the event loop, and kept in the on-disk render cache. The
+    image is never scaled up. Behind nginx (`settings.render_accel_redirect`), the
+    file is handed over with an `X-Accel-Redirect` header so nginx sends it with
+    `sendfile`; otherwise it is sent as a file response.
+
+    Parameters
+    ----------
+    id : int
+        Path parameter for the media ID. Must be greater than or equal to 1.
+    session : AsyncSession
+        The database session used for reading the media record.
+    w : int, optional
+        The maximum width of the image in pixels.
+    h : int, optional
+        The maximum height of the image in pixels.
+    fmt : str, optional
+        The format of the image: "webp" (default), "jpeg" or "png".
+
+    Returns
+    -------
+    Response
+        The resized image, cacheable forever by clients.
+
+    Raises
+    ------
+    HTTPException
+        If the media does not exist or its file is missing, a 404 Not Found status will be
+        returned; if the file cannot be decoded as an image, a 415 Unsupported Media Type
+        status will be returned.
+    """
+    media = await medias_qr.get_media(session, media_id=id)
+    if media is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Media with id: {id} does not exist.",
+        )
+
+    try:
+        image_path = await get_resized_image(media, w, h, fmt)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"File of media with id: {id} does not exist.",
+        )
+    except (OSError, PILImage.DecompressionBombError):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="File type not supported",
+        )
+
+    media_type = RENDER_FORMATS[fmt][1]
+    headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+    if settings.render_accel_redirect:
+        headers["X-Accel-Redirect"] = f"/rendered_images/{os.path.basename(image_path)}"
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(image_path, media_type=media_type, headers=headers)
+
+
+async def _get_upload_or_404(
+    session: AsyncSession,
+    upload_id: str,
+    user_id: int,
+) -> MediaUpload:
+    """
+    Return a resumable upload of a user that has not expired.
+
+    The uploads of other users are reported as missing, so their IDs cannot be probed.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The database session used for reading the upload.
+    upload_id : str
+        The ID of the upload.
+    user_id : int
+        The ID of the user asking for the upload.
+
+    Returns
+    -------
+    MediaUpload
+        The upload.
+
+    Raises
+    ------
+    HTTPException
+        If the upload does not exist, expired or was started by another user, a 404 Not
+        Found status will be returned.
+    """
+    upload = await medias_qr.get_upload(session, upload_id=upload_id, user_id=user_id)
+    if upload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload with id: {upload_id} does not exist.",
+        )
+    return upload
+
+
+def _staging_path(upload_id: str) -> str:
+    """
+    Return the path of the staging file of a resumable upload.
+
+    Parameters
+    ----------
+    upload_id : str
+        The ID of the upload.
+
+    Returns
+    -------
+    str
+        The path of the staging file in `settings.dir_staged_uploads`.
+    """
+    return os.path.join(settings.dir_staged_uploads, f"{upload_id}.part")
@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+
+from ..core import api_key_cache, db_helper, render_cache
+
+router = APIRouter(
+    prefix="/api/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get("/")
+async def get_metrics():
+    """
+    Report the internal counters of this worker process.
+
+    Returns
+    -------
+    dict
+        A JSON object with the key "result" set to True, the key "auth_cache"
+        holding the sizes and the hit and miss counters of the authentication cache,
+        the key "db_pool" holding the statistics of the connection pool and the key
+        "db_replicas" holding the state of the read replicas.
+    """
+    return {
+        "result": True,
+        "auth_cache": api_key_cache.stats(),
+        "db_pool": db_helper.pool_stats(),
+        "db_replicas": db_helper.replica_stats(),
+        "render_cache": render_cache.stats(),
+    }
@@ -1,19 +1,75 @@
+import base64
+import binascii
+import hashlib
+import json
 import os
+import re
+import tempfile
+from contextlib import suppress
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO
 
 import aiofiles  # type: ignore
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image as PILImage
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
 
 from api import settings
+from api.core import imaging, render_cache
+from api.db import Image, Tweet, schemas
+from api.like_buffer import apply_pending_like, like_buffer
 
+from . import storage
 
-async def save_tweet_image(image: UploadFile) -> str | bool:
+IMAGE_EXTENSIONS = {
+    ".jpg": ".jpg",
+    ".jpeg": ".jpg",
+    ".png": ".png",
+    ".gif": ".gif",
+    ".bmp": ".bmp",
+    ".tif": ".tiff",
+    ".tiff": ".tiff",
+}
+
+IMAGE_CONTENT_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+}
+
+IMAGE_KEY = re.compile(
+    r"[0-9a-f]{2}/[0-9a-f]{2}/(?P<content_hash>[0-9a-f]{64})\.(?:jpg|png|gif|bmp|tiff)",
+)
+
+RENDER_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+
+
+async def save_tweet_image(image: UploadFile) -> tuple[str, str] | bool:
     """
     Save the uploaded image file to the server.
 
     This function saves an uploaded image file to a specified directory on the server,
     validating that the file has a supported extension. If the file is saved successfully,
-    it returns the relative path to the saved file. If the file type is unsupported,
-    it returns False.
+    it returns the storage key of the saved file and the SHA-256 hash of its content.
+    If the file type is unsupported, it returns False.
+
+    Files are stored under their content hash in a sharded layout, for example
+    `tweets_images/ab/cd/abcd....jpg`, so identical uploads are stored once, uploads
+    with the same name never overwrite each other and the URLs never change content.
+    Uploads are written in chunks of `settings.upload_chunk_size` bytes and hashed on
+    the way; uploads that Starlette already spooled to a temporary file are copied in a
+    worker thread. The file is written under a temporary name, made world-readable for
+    the web server and renamed once complete, so readers never see a partial image. The
+    key is also the path of the file relative to `settings.dir_uploaded_images`, where
+    the file stays until `store_tweet_image` puts it into the media storage.
 
     Parameters
     ----------
@@ -22,19 +78,619 @@ async def save_tweet_image(image: UploadFile) -> str | bool:
 
     Returns
     -------
-    str | bool
-        The relative path to the saved file if successful, otherwise False.
+    tuple of (str, str) | bool
+        The storage key of the saved file, such as `ab/cd/abcd....jpg`, and its content
+        hash if successful, otherwise False.
+    """
+    extension = IMAGE_EXTENSIONS.get(os.path.splitext(image.filename or "")[1].lower())
+    if extension is None:
+        return False
+
+    file_descriptor, partial_path = tempfile.mkstemp(
+        suffix=".part",
+        dir=settings.dir_uploaded_images,
+    )
+    # mkstemp creates the file with mode 0600, which the web server could not read.
+    os.fchmod(file_descriptor, 0o644)
+    os.close(file_descriptor)
+    try:
+        if getattr(image.file, "_rolled", False):
+            content_hash = await run_in_threadpool(_copy_spooled_file, image.file, partial_path)
+        else:
+            content_hash = await _write_in_chunks(image, partial_path)
+        relative_path = _store_by_hash(partial_path, content_hash, extension)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(partial_path)
+        raise
+
+    return relative_path, content_hash
+
+
+async def store_tweet_image(
+    image_path: str,
+    key: str,
+    content_hash: str,
+    upload_original: bool = True,
+) -> dict | bool:
     """
-    image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff")
-    file_name: str | None = image.filename
+    Render the WebP derivatives of an image and put the files into the media storage.
 
-    if not file_name or not file_name.lower().endswith(image_extensions):
+    The derivatives are rendered by `imaging.create_variants` on the image process
+    pool next to the local file and stored beside the original, so their URLs share
+    its cache policy. A file that cannot be decoded is removed, from the storage too.
+
+    Parameters
+    ----------
+    image_path : str
+        The path of a local copy of the image.
+    key : str
+        The storage key of the image.
+    content_hash : str
+        The content hash of the image.
+    upload_original : bool, optional
+        Whether the local file has to be put into the storage as well. It is False
+        for files that clients uploaded directly to the storage.
+
+    Returns
+    -------
+    dict | bool
+        The keyword arguments of `medias_qr.create_media`, with the storage URLs of
+        the image and its variants, or False if the file is not an image that can
+        be decoded.
+    """
+    media_storage = storage.media_storage
+    try:
+        rendered = await imaging.create_variants(image_path, content_hash)
+    except (OSError, PILImage.DecompressionBombError):
+        with suppress(FileNotFoundError):
+            os.remove(image_path)
+        if not upload_original:
+            await media_storage.delete(key)
         return False
 
-    file_path = os.path.join(settings.dir_uploaded_images, file_name)
+    image_dir = os.path.dirname(image_path)
+    for variant in rendered["variants"].values():
+        file_name = variant.pop("file_name")
+        variant_key = os.path.join(os.path.dirname(key), file_name)
+        await media_storage.put(variant_key, os.path.join(image_dir, file_name))
+        variant["src"] = media_storage.url(variant_key)
+    if upload_original:
+        await media_storage.put(key, image_path)
+    return {"image_src": media_storage.url(key), "content_hash": content_hash, **rendered}
+
+
+async def upload_tweet_image(image: UploadFile) -> dict | bool:
+    """
+    Save an uploaded image and put it with its derivatives into the media storage.
 
+    Parameters
+    ----------
+    image : UploadFile
+        The uploaded image file.
+
+    Returns
+    -------
+    dict | bool
+        The keyword arguments of `medias_qr.create_media`, as returned by
+        `store_tweet_image`, or False if the file is not a supported image.
+    """
+    saved_image = await save_tweet_image(image)
+    if not saved_image:
+        return False
+    key, content_hash = saved_image  # type: ignore
+    return await store_tweet_image(
+        os.path.join(settings.dir_uploaded_images, key),
+        key,
+        content_hash,
+    )
+
+
+async def write_upload_chunk(
+    chunks: AsyncIterator[bytes],
+    staging_path: str,
+    offset: int,
+    max_length: int,
+) -> int | None:
+    """
+    Write a chunk of a resumable upload into its staging file while it arrives.
+
+    If the client disconnects, the bytes received until then are kept, so the
+    upload resumes after them instead of sending the chunk again.
+
+    Parameters
+    ----------
+    chunks : AsyncIterator of bytes
+        The request body carrying the chunk.
+    staging_path : str
+        The path of the staging file of the upload.
+    offset : int
+        The offset the chunk starts at.
+    max_length : int
+        The number of bytes the upload still expects.
+
+    Returns
+    -------
+    int | None
+        The number of bytes written, or None if the chunk exceeds `max_length`.
+    """
+    written = 0
+    async with aiofiles.open(staging_path, "r+b") as staging_file:
+        await staging_file.seek(offset)
+        try:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > max_length:
+                    return None
+                await staging_file.write(chunk)
+        except ClientDisconnect:
+            pass
+    return written
+
+
+async def store_staged_upload(staging_path: str, file_name: str) -> dict | bool:
+    """
+    Move the complete file of a resumable upload to the media storage.
+
+    The file is renamed to its content-addressed path, as if it were uploaded
+    through `save_tweet_image`, and stored with its derivatives.
+
+    Parameters
+    ----------
+    staging_path : str
+        The path of the complete staging file.
+    file_name : str
+        The name of the uploaded file, which gives its type.
+
+    Returns
+    -------
+    dict | bool
+        The keyword arguments of `medias_qr.create_media`, as returned by
+        `store_tweet_image`, or False if the file is not a supported image.
+    """
+    extension = IMAGE_EXTENSIONS.get(os.path.splitext(file_name)[1].lower())
+    if extension is None:
+        return False
+
+    with open(staging_path, "rb") as staging_file:
+        digest = await run_in_threadpool(
+            hashlib.file_digest, staging_file, "sha256",  # type: ignore
+        )
+    content_hash = digest.hexdigest()
+    key = _store_by_hash(staging_path, content_hash, extension)
+    return await store_tweet_image(
+        os.path.join(settings.dir_uploaded_images, key),
+        key,
+        content_hash,
+    )
+
+
+def parse_image_key(key: str) -> str | None:
+    """
+    Return the content hash of a content-addressed storage key.
+
+    Parameters
+    ----------
+    key : str
+        A key such as `ab/cd/abcd....jpg` received from a client.
+
+    Returns
+    -------
+    str | None
+        The content hash, or None if the key is not the sharded path of an image.
+    """
+    match = IMAGE_KEY.fullmatch(key)
+    if match is None or key[:2] + key[3:5] != match["content_hash"][:4]:
+        return None
+    return match["content_hash"]
+
+
+async def get_resized_image(
+    image: Image,
+    width: int | None,
+    height: int | None,
+    image_format: str,
+) -> str:
+    """
+    Return the path of an image resized to fit a box, rendering it on first use.
+
+    The rendered files are kept in `render_cache` under a name derived from the
+    content of the original and the requested box and format, so uploads of the
+    same content share them. Renders run on the image process pool, and concurrent
+    requests for the same file share one render.
+
+    Parameters
+    ----------
+    image : Image
+        The media record of the original image.
+    width : int | None
+        The maximum width of the rendered image, or None for no limit.
+    height : int | None
+        The maximum height of the rendered image, or None for no limit.
+    image_format : str
+        A key of `RENDER_FORMATS`.
+
+    Returns
+    -------
+    str
+        The path of the rendered image.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the original image is missing.
+    OSError
+        If the original cannot be decoded as an image.
+    """
+    image_key = image.content_hash or f"image-{image.id}"
+    name = f"{image_key}_{width or 0}x{height or 0}.{image_format}"
+    media_storage = storage.media_storage
+
+    async def render(target_path: str) -> None:
+        async with media_storage.local_copy(media_storage.key(image.src)) as image_path:
+            await imaging.resize(
+                image_path,
+                target_path,
+                width,
+                height,
+                RENDER_FORMATS[image_format][0],
+            )
+
+    return await render_cache.get_or_render(name, render)
+
+
+def _store_by_hash(partial_path: str, content_hash: str, extension: str) -> str:
+    """
+    Move a written upload to its content-addressed path.
+
+    If a file with the same content is already stored, under any extension, the
+    upload is discarded and the stored file is reused; its modification time is
+    refreshed, so the media sweeper does not remove it meanwhile.
+
+    Parameters
+    ----------
+    partial_path : str
+        The path of the completely written upload.
+    content_hash : str
+        The hexadecimal SHA-256 hash of the upload.
+    extension : str
+        The normalized extension of the upload.
+
+    Returns
+    -------
+    str
+        The path of the stored file relative to `settings.dir_uploaded_images`.
+    """
+    shard_dir = os.path.join(content_hash[:2], content_hash[2:4])
+    os.makedirs(os.path.join(settings.dir_uploaded_images, shard_dir), exist_ok=True)
+    with os.scandir(os.path.join(settings.dir_uploaded_images, shard_dir)) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[0] == content_hash:
+                os.remove(partial_path)
+                # Tells the media sweeper the file is about to be used again.
+                os.utime(entry.path)
+                return os.path.join(shard_dir, entry.name)
+
+    relative_path = os.path.join(shard_dir, f"{content_hash}{extension}")
+    os.replace(partial_path, os.path.join(settings.dir_uploaded_images, relative_path))
+    return relative_path
+
+
+async def _write_in_chunks(image: UploadFile, file_path: str) -> str:
+    """
+    Write an upload held in memory to disk, one chunk at a time.
+
+    Parameters
+    ----------
+    image : UploadFile
+        The uploaded file.
+    file_path : str
+        The path of the file to write.
+
+    Returns
+    -------
+    str
+        The hexadecimal SHA-256 hash of the upload.
+    """
+    content_hash = hashlib.sha256()
+    await image.seek(0)
     async with aiofiles.open(file_path, "wb") as image_file:
-        file_content = await image.read()
-        await image_file.write(file_content)
+        while chunk := await image.read(settings.upload_chunk_size):
+            content_hash.update(chunk)
+            await image_file.write(chunk)
+    return content_hash.hexdigest()
+
+
+def _copy_spooled_file(source: BinaryIO, file_path: str) -> str:
+    """
+    Copy an upload spooled to a temporary file, hashing it on the way.
+
+    The temporary file has no name, so it cannot be renamed into place; it is
+    read once in chunks of `settings.upload_chunk_size` bytes, each chunk being
+    hashed and written to the target.
+
+    Parameters
+    ----------
+    source : BinaryIO
+        The spooled temporary file of the upload.
+    file_path : str
+        The path of the file to write.
+
+    Returns
+    -------
+    str
+        The hexadecimal SHA-256 hash of the upload.
+    """
+    content_hash = hashlib.sha256()
+    source.flush()
+    source.seek(0)
+    with open(file_path, "wb") as target:
+        while chunk := source.read(settings.upload_chunk_size):
+            content_hash.update(chunk)
+            target.write(chunk)
+    return content_hash.hexdigest()
+
+
+def encode_cursor(created_at: datetime, tweet_id: int) -> str:
+    """
+    Encode the key of the last tweet on a page into an opaque cursor.
+
+    Parameters
+    ----------
+    created_at : datetime
+        The creation time of the last tweet on the page.
+    tweet_id : int
+        The ID of the last tweet on the page.
+
+    Returns
+    -------
+    str
+        A URL-safe cursor to be passed back as the `cursor` query parameter.
+    """
+    raw_cursor = f"{created_at.isoformat()}|{tweet_id}"
+    return base64.urlsafe_b64encode(raw_cursor.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Parameters
+    ----------
+    cursor : str
+        The cursor received from the client.
+
+    Returns
+    -------
+    tuple of (datetime, int)
+        The `(created_at, id)` key of the tweet the next page starts after.
+
+    Raises
+    ------
+    ValueError
+        If the cursor is malformed.
+    """
+    try:
+        raw_cursor = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError("Malformed cursor") from exc
+
+    created_at, _, tweet_id = raw_cursor.partition("|")
+    return datetime.fromisoformat(created_at), int(tweet_id)
+
+
+def tweet_to_dict(tweet: Tweet, viewer_id: int | None = None) -> dict:
+    """
+    Convert a tweet loaded for a feed into a dictionary matching `TweetOut`.
+
+    The likes and unlikes of the viewer still in the like buffer are applied to
+    `liked_by_me` and `like_count`.
+
+    Parameters
+    ----------
+    tweet : Tweet
+        The tweet loaded with `tweets_qr.feed_options`.
+    viewer_id : int, optional
+        The ID of the user viewing the feed.
+
+    Returns
+    -------
+    dict
+        The tweet data in the shape of `TweetOut`.
+    """
+    liked_by_me, like_count = apply_pending_like(
+        viewer_id, tweet.id, bool(tweet.liked_by_me), tweet.like_count,
+    )
+    return {
+        "id": tweet.id,
+        "content": tweet.content,
+        "attachments": [att.src for att in tweet.attachments],
+        "media": [
+            {
+                "src": att.src,
+                "width": att.width,
+                "height": att.height,
+                "variants": att.variants or {},
+            }
+            for att in tweet.attachments
+        ],
+        "author": tweet.author,
+        "like_count": like_count,
+        "liked_by_me": liked_by_me,
+    }
+
+
+def build_tweets_page(
+    tweets: list[Tweet],
+    has_more: bool,
+    viewer_id: int | None = None,
+) -> dict:
+    """
+    Build the response body of a feed page.
+
+    Parameters
+    ----------
+    tweets : list of Tweet
+        The tweets of the page loaded with `tweets_qr.feed_options`.
+    has_more : bool
+        Whether more tweets follow the page.
+    viewer_id : int, optional
+        The ID of the user viewing the feed.
+
+    Returns
+    -------
+    dict
+        A dictionary matching `TweetsResponse`, including the cursor of the next page.
+    """
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(tweets[-1].created_at, tweets[-1].id)
+    return {
+        "result": True,
+        "tweets": [tweet_to_dict(tweet, viewer_id) for tweet in tweets],
+        "next_cursor": next_cursor,
+    }
+
+
+def build_tweets_batch(
+    tweets: list[Tweet],
+    tweet_ids: list[int],
+    viewer_id: int | None = None,
+) -> bytes:
+    """
+    Build the response body of a batch lookup of tweets.
+
+    Parameters
+    ----------
+    tweets : list of Tweet
+        The found tweets loaded with `tweets_qr.feed_options`, in any order.
+    tweet_ids : list of int
+        The requested IDs, in request order.
+    viewer_id : int, optional
+        The ID of the user viewing the tweets.
+
+    Returns
+    -------
+    bytes
+        A JSON document matching `TweetsBatchResponse`, with the tweets and the
+        missing IDs in request order.
+    """
+    tweets_by_id = {tweet.id: tweet for tweet in tweets}
+    batch = schemas.TweetsBatchResponse.model_validate(
+        {
+            "result": True,
+            "tweets": [
+                tweet_to_dict(tweets_by_id[tweet_id], viewer_id)
+                for tweet_id in tweet_ids
+                if tweet_id in tweets_by_id
+            ],
+            "missing_ids": [tweet_id for tweet_id in tweet_ids if tweet_id not in tweets_by_id],
+        },
+        from_attributes=True,
+    )
+    return batch.model_dump_json().encode()
+
+
+def build_raw_tweets_page(
+    tweets_json: str,
+    last_key: tuple[datetime, int] | None,
+    viewer_id: int | None = None,
+) -> bytes:
+    """
+    Build the response body of a feed page rendered by the database.
+
+    The JSON array is sent as is, unless the viewer has likes or unlikes in the
+    like buffer; then it is decoded to apply them.
+
+    Parameters
+    ----------
+    tweets_json : str
+        The JSON array of tweets returned by `tweets_qr.get_tweets_page_json`.
+    last_key : tuple of (datetime, int) or None
+        The key of the last tweet of the page if more tweets follow.
+    viewer_id : int, optional
+        The ID of the user viewing the feed.
+
+    Returns
+    -------
+    bytes
+        A JSON document matching `TweetsResponse`.
+    """
+    if viewer_id is not None and like_buffer.pending_for(viewer_id):
+        tweets = json.loads(tweets_json)
+        for tweet in tweets:
+            tweet["liked_by_me"], tweet["like_count"] = apply_pending_like(
+                viewer_id, tweet["id"], tweet["liked_by_me"], tweet["like_count"],
+            )
+        tweets_json = json.dumps(tweets)
+    next_cursor = encode_cursor(*last_key) if last_key else None
+    return b"".join(
+        (
+            b'{"result":true,"tweets":',
+            tweets_json.encode(),
+            b',"next_cursor":',
+            json.dumps(next_cursor).encode(),
+            b"}",
+        ),
+    )
+
+
+async def stream_tweets_page(
+    session: AsyncSession,
+    tweets: AsyncIterator[Tweet],
+    limit: int | None,
+    ndjson: bool,
+    viewer_id: int | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Serialize tweets into a response body while they arrive from the database.
+
+    Each tweet is encoded as soon as it is read, so only one batch of rows is held
+    in memory. In JSON mode the body matches `TweetsResponse`; in NDJSON mode every
+    line is one `TweetOut`. The session is closed once the body is complete, since
+    the streaming outlives the request's dependencies.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The session the tweets are streamed from.
+    tweets : AsyncIterator of Tweet
+        The tweets returned by `tweets_qr.stream_tweets`, fetching one extra tweet
+        beyond `limit` to detect whether another page exists.
+    limit : int or None
+        The maximum number of tweets to send, or None to send all of them.
+    ndjson : bool
+        Whether to write newline-delimited JSON instead of a single JSON document.
+    viewer_id : int, optional
+        The ID of the user viewing the feed.
+
+    Yields
+    ------
+    bytes
+        The next chunk of the response body.
+    """
+    try:
+        if not ndjson:
+            yield b'{"result":true,"tweets":['
+        sent_count, last_tweet, has_more = 0, None, False
+        async for tweet in tweets:
+            if sent_count == limit:
+                has_more = True
+                break
+            tweet_json = schemas.TweetOut.model_validate(
+                tweet_to_dict(tweet, viewer_id),
+            ).model_dump_json()
+            if ndjson:
+                yield tweet_json.encode() + b"\n"
+            else:
+                yield (b"," if sent_count else b"") + tweet_json.encode()
+            sent_count, last_tweet = sent_count + 1, tweet
 
-    return os.path.join("tweets_images", file_name)
+        if not ndjson:
+            next_cursor = None
+            if has_more and last_tweet is not None:
+                next_cursor = encode_cursor(last_tweet.created_at, last_tweet.id)
+            yield b'],"next_cursor":' + json.dumps(next_cursor).encode() + b"}"
+    finally:
+        await tweets.aclose()  # type: ignore
+        await session.close()
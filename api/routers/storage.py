@@ -0,0 +1,730 @@
+import base64
+import hashlib
+import hmac
+import mimetypes
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator
+from urllib.parse import quote, urlencode, urlsplit
+
+import aiofiles  # type: ignore
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from api import settings
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class MediaStorage(ABC):
+    """
+    Interface of the stores holding the image files.
+
+    Files are addressed by keys such as `ab/cd/abcd....jpg`; the `src` saved in
+    an `Image` row is the URL of its key. Images are always decoded and rendered
+    from local files, so a store only moves whole files in and out.
+
+    Attributes
+    ----------
+    supports_presigned_uploads : bool
+        Whether clients can upload files directly to the store.
+
+    Methods
+    -------
+    url(self, key: str)
+        Returns the `src` of the file under a key.
+    key(self, src: str)
+        Returns the key of the file of a `src`.
+    put(self, key: str, local_path: str)
+        Stores a local file under a key, consuming the local file.
+    exists(self, key: str)
+        Returns whether a file is stored under a key.
+    modified_at(self, key: str)
+        Returns the modification time of a stored file.
+    delete(self, key: str)
+        Deletes the file under a key, if any.
+    local_copy(self, key: str)
+        Provides a local path to the file under a key.
+    presign_upload(self, key: str, content_type: str, size: int, content_hash: str)
+        Returns a request that uploads a file directly to the store.
+    aclose(self)
+        Releases the connections of the store.
+    """
+
+    supports_presigned_uploads = False
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """
+        Return the `src` of the file under a key.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+
+        Returns
+        -------
+        str
+            The URL clients load the file from.
+        """
+
+    @abstractmethod
+    def key(self, src: str) -> str:
+        """
+        Return the key of the file of a `src`.
+
+        Parameters
+        ----------
+        src : str
+            The `src` returned by `url`.
+
+        Returns
+        -------
+        str
+            The key of the file.
+        """
+
+    @abstractmethod
+    async def put(self, key: str, local_path: str) -> None:
+        """
+        Store a local file under a key, consuming the local file.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+        local_path : str
+            The path of the complete local file.
+        """
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """
+        Return whether a file is stored under a key.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+
+        Returns
+        -------
+        bool
+            True if the file exists.
+        """
+
+    @abstractmethod
+    async def modified_at(self, key: str) -> float | None:
+        """
+        Return the modification time of a stored file.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+
+        Returns
+        -------
+        float | None
+            The POSIX timestamp of the last write, or None if the file does not exist.
+        """
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """
+        Delete the file under a key, if any.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+        """
+
+    @abstractmethod
+    def local_copy(self, key: str):
+        """
+        Provide a local path to the file under a key.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+
+        Returns
+        -------
+        AsyncContextManager of str
+            A context manager yielding a local path that stays valid until it exits.
+
+        Raises
+        ------
+        FileNotFoundError
+            If no file is stored under the key.
+        """
+
+    def presign_upload(
+        self,
+        key: str,
+        content_type: str,
+        size: int,
+        content_hash: str,
+    ) -> dict:
+        """
+        Return a request that uploads a file directly to the store.
+
+        Parameters
+        ----------
+        key : str
+            The key of the file.
+        content_type : str
+            The media type of the file.
+        size : int
+            The exact size of the file in bytes.
+        content_hash : str
+            The hexadecimal SHA-256 hash of the file, which the store verifies.
+
+        Returns
+        -------
+        dict
+            The keys "url", "method" and "headers" of the upload request.
+
+        Raises
+        ------
+        NotImplementedError
+            If the store does not accept direct uploads.
+        """
+        raise NotImplementedError
+
+    async def aclose(self) -> None:  # noqa: B027
+        """
+        Release the connections of the store.
+
+        Stores without connections keep this no-op; the others override it.
+        """
+
+
+class LocalStorage(MediaStorage):
+    """
+    Store of the image files in `settings.dir_uploaded_images`, served by nginx.
+
+    Uploads are written to their final place by `save_tweet_image`, so storing
+    them moves nothing.
+    """
+
+    @property
+    def root(self) -> str:
+        """
+        Return the directory of the stored files.
+
+        Returns
+        -------
+        str
+            The current value of `settings.dir_uploaded_images`.
+        """
+        return settings.dir_uploaded_images
+
+    def url(self, key: str) -> str:
+        """See `MediaStorage.url`."""
+        return os.path.join("tweets_images", key)
+
+    def key(self, src: str) -> str:
+        """See `MediaStorage.key`."""
+        return os.path.relpath(src, "tweets_images")
+
+    async def put(self, key: str, local_path: str) -> None:
+        """See `MediaStorage.put`."""
+        path = os.path.join(self.root, key)
+        if os.path.abspath(local_path) != os.path.abspath(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            await run_in_threadpool(shutil.move, local_path, path)
+
+    async def exists(self, key: str) -> bool:
+        """See `MediaStorage.exists`."""
+        return os.path.exists(os.path.join(self.root, key))
+
+    async def modified_at(self, key: str) -> float | None:
+        """See `MediaStorage.modified_at`."""
+        try:
+            return os.stat(os.path.join(self.root, key)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    async def delete(self, key: str) -> None:
+        """See `MediaStorage.delete`."""
+        with suppress(FileNotFoundError):
+            os.remove(os.path.join(self.root, key))
+
+    @asynccontextmanager
+    async def local_copy(self, key: str) -> AsyncIterator[str]:
+        """See `MediaStorage.local_copy`."""
+        path = os.path.join(self.root, key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        yield path
+
+
+class S3Storage(MediaStorage):
+    """
+    Store of the image files in a bucket of an S3-compatible service.
+
+    Requests are signed with AWS Signature Version 4 and use path-style URLs,
+    so MinIO and other self-hosted services work as well as S3. Clients may
+    upload files directly with presigned URLs; the store then checks the
+    SHA-256 checksum of the upload, so a key always matches its content.
+    """
+
+    supports_presigned_uploads = True
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        public_url: str | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """
+        Initialize a store over a bucket.
+
+        Parameters
+        ----------
+        endpoint_url : str
+            The URL of the service, such as `http://minio:9000`.
+        bucket : str
+            The name of the bucket.
+        access_key : str
+            The access key ID.
+        secret_key : str
+            The secret access key.
+        region : str
+            The region of the bucket.
+        public_url : str, optional
+            The base URL clients load the files from, such as a CDN. Defaults to
+            the URL of the bucket.
+        transport : httpx.AsyncBaseTransport, optional
+            The transport of the HTTP client, replaced in tests.
+        """
+        self.bucket_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.public_url = (public_url or self.bucket_url).rstrip("/")
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Return the HTTP client, creating it on first use.
+
+        Returns
+        -------
+        httpx.AsyncClient
+            The client shared by the requests to the service.
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=settings.s3_timeout,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """See `MediaStorage.aclose`."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def url(self, key: str) -> str:
+        """See `MediaStorage.url`."""
+        return f"{self.public_url}/{key}"
+
+    def key(self, src: str) -> str:
+        """See `MediaStorage.key`."""
+        return src.removeprefix(f"{self.public_url}/")
+
+    async def put(self, key: str, local_path: str) -> None:
+        """
+        See `MediaStorage.put`.
+
+        The file is streamed in chunks of `settings.upload_chunk_size` bytes with an
+        unsigned payload, so it is never held in memory as a whole.
+        """
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        response = await self._request(
+            "PUT",
+            key,
+            content=_read_in_chunks(local_path),
+            headers={
+                "content-length": str(os.path.getsize(local_path)),
+                "content-type": content_type,
+                "cache-control": IMMUTABLE_CACHE_CONTROL,
+            },
+        )
+        response.raise_for_status()
+        with suppress(FileNotFoundError):
+            os.remove(local_path)
+
+    async def exists(self, key: str) -> bool:
+        """See `MediaStorage.exists`."""
+        return await self.modified_at(key) is not None
+
+    async def modified_at(self, key: str) -> float | None:
+        """See `MediaStorage.modified_at`."""
+        response = await self._request("HEAD", key)
+        if response.status_code == httpx.codes.NOT_FOUND:
+            return None
+        response.raise_for_status()
+        return parsedate_to_datetime(response.headers["last-modified"]).timestamp()
+
+    async def delete(self, key: str) -> None:
+        """See `MediaStorage.delete`."""
+        response = await self._request("DELETE", key)
+        if response.status_code != httpx.codes.NOT_FOUND:
+            response.raise_for_status()
+
+    @asynccontextmanager
+    async def local_copy(self, key: str) -> AsyncIterator[str]:
+        """
+        See `MediaStorage.local_copy`.
+
+        The file is downloaded in chunks of `settings.upload_chunk_size` bytes,
+        which are written to the local copy as they arrive.
+        """
+        with tempfile.TemporaryDirectory() as local_dir:
+            path = os.path.join(local_dir, os.path.basename(key))
+            response = await self._request("GET", key, stream=True)
+            try:
+                if response.status_code == httpx.codes.NOT_FOUND:
+                    raise FileNotFoundError(key)
+                response.raise_for_status()
+                async with aiofiles.open(path, "wb") as local_file:
+                    async for chunk in response.aiter_bytes(settings.upload_chunk_size):
+                        await local_file.write(chunk)
+            finally:
+                await response.aclose()
+            yield path
+
+    def presign_upload(
+        self,
+        key: str,
+        content_type: str,
+        size: int,
+        content_hash: str,
+    ) -> dict:
+        """See `MediaStorage.presign_upload`."""
+        headers = {
+            "content-length": str(size),
+            "content-type": content_type,
+            "cache-control": IMMUTABLE_CACHE_CONTROL,
+            "x-amz-checksum-sha256": _base64_digest(content_hash),
+        }
+        url = presign_url(
+            "PUT",
+            f"{self.bucket_url}/{key}",
+            headers=headers,
+            expires=settings.s3_presign_expires,
+            access_key=self.access_key,
+            secret_key=self.secret_key,
+            region=self.region,
+        )
+        return {"url": url, "method": "PUT", "headers": headers}
+
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        content: bytes | AsyncIterator[bytes] = b"",
+        headers: dict[str, str] | None = None,
+        stream: bool = False,
+    ) -> httpx.Response:
+        """
+        Send a signed request for an object of the bucket.
+
+        Parameters
+        ----------
+        method : str
+            The HTTP method.
+        key : str
+            The key of the object.
+        content : bytes or AsyncIterator of bytes, optional
+            The body of the request. A streamed body is sent as an unsigned payload
+            and needs a "content-length" header.
+        headers : dict of str to str, optional
+            Additional headers, which are signed as well.
+        stream : bool, optional
+            Whether to return before the body of the response is read. The caller
+            then has to close the response.
+
+        Returns
+        -------
+        httpx.Response
+            The response of the service.
+        """
+        url = f"{self.bucket_url}/{key}"
+        signed_headers = sign_headers(
+            method,
+            url,
+            headers=headers or {},
+            payload_hash=(
+                hashlib.sha256(content).hexdigest()
+                if isinstance(content, bytes)
+                else UNSIGNED_PAYLOAD
+            ),
+            access_key=self.access_key,
+            secret_key=self.secret_key,
+            region=self.region,
+        )
+        request = self.client.build_request(method, url, content=content, headers=signed_headers)
+        return await self.client.send(request, stream=stream)
+
+
+async def _read_in_chunks(path: str) -> AsyncIterator[bytes]:
+    """
+    Read a file in chunks of `settings.upload_chunk_size` bytes.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    Yields
+    ------
+    bytes
+        The next chunk of the file.
+    """
+    async with aiofiles.open(path, "rb") as file:
+        while chunk := await file.read(settings.upload_chunk_size):
+            yield chunk
+
+
+def sign_headers(
+    method: str,
+    url: str,
+    headers: dict[str, str],
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: datetime | None = None,
+) -> dict[str, str]:
+    """
+    Sign a request to S3 with an `Authorization` header (AWS Signature Version 4).
+
+    Parameters
+    ----------
+    method : str
+        The HTTP method.
+    url : str
+        The URL of the request.
+    headers : dict of str to str
+        The headers to sign in addition to `host`, `x-amz-date` and
+        `x-amz-content-sha256`.
+    payload_hash : str
+        The hexadecimal SHA-256 hash of the body.
+    access_key : str
+        The access key ID.
+    secret_key : str
+        The secret access key.
+    region : str
+        The region of the bucket.
+    now : datetime, optional
+        The signing time. Defaults to the current time.
+
+    Returns
+    -------
+    dict of str to str
+        The headers of the request, including `Authorization`.
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    headers = {
+        **{name.lower(): header_value for name, header_value in headers.items()},
+        "host": urlsplit(url).netloc,
+        "x-amz-content-sha256": payload_hash,
+        "x-amz-date": amz_date,
+    }
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    signed_names, signature = _signature(
+        method, url, {}, headers, payload_hash, secret_key, amz_date, scope,
+    )
+    headers["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_names}, Signature={signature}"
+    )
+    return headers
+
+
+def presign_url(
+    method: str,
+    url: str,
+    headers: dict[str, str],
+    expires: int,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: datetime | None = None,
+) -> str:
+    """
+    Sign a request to S3 in its query string (AWS Signature Version 4).
+
+    The client has to send exactly the signed headers with the request.
+
+    Parameters
+    ----------
+    method : str
+        The HTTP method.
+    url : str
+        The URL of the request.
+    headers : dict of str to str
+        The headers to sign in addition to `host`.
+    expires : int
+        The number of seconds the URL is valid for.
+    access_key : str
+        The access key ID.
+    secret_key : str
+        The secret access key.
+    region : str
+        The region of the bucket.
+    now : datetime, optional
+        The signing time. Defaults to the current time.
+
+    Returns
+    -------
+    str
+        The presigned URL.
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    headers = {
+        **{name.lower(): header_value for name, header_value in headers.items()},
+        "host": urlsplit(url).netloc,
+    }
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    query = {
+        "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+        "X-Amz-Credential": f"{access_key}/{scope}",
+        "X-Amz-Date": amz_date,
+        "X-Amz-Expires": str(expires),
+        "X-Amz-SignedHeaders": ";".join(sorted(headers)),
+    }
+    _, signature = _signature(
+        method, url, query, headers, UNSIGNED_PAYLOAD, secret_key, amz_date, scope,
+    )
+    query["X-Amz-Signature"] = signature
+    return f"{url}?{urlencode(query, quote_via=quote, safe='-_.~')}"
+
+
+def _signature(
+    method: str,
+    url: str,
+    query: dict[str, str],
+    headers: dict[str, str],
+    payload_hash: str,
+    secret_key: str,
+    amz_date: str,
+    scope: str,
+) -> tuple[str, str]:
+    """
+    Compute the Signature Version 4 of a canonical request.
+
+    Parameters
+    ----------
+    method : str
+        The HTTP method.
+    url : str
+        The URL of the request, without a query string.
+    query : dict of str to str
+        The query parameters of the request.
+    headers : dict of str to str
+        The signed headers, with lowercase names.
+    payload_hash : str
+        The hexadecimal SHA-256 hash of the body, or `UNSIGNED-PAYLOAD`.
+    secret_key : str
+        The secret access key.
+    amz_date : str
+        The signing time in the `YYYYMMDDTHHMMSSZ` format.
+    scope : str
+        The credential scope.
+
+    Returns
+    -------
+    tuple of (str, str)
+        The list of signed header names and the hexadecimal signature.
+    """
+    signed_names = ";".join(sorted(headers))
+    canonical_request = "\n".join(
+        (
+            method,
+            quote(urlsplit(url).path or "/", safe="/-_.~"),
+            "&".join(
+                f"{quote(name, safe='-_.~')}={quote(query_value, safe='-_.~')}"
+                for name, query_value in sorted(query.items())
+            ),
+            "".join(f"{name}:{headers[name].strip()}\n" for name in sorted(headers)),
+            signed_names,
+            payload_hash,
+        ),
+    )
+    string_to_sign = "\n".join(
+        (
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ),
+    )
+    signing_key = f"AWS4{secret_key}".encode()
+    for scope_part in scope.split("/"):
+        signing_key = hmac.new(signing_key, scope_part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return signed_names, signature
+
+
+def _base64_digest(content_hash: str) -> str:
+    """
+    Convert a hexadecimal SHA-256 hash to the base64 form of S3 checksums.
+
+    Parameters
+    ----------
+    content_hash : str
+        The hexadecimal hash.
+
+    Returns
+    -------
+    str
+        The base64-encoded digest.
+    """
+    return base64.b64encode(bytes.fromhex(content_hash)).decode()
+
+
+def create_media_storage() -> MediaStorage:
+    """
+    Create the store selected by `settings.media_storage`.
+
+    Returns
+    -------
+    MediaStorage
+        An `S3Storage` if `settings.media_storage` is "s3", otherwise a `LocalStorage`.
+    """
+    if settings.media_storage == "s3":
+        return S3Storage(
+            endpoint_url=settings.s3_endpoint_url,  # type: ignore
+            bucket=settings.s3_bucket,  # type: ignore
+            access_key=settings.s3_access_key,  # type: ignore
+            secret_key=settings.s3_secret_key,  # type: ignore
+            region=settings.s3_region,
+            public_url=settings.s3_public_url,
+        )
+    return LocalStorage()
+
+
+media_storage = create_media_storage()
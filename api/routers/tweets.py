@@ -1,11 +1,27 @@
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import UserOut, likes_qr, medias_qr, schemas, tweets_qr
-from ..dependencies import get_current_user_by_api_key, scoped_session_db
+from ..core import settings
+from ..db import UserOut, likes_qr, schemas, timelines_qr, tweets_qr
+from ..dependencies import (
+    get_current_user_by_api_key,
+    get_optional_batch_ids,
+    get_page_key,
+    scoped_read_session_db,
+    scoped_session_db,
+)
+from ..like_buffer import submit_like
+from .router_helpers import (
+    build_raw_tweets_page,
+    build_tweets_batch,
+    build_tweets_page,
+    stream_tweets_page,
+)
 
 router = APIRouter(
     prefix="/api/tweets",
@@ -22,6 +38,9 @@ async def create_tweet_likes(
     """
     Create a like for the specified tweet.
 
+    With `settings.like_buffer_enabled` the like is recorded in the like buffer
+    and written to the database by the next flush.
+
     Parameters
     ----------
     id : int
@@ -43,11 +62,14 @@ async def create_tweet_likes(
         Status code: 404, detail: "Tweet with id: {id} does not exist or you have already
         liked this tweet."
     """
-    result = await likes_qr.create_tweet_like(
-        session,
-        tweet_id=id,
-        current_user_id=current_user.id,
-    )
+    if settings.like_buffer_enabled:
+        result = await submit_like(session, tweet_id=id, user_id=current_user.id, liked=True)
+    else:
+        result = await likes_qr.create_tweet_like(
+            session,
+            tweet_id=id,
+            current_user_id=current_user.id,
+        )
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -65,6 +87,9 @@ async def delete_tweet_like(
     """
     Delete a like for the specified tweet.
 
+    With `settings.like_buffer_enabled` the unlike is recorded in the like buffer
+    and written to the database by the next flush.
+
     Parameters
     ----------
     id : int
@@ -85,11 +110,14 @@ async def delete_tweet_like(
         If the tweet does not exist:
         - Status code: 404, detail: "A tweet like with id: {id} does not exist."
     """
-    result = await likes_qr.delete_tweet_like(
-        session,
-        tweet_id=id,
-        current_user_id=current_user.id,
-    )
+    if settings.like_buffer_enabled:
+        result = await submit_like(session, tweet_id=id, user_id=current_user.id, liked=False)
+    else:
+        result = await likes_qr.delete_tweet_like(
+            session,
+            tweet_id=id,
+            current_user_id=current_user.id,
+        )
 
     if not result:
         raise HTTPException(
@@ -99,39 +127,171 @@ async def delete_tweet_like(
     return {"result": True}
 
 
-@router.get("/", response_model=schemas.TweetsResponse)
+@router.get("/", response_model=schemas.TweetsResponse | schemas.TweetsBatchResponse)
+@router.get(
+    "",
+    response_model=schemas.TweetsResponse | schemas.TweetsBatchResponse,
+    include_in_schema=False,
+)
 async def get_tweets(
-    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    page_key: Annotated[tuple[datetime, int] | None, Depends(get_page_key)],
+    ids: Annotated[list[int] | None, Depends(get_optional_batch_ids)],
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    stream: Annotated[bool, Query()] = False,
+    accept: Annotated[str | None, Header()] = None,
 ):
     """
-    Retrieve a list of all tweets.
+    Retrieve one page of the tweets feed.
+
+    The feed is ordered from the newest tweet to the oldest one and is paginated
+    with a keyset cursor: pass the `next_cursor` of a response as `cursor` to get
+    the following page. When `settings.feed_sql_rendering` is enabled, the body is
+    rendered by the database in one statement and sent as is.
+
+    With `stream=true` the tweets are read from a server-side cursor and written
+    to the response as they arrive, so pages of up to `settings.feed_stream_max_size`
+    tweets can be requested; that is also the page size when `limit` is omitted.
+    Clients accepting `application/x-ndjson` get one tweet per line instead of a
+    single JSON document.
+
+    With `ids`, the listed tweets are returned instead of a feed page, in the shape
+    of `TweetsBatchResponse`: the tweets in request order and the IDs of the
+    missing ones, at most `settings.batch_max_ids` of them. `ids` cannot be
+    combined with `cursor`, `limit` or `stream`.
 
     Parameters
     ----------
+    current_user : UserOut
+        The currently authenticated user, used to flag the tweets they liked.
     session : AsyncSession
-        Database session for performing operations.
+        Read-only database session, bound to a replica when possible.
+    page_key : tuple of (datetime, int) or None
+        The decoded `cursor` query parameter, provided by `get_page_key`.
+    ids : list of int or None
+        The comma-separated `ids` query parameter, provided by `get_optional_batch_ids`.
+    limit : int or None
+        The maximum number of tweets in the page. Defaults to `settings.feed_page_size`,
+        or to `settings.feed_stream_max_size` when streaming.
+    stream : bool
+        Whether to stream the response from a server-side cursor.
+    accept : str or None
+        The Accept header, used to choose NDJSON output when streaming.
 
     Returns
     -------
     dict
-        JSON object containing the key "result" with the value True and the key "tweets"
-        with a list of all tweets.
+        JSON object containing the key "result" with the value True, the key "tweets"
+        with the tweets of the page and the key "next_cursor" with the cursor of the
+        next page (None for the last page).
+
+    Raises
+    ------
+    HTTPException
+        If `limit` exceeds `settings.feed_max_page_size`, or
+        `settings.feed_stream_max_size` when streaming, or if `ids` is combined with
+        `cursor`, `limit` or `stream`.
     """
-    tweets = await tweets_qr.get_all_tweets(session)
-    tweets_response = [
-        {
-            "id": tweet.id,
-            "content": tweet.content,
-            "attachments": [att.src for att in tweet.attachments],
-            "author": tweet.author,
-            "likes": tweet.tweet_likes,
-        }
-        for tweet in tweets
-    ]
-    return {
-        "result": True,
-        "tweets": tweets_response,
-    }
+    if ids is not None:
+        if page_key is not None or limit is not None or stream:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="ids cannot be combined with cursor, limit or stream.",
+            )
+        tweets = await tweets_qr.get_tweets_by_ids(
+            session,
+            tweet_ids=ids,
+            viewer_id=current_user.id,
+        )
+        return Response(
+            content=build_tweets_batch(tweets, ids, viewer_id=current_user.id),
+            media_type="application/json",
+        )
+
+    max_limit = settings.feed_stream_max_size if stream else settings.feed_max_page_size
+    if limit is None:
+        limit = settings.feed_stream_max_size if stream else settings.feed_page_size
+    elif limit > max_limit:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Limit should be less than or equal to {max_limit}.",
+        )
+
+    if stream:
+        ndjson = accept is not None and "application/x-ndjson" in accept
+        tweets = tweets_qr.stream_tweets(
+            session,
+            cursor=page_key,
+            viewer_id=current_user.id,
+            limit=limit + 1,
+        )
+        return StreamingResponse(
+            stream_tweets_page(
+                session, tweets, limit=limit, ndjson=ndjson, viewer_id=current_user.id,
+            ),
+            media_type="application/x-ndjson" if ndjson else "application/json",
+        )
+
+    if settings.feed_sql_rendering:
+        tweets_json, last_key = await tweets_qr.get_tweets_page_json(
+            session,
+            limit=limit,
+            cursor=page_key,
+            viewer_id=current_user.id,
+        )
+        return Response(
+            content=build_raw_tweets_page(tweets_json, last_key, viewer_id=current_user.id),
+            media_type="application/json",
+        )
+
+    tweets, has_more = await tweets_qr.get_tweets_page(
+        session,
+        limit=limit,
+        cursor=page_key,
+        viewer_id=current_user.id,
+    )
+    return build_tweets_page(tweets, has_more, viewer_id=current_user.id)
+
+
+@router.get("/home", response_model=schemas.TweetsResponse)
+async def get_home_timeline(
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    page_key: Annotated[tuple[datetime, int] | None, Depends(get_page_key)],
+    limit: Annotated[int, Query(ge=1, le=settings.feed_max_page_size)] = settings.feed_page_size,
+):
+    """
+    Retrieve one page of the current user's home timeline.
+
+    The home timeline contains the tweets of the current user and of the users
+    they follow, newest first. It is paginated the same way as the global feed.
+
+    Parameters
+    ----------
+    current_user : UserOut
+        The currently authenticated user.
+    session : AsyncSession
+        Read-only database session, bound to a replica when possible.
+    page_key : tuple of (datetime, int) or None
+        The decoded `cursor` query parameter, provided by `get_page_key`.
+    limit : int
+        The maximum number of tweets in the page.
+
+    Returns
+    -------
+    dict
+        JSON object containing the key "result" with the value True, the key "tweets"
+        with the tweets of the page and the key "next_cursor" with the cursor of the
+        next page (None for the last page).
+    """
+    tweets, has_more = await timelines_qr.get_home_timeline_page(
+        session,
+        user_id=current_user.id,
+        limit=limit,
+        cursor=page_key,
+    )
+    return build_tweets_page(tweets, has_more, viewer_id=current_user.id)
 
 
 @router.post("/")
@@ -144,6 +304,9 @@ async def create_tweet(
     """
     Create a new tweet.
 
+    The tweet is created and its media attached in a single transaction, so a
+    failure never leaves a tweet without its media.
+
     Parameters
     ----------
     tweet_data : str
@@ -164,32 +327,27 @@ async def create_tweet(
     Raises
     ------
     HTTPException
-        If there is an SQLAlchemy error during tweet creation or media update.
+        If a media does not exist, was not uploaded by the user or is already attached to
+        a tweet, an HTTP exception with status code 404 is raised; if there is an
+        SQLAlchemy error during tweet creation, status code 500 is returned.
     """
     try:
         tweet_id = await tweets_qr.create_tweet(
             session,
             tweet_content=tweet_data,
             current_user_id=current_user.id,
+            tweet_media_ids=tweet_media_ids,
         )
     except SQLAlchemyError:
         raise HTTPException(
             status_code=500,
             detail="Failed to create tweet",
         )
-
-    if tweet_media_ids:
-        try:
-            await medias_qr.update_data_medias(
-                session,
-                tweet_id=tweet_id,
-                tweet_media_ids=tweet_media_ids,
-            )
-        except SQLAlchemyError:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to update tweet media",
-            )
+    if tweet_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media doesn't exist, doesn't belong to you or is already attached",
+        )
 
     return {
         "result": True,
@@ -1,11 +1,19 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path, status
+from fastapi import APIRouter, Body, Depends, Path, Query, status
 from fastapi.exceptions import HTTPException
+from pydantic import Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..core import settings
 from ..db import UserOut, schemas, users_qr
-from ..dependencies import get_current_user_by_api_key, scoped_session_db
+from ..dependencies import (
+    get_batch_ids,
+    get_current_user_by_api_key,
+    scoped_read_session_db,
+    scoped_session_db,
+)
+from ..follow_suggestions import suggest_users
 
 router = APIRouter(
     prefix="/api/users",
@@ -13,20 +21,60 @@ router = APIRouter(
 )
 
 
+@router.get("", response_model=schemas.UsersBatchResponse)
+@router.get("/", response_model=schemas.UsersBatchResponse, include_in_schema=False)
+async def get_users(
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    ids: Annotated[list[int], Depends(get_batch_ids)],
+):
+    """
+    Retrieve several users by their IDs.
+
+    Like the batch lookup of tweets, it is reserved to authenticated users.
+
+    Parameters
+    ----------
+    current_user : UserOut
+        The current authenticated user.
+    session : AsyncSession
+        Read-only database session, bound to a replica when possible.
+    ids : list of int
+        The IDs of the users, given as the comma-separated `ids` query parameter.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status, the existing users in request
+        order and the IDs of the missing ones.
+    """
+    users = await users_qr.get_users_by_ids(session, user_ids=ids)
+    users_by_id = {user.id: user for user in users}
+    return {
+        "result": True,
+        "users": [users_by_id[user_id] for user_id in ids if user_id in users_by_id],
+        "missing_ids": [user_id for user_id in ids if user_id not in users_by_id],
+    }
+
+
 @router.get("/me", response_model=schemas.UserResponse)
 async def current_user_profile(
     current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
-    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
 ):
     """
     Retrieve the current user's profile information.
 
+    The profile holds the follower and following counts and the first
+    `settings.follow_page_size` users of both lists; the rest is read through
+    `GET /api/users/{id}/followers` and `GET /api/users/{id}/following`.
+
     Parameters
     ----------
     current_user : UserOut
         The current authenticated user.
     session : AsyncSession
-        The database session for executing operations.
+        Read-only database session, bound to a replica when possible.
 
     Returns
     -------
@@ -37,6 +85,7 @@ async def current_user_profile(
     user = await users_qr.get_full_user_info_by_id(
         session,
         user_id=current_user.id,
+        page_size=settings.follow_page_size,
     )
     return {
         "result": True,
@@ -44,6 +93,131 @@ async def current_user_profile(
     }
 
 
+@router.get("/me/suggestions", response_model=schemas.SuggestionsResponse)
+async def follow_suggestions(
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    limit: Annotated[int, Query(ge=1, le=settings.follow_max_page_size)] = (
+        settings.follow_suggestions_count
+    ),
+):
+    """
+    Suggest users for the current user to follow.
+
+    Candidates are the users followed by the users the current user follows,
+    ranked by how many of them follow each candidate, then by whether the
+    candidate follows the current user. They are computed from the shared follow
+    graph snapshot, not from `user_followers`.
+
+    Parameters
+    ----------
+    current_user : UserOut
+        The current authenticated user.
+    session : AsyncSession
+        Read-only database session, bound to a replica when possible.
+    limit : int, optional
+        The maximum number of suggestions. Defaults to `settings.follow_suggestions_count`.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status and the suggested users.
+    """
+    users = await suggest_users(session, user_id=current_user.id, limit=limit)
+    return {
+        "result": True,
+        "users": users,
+    }
+
+
+@router.get("/relationships", response_model=schemas.RelationshipsResponse)
+async def user_relationships(
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    ids: Annotated[list[int], Depends(get_batch_ids)],
+):
+    """
+    Retrieve the follow relationships between the current user and a list of users.
+
+    Unknown users are reported as neither followed nor following.
+
+    Parameters
+    ----------
+    current_user : UserOut
+        The current authenticated user.
+    session : AsyncSession
+        Read-only database session, bound to a replica when possible.
+    ids : list of int
+        The IDs of the users, given as the comma-separated `ids` query parameter.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status and, by user ID, whether the
+        current user follows the user, whether the user follows the current user
+        and whether both are true.
+    """
+    relationships = await users_qr.get_relationships(
+        session,
+        user_id=current_user.id,
+        other_ids=ids,
+    )
+    return {
+        "result": True,
+        "relationships": {
+            other_id: {
+                "following": following,
+                "followed_by": followed_by,
+                "mutual": following and followed_by,
+            }
+            for other_id, (following, followed_by) in relationships.items()
+        },
+    }
+
+
+@router.post("/follow", response_model=schemas.BulkFollowResponse)
+async def create_user_following_nodes(
+    ids: Annotated[
+        list[Annotated[int, Field(ge=1)]],
+        Body(embed=True, min_length=1, max_length=settings.bulk_follow_max_ids),
+    ],
+    current_user: Annotated[UserOut, Depends(get_current_user_by_api_key)],
+    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+):
+    """
+    Make the current user follow a list of users at once.
+
+    Users that do not exist or are already followed, and the current user, are
+    skipped and reported; the others are followed in one transaction.
+
+    Parameters
+    ----------
+    ids : list of int
+        The IDs of the users to follow, at most `settings.bulk_follow_max_ids`.
+    current_user : UserOut
+        The current authenticated user.
+    session : AsyncSession
+        The database session for executing operations.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status, the number of followed users
+        and the outcome for every requested user: "followed", "already_following",
+        "not_found" or "self".
+    """
+    outcomes = await users_qr.create_user_following_nodes(
+        session,
+        follower_id=current_user.id,
+        user_ids=list(dict.fromkeys(ids)),
+    )
+    return {
+        "result": True,
+        "followed_count": sum(outcome == "followed" for outcome in outcomes.values()),
+        "outcomes": outcomes,
+    }
+
+
 @router.post("/{id}/follow")
 async def create_user_following_node(
     id: Annotated[int, Path(ge=1)],
@@ -71,34 +245,18 @@ async def create_user_following_node(
     Raises
     ------
     HTTPException
+        If the user specified by `id` is the current_user:
+            - 422 status code with detail "You can't subscribe to yourself"
         If the user specified by `id` is not found:
             - 404 status code with detail "User with id: <id> not found"
         If the current_user is already following the user specified by `id`:
             - 409 status code with detail "You have already subscribed to this user with id: <id>"
-        If there is an internal server error while creating the user following node:
-            - 500 status code with detail "Failed to create user_following_node"
 
     """
-    user = await users_qr.get_user_by_id(
-        session=session,
-        user_id=id,
-    )
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with id: {id} not found",
-        )
-    user_follower_node = await users_qr.get_user_following_node(
-        session=session,
-        user_id=id,
-        follower_id=current_user.id,
-    )
-
-    if user_follower_node:
+    if id == current_user.id:
         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"You have already subscribed to this user with id: {id}",
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="You can't subscribe to yourself",
         )
     result = await users_qr.create_user_following_node(
         session,
@@ -106,10 +264,15 @@ async def create_user_following_node(
         user_id=id,
     )
 
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with id: {id} not found",
+        )
     if not result:
         raise HTTPException(
-            status_code=500,
-            detail="Failed to create user_following_node",
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"You have already subscribed to this user with id: {id}",
         )
     return {"result": True}
 
@@ -158,20 +321,127 @@ async def delete_user_following_node(
     return {"result": True}
 
 
+@router.get("/{id}/followers", response_model=schemas.UsersPageResponse)
+async def user_followers(
+    id: Annotated[int, Path(ge=1)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    cursor: Annotated[int | None, Query(ge=1)] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.follow_max_page_size)] = (
+        settings.follow_page_size
+    ),
+):
+    """
+    Retrieve one page of the followers of a user, ordered by ID.
+
+    Pass the `next_cursor` of a response as `cursor` to get the next page.
+
+    Parameters
+    ----------
+    id : int
+        Path parameter for user ID. Must be greater than or equal to 1.
+    session : AsyncSession
+        Read-only database session, bound to a replica when possible.
+    cursor : int, optional
+        The `next_cursor` of the previous page.
+    limit : int, optional
+        The number of users in the page. Defaults to `settings.follow_page_size`.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status, the users of the page and the
+        cursor of the next page.
+
+    Raises
+    ------
+    HTTPException
+        If the user is not found (404 status).
+    """
+    users, has_more = await users_qr.get_followers_page(
+        session,
+        user_id=id,
+        limit=limit,
+        cursor=cursor,
+    )
+    return await _users_page(session, id, users, has_more)
+
+
+@router.get("/{id}/following", response_model=schemas.UsersPageResponse)
+async def user_following(
+    id: Annotated[int, Path(ge=1)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
+    cursor: Annotated[int | None, Query(ge=1)] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.follow_max_page_size)] = (
+        settings.follow_page_size
+    ),
+):
+    """
+    Retrieve one page of the users followed by a user, ordered by ID.
+
+    Pass the `next_cursor` of a response as `cursor` to get the next page.
+
+    Parameters
+    ----------
+    id : int
+        Path parameter for user ID. Must be greater than or equal to 1.
+    session : AsyncSession
+        Read-only database session, bound to a replica when possible.
+    cursor : int, optional
+        The `next_cursor` of the previous page.
+    limit : int, optional
+        The number of users in the page. Defaults to `settings.follow_page_size`.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the result status, the users of the page and the
+        cursor of the next page.
+
+    Raises
+    ------
+    HTTPException
+        If the user is not found (404 status).
+    """
+    users, has_more = await users_qr.get_following_page(
+        session,
+        user_id=id,
+        limit=limit,
+        cursor=cursor,
+    )
+    return await _users_page(session, id, users, has_more)
+
+
+async def _users_page(session: AsyncSession, user_id: int, users: list, has_more: bool) -> dict:
+    """Build a page of users, telling an empty page from a missing user."""
+    if not users and await users_qr.get_user_by_id(session, user_id=user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with id: {user_id} not found",
+        )
+    return {
+        "result": True,
+        "users": users,
+        "next_cursor": users[-1].id if has_more else None,
+    }
+
+
 @router.get("/{id}", response_model=schemas.UserResponse)
 async def user_profile(
     id: Annotated[int, Path(ge=1)],
-    session: Annotated[AsyncSession, Depends(scoped_session_db)],
+    session: Annotated[AsyncSession, Depends(scoped_read_session_db)],
 ):
     """
     Retrieve the profile information of a user by their ID.
 
+    Like the current user's profile, it embeds only the first page of followers
+    and followed users.
+
     Parameters
     ----------
     id : int
         Path parameter for user ID. Must be greater than or equal to 1.
     session : AsyncSession
-        The database session for executing operations.
+        Read-only database session, bound to a replica when possible.
 
     Returns
     -------
@@ -185,7 +455,11 @@ async def user_profile(
     HTTPException
         If the user is not found (404 status).
     """
-    user = await users_qr.get_full_user_info_by_id(session, user_id=id)
+    user = await users_qr.get_full_user_info_by_id(
+        session,
+        user_id=id,
+        page_size=settings.follow_page_size,
+    )
 
     if not user:
         raise HTTPException(
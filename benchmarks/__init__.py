@@ -0,0 +1,12 @@
+"""
+Package 'benchmarks'.
+
+Scripts measuring the performance of alternative code paths of the API. They
+are run by hand against a disposable database and are not part of the tests.
+
+Package components:
+1. The 'bench_feed_rendering' module compares rendering a feed page through the
+ORM and pydantic with rendering it to JSON in the database.
+2. The 'bench_write_paths' module compares the single-statement like, follow and
+delete writes with the read-then-write ones they replaced.
+"""
@@ -1327,6 +1327,8 @@
             return L
         })), n.d(t, "b", (function () {
             return I
+        })), n.d(t, "n", (function () {
+            return E
         }));
         var c = n("1da1"), r = (n("99af"), n("96cf"), n("bc3a")), i = n.n(r), a = (n("94db"), n("4360"));
         n("0377");
@@ -1432,7 +1434,7 @@
                         case 0:
                             return e.abrupt("return", B({
                                 type: "get",
-                                path: "/api/tweets?offset=".concat(t, "&limit=").concat(n)
+                                path: "/api/tweets?limit=".concat(t).concat(n ? "&cursor=".concat(encodeURIComponent(n)) : "")
                             }));
                         case 1:
                         case"end":
@@ -1568,6 +1570,24 @@
             }))), P.apply(this, arguments)
         }
 
+        function E(e) {
+            return A.apply(this, arguments)
+        }
+
+        function A() {
+            return A = Object(c["a"])(regeneratorRuntime.mark((function e(t) {
+                return regeneratorRuntime.wrap((function (e) {
+                    while (1) switch (e.prev = e.next) {
+                        case 0:
+                            return e.abrupt("return", B({type: "get", path: "/api/users/relationships?ids=".concat(t)}));
+                        case 1:
+                        case"end":
+                            return e.stop()
+                    }
+                }), e)
+            }))), A.apply(this, arguments)
+        }
+
         function B(e) {
             return T.apply(this, arguments)
         }
@@ -205,12 +205,14 @@
         var I = N, U = (n("42d8"), {
             components: {AddTweet: p["a"], Tweet: b["a"], VPagination: I},
             data: function () {
-                return {tweetData: [], page: 1, allTweetsCount: 10}
+                return {tweetData: [], page: 1, allTweetsCount: 10, pageCursors: [null]}
             },
             computed: Object(u["a"])(Object(u["a"])({}, Object(d["b"])(["getMe"])), Object(d["c"])(["isPaginationEnabled", "paginationLimit"])),
             watch: {
                 isPaginationEnabled: function () {
-                    this.getTweets()
+                    this.resetPages(), this.getTweets()
+                }, paginationLimit: function () {
+                    this.resetPages(), this.getTweets()
                 }
             },
             mounted: function () {
@@ -235,6 +237,17 @@
             methods: {
                 onPaginate: function () {
                     this.getTweets()
+                }, resetPages: function () {
+                    this.page = 1, this.allTweetsCount = 10, this.pageCursors = [null]
+                }, getTweetsPage: function (e) {
+                    var t = this, n = this.pageCursors.length;
+                    return e > n ? this.getTweetsPage(n).then((function (a) {
+                        return t.pageCursors.length > n ? t.getTweetsPage(e) : a
+                    })) : Object(g["e"])(this.paginationLimit, this.pageCursors[e - 1]).then((function (n) {
+                        var a, o = null === n || void 0 === n ? void 0 : n.data,
+                            i = null === o || void 0 === o ? void 0 : o.next_cursor;
+                        return t.pageCursors.length === e && (i && t.pageCursors.push(i), t.allTweetsCount = i ? (e + 1) * t.paginationLimit : (e - 1) * t.paginationLimit + ((null === o || void 0 === o || null === (a = o.tweets) || void 0 === a ? void 0 : a.length) || 0)), n
+                    }))
                 }, handleTweetSubmit: function () {
                     var e = this;
                     return Object(r["a"])(regeneratorRuntime.mark((function t() {
@@ -258,7 +271,7 @@
                     })))()
                 }, getTweets: function () {
                     var e = Object(r["a"])(regeneratorRuntime.mark((function e() {
-                        var t, n, a, c, o, i;
+                        var t, n, a;
                         return regeneratorRuntime.wrap((function (e) {
                             while (1) switch (e.prev = e.next) {
                                 case 0:
@@ -266,9 +279,7 @@
                                         e.next = 10;
                                         break
                                     }
-                                    return e.next = 3, Object(g["d"])();
-                                case 3:
-                                    return i = e.sent, this.allTweetsCount = null === i || void 0 === i || null === (c = i.data) || void 0 === c || null === (o = c.tweets) || void 0 === o ? void 0 : o.length, e.next = 7, Object(g["e"])(this.page, this.paginationLimit);
+                                    return e.next = 7, this.getTweetsPage(this.page);
                                 case 7:
                                     a = e.sent, e.next = 13;
                                     break;
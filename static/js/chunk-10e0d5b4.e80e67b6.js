@@ -20,7 +20,7 @@
             }, methods: {
                 handleLogin: function () {
                     var e = Object(o["a"])(regeneratorRuntime.mark((function e() {
-                        var n, r, t, a, i, o;
+                        var t, a, i, o;
                         return regeneratorRuntime.wrap((function (e) {
                             while (1) switch (e.prev = e.next) {
                                 case 0:
@@ -45,8 +45,8 @@
                                             website: "https://cooldev.com"
                                         },
                                         account: {
-                                            followingCount: null === a || void 0 === a || null === (n = a.following) || void 0 === n ? void 0 : n.length,
-                                            followerCount: null === a || void 0 === a || null === (r = a.followers) || void 0 === r ? void 0 : r.length
+                                            followingCount: null === a || void 0 === a ? void 0 : a.following_count,
+                                            followerCount: null === a || void 0 === a ? void 0 : a.follower_count
                                         }
                                     }), e.abrupt("return", this.$router.push("/"));
                                 case 13:
@@ -29,11 +29,12 @@
                 u = Object(r["C"])("EditProfilePopup");
             return Object(r["u"])(), Object(r["g"])("div", i, [Object(r["k"])(s, {
                 id: o.userId,
-                following: o.following,
-                followers: o.followers,
+                followingCount: o.followingCount,
+                followerCount: o.followerCount,
+                followed: o.followed,
                 name: o.name,
                 onRefresh: a.getData
-            }, null, 8, ["id", "following", "followers", "name", "onRefresh"]), Object(r["k"])(l), e.getEditProfileStatus ? (Object(r["u"])(), Object(r["e"])(u, {key: 0})) : Object(r["f"])("", !0)])
+            }, null, 8, ["id", "followingCount", "followerCount", "followed", "name", "onRefresh"]), Object(r["k"])(l), e.getEditProfileStatus ? (Object(r["u"])(), Object(r["e"])(u, {key: 0})) : Object(r["f"])("", !0)])
         }
 
         var o = n("1da1"), a = n("5530"), s = (n("96cf"), {class: "profile-body"}),
@@ -85,7 +86,7 @@
 
         function A(e, t, n, i, c, o) {
             var a, s, l = Object(r["C"])("base-icon");
-            return e.me.id ? (Object(r["u"])(), Object(r["g"])("header", O, [Object(r["h"])("div", h, [Object(r["h"])("img", {src: e.me.profile.pic_cover}, null, 8, m)]), Object(r["h"])("div", w, [Object(r["h"])("div", v, [Object(r["h"])("div", g, [Object(r["h"])("img", {src: o.avatar}, null, 8, k)]), o.isMe ? Object(r["f"])("", !0) : (Object(r["u"])(), Object(r["g"])("div", y, [o.isFollowing ? (Object(r["u"])(), Object(r["g"])("div", {
+            return e.me.id ? (Object(r["u"])(), Object(r["g"])("header", O, [Object(r["h"])("div", h, [Object(r["h"])("img", {src: e.me.profile.pic_cover}, null, 8, m)]), Object(r["h"])("div", w, [Object(r["h"])("div", v, [Object(r["h"])("div", g, [Object(r["h"])("img", {src: o.avatar}, null, 8, k)]), o.isMe ? Object(r["f"])("", !0) : (Object(r["u"])(), Object(r["g"])("div", y, [n.followed ? (Object(r["u"])(), Object(r["g"])("div", {
                 key: 0,
                 class: "follow-button",
                 onClick: t[0] || (t[0] = function () {
@@ -97,14 +98,14 @@
                 onClick: t[1] || (t[1] = function () {
                     return o.onFollowClick && o.onFollowClick.apply(o, arguments)
                 })
-            }, " Читать "))]))]), Object(r["h"])("div", P, [Object(r["h"])("p", C, Object(r["F"])(n.name), 1), Object(r["h"])("span", R, Object(r["F"])(n.name), 1)]), Object(r["h"])("div", D, Object(r["F"])(e.me.profile.description), 1), Object(r["h"])("div", I, [Object(r["h"])("span", null, [Object(r["k"])(l, {icon: "link"}), Object(r["h"])("a", {href: o.profileWebsite.full_website}, Object(r["F"])(o.profileWebsite.website), 9, M)]), Object(r["h"])("span", null, [Object(r["k"])(l, {icon: "calendar"}), x])]), Object(r["h"])("div", T, [Object(r["h"])("p", null, [Object(r["j"])(Object(r["F"])(null === (a = n.following) || void 0 === a ? void 0 : a.length) + " ", 1), F]), Object(r["h"])("p", null, [Object(r["j"])(Object(r["F"])(null === (s = n.followers) || void 0 === s ? void 0 : s.length) + " ", 1), U])])])])) : Object(r["f"])("", !0)
+            }, " Читать "))]))]), Object(r["h"])("div", P, [Object(r["h"])("p", C, Object(r["F"])(n.name), 1), Object(r["h"])("span", R, Object(r["F"])(n.name), 1)]), Object(r["h"])("div", D, Object(r["F"])(e.me.profile.description), 1), Object(r["h"])("div", I, [Object(r["h"])("span", null, [Object(r["k"])(l, {icon: "link"}), Object(r["h"])("a", {href: o.profileWebsite.full_website}, Object(r["F"])(o.profileWebsite.website), 9, M)]), Object(r["h"])("span", null, [Object(r["k"])(l, {icon: "calendar"}), x])]), Object(r["h"])("div", T, [Object(r["h"])("p", null, [Object(r["j"])(Object(r["F"])(n.followingCount) + " ", 1), F]), Object(r["h"])("p", null, [Object(r["j"])(Object(r["F"])(n.followerCount) + " ", 1), U])])])])) : Object(r["f"])("", !0)
         }
 
         n("a9e3"), n("d3b7"), n("3ca3"), n("ddb0"), n("2b3d"), n("7db0");
         var E = n("c1df"), $ = n.n(E), H = n("8bac"), S = n("7f56"), V = n("7424"), L = new S["AvatarGenerator"], B = {
             name: "ProfileHeader",
             components: {BaseIcon: H["a"]},
-            props: {id: Number, following: Array, followers: Array, name: String},
+            props: {id: Number, followingCount: Number, followerCount: Number, followed: Boolean, name: String},
             emits: ["refresh"],
             computed: Object(a["a"])(Object(a["a"])({}, Object(b["b"])({
                 getMyProfileId: "getMyProfileId",
@@ -121,11 +122,6 @@
                     }
                 }, joinedAtDate: function () {
                     return "".concat($()(this.me.createdAt).format("MMM YYYY"))
-                }, isFollowing: function () {
-                    var e, t = this;
-                    return null === (e = this.followers) || void 0 === e ? void 0 : e.find((function (e) {
-                        return e.id === t.getMyProfileId
-                    }))
                 }
             }),
             methods: {
@@ -280,7 +276,7 @@
             name: "ProfileView",
             components: {ProfileBody: j, ProfileHeader: W, EditProfilePopup: ie},
             data: function () {
-                return {userId: null, following: [], followers: [], name: ""}
+                return {userId: null, followingCount: 0, followerCount: 0, followed: !1, name: ""}
             },
             computed: Object(a["a"])({}, Object(b["b"])(["getMyProfileId", "getEditProfileStatus"])),
             mounted: function () {
@@ -301,13 +297,21 @@
                 getData: function () {
                     var e = this;
                     return Object(o["a"])(regeneratorRuntime.mark((function t() {
-                        var n, r, i, c, o;
+                        var n, r, i, c, o, l, s;
                         return regeneratorRuntime.wrap((function (t) {
                             while (1) switch (t.prev = t.next) {
                                 case 0:
                                     return r = null === (n = e.$route) || void 0 === n ? void 0 : n.params, i = r.profileId, t.next = 3, Object(V["f"])(i);
                                 case 3:
-                                    c = t.sent, o = c.data, e.userId = null === o || void 0 === o ? void 0 : o.user.id, e.following = null === o || void 0 === o ? void 0 : o.user.following, e.followers = null === o || void 0 === o ? void 0 : o.user.followers, e.name = null === o || void 0 === o ? void 0 : o.user.name;
+                                    if (c = t.sent, o = c.data, e.userId = null === o || void 0 === o ? void 0 : o.user.id, e.followingCount = null === o || void 0 === o ? void 0 : o.user.following_count, e.followerCount = null === o || void 0 === o ? void 0 : o.user.follower_count, e.name = null === o || void 0 === o ? void 0 : o.user.name, e.userId !== e.getMyProfileId) {
+                                        t.next = 6;
+                                        break
+                                    }
+                                    return e.followed = !1, t.abrupt("return");
+                                case 6:
+                                    return t.next = 8, Object(V["n"])(e.userId);
+                                case 8:
+                                    l = t.sent, e.followed = !!(null === (s = l.data) || void 0 === s || null === (s = s.relationships) || void 0 === s || null === (s = s[e.userId]) || void 0 === s ? void 0 : s.following);
                                 case 9:
                                 case"end":
                                     return t.stop()
@@ -6600,7 +6600,7 @@
                 onClick: t[2] || (t[2] = function () {
                     return w.handleLikeClick && w.handleLikeClick.apply(w, arguments)
                 })
-            }, [Object(n["k"])(P, {icon: "like"}), Object(n["h"])("span", null, Object(n["F"])((null === (j = a.tweetData) || void 0 === j || null === (x = j.likes) || void 0 === x ? void 0 : x.length) || 0), 1)], 2), Object(n["h"])("div", Y, [Object(n["k"])(P, {icon: "share"})])])), D.isTweetEditing ? (Object(n["u"])(), Object(n["g"])("div", y, [Object(n["h"])("div", {
+            }, [Object(n["k"])(P, {icon: "like"}), Object(n["h"])("span", null, Object(n["F"])((null === (j = a.tweetData) || void 0 === j ? void 0 : j.like_count) || 0), 1)], 2), Object(n["h"])("div", Y, [Object(n["k"])(P, {icon: "share"})])])), D.isTweetEditing ? (Object(n["u"])(), Object(n["g"])("div", y, [Object(n["h"])("div", {
                 class: "action-item cancel",
                 onClick: t[3] || (t[3] = function () {
                     return w.handleCancelEdit && w.handleCancelEdit.apply(w, arguments)
@@ -6692,10 +6692,8 @@
                     var e, t = P.a.utc(null === (e = this.tweetData) || void 0 === e ? void 0 : e.stamp).format();
                     return P()(t).fromNow()
                 }, isLikedByUser: function () {
-                    var e, t, a, n = this;
-                    return (null === (e = this.tweetData) || void 0 === e || null === (t = e.likes) || void 0 === t || null === (a = t.filter((function (e) {
-                        return (null === e || void 0 === e ? void 0 : e.user_id) === n.me.id
-                    }))) || void 0 === a ? void 0 : a.length) > 0
+                    var e;
+                    return !!(null === (e = this.tweetData) || void 0 === e ? void 0 : e.liked_by_me)
                 }
             }),
             mounted: function () {
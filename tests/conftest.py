@@ -1,12 +1,14 @@
 import os
+import shutil
+import tempfile
 from typing import AsyncGenerator
 
 import pytest
 from httpx import ASGITransport, AsyncClient
 
-from api.core import settings, test_db_helper
+from api.core import render_cache, settings, social_graph, test_db_helper
 from api.db import Base
-from api.dependencies import get_current_user_by_api_key, scoped_session_db
+from api.dependencies import get_current_user_by_api_key, scoped_read_session_db, scoped_session_db
 from api.main import app
 
 from .factories import create_test_data_bd
@@ -21,6 +23,7 @@ test_dir = os.path.dirname(__file__)
 
 
 app.dependency_overrides[scoped_session_db] = ovr_scoped_session_db
+app.dependency_overrides[scoped_read_session_db] = ovr_scoped_session_db
 app.dependency_overrides[get_current_user_by_api_key] = ovr_get_current_user_by_api_key
 
 
@@ -29,10 +32,29 @@ async def set_test_settings():
     test_dir_uploaded_images = os.path.join(
         test_dir, "test_api", "test_routers", "uploaded_test_images",
     )
+    test_dir_rendered_images = os.path.join(
+        test_dir, "test_api", "test_routers", "rendered_test_images",
+    )
+    test_dir_staged_uploads = os.path.join(
+        test_dir, "test_api", "test_routers", "staged_test_uploads",
+    )
     settings.dir_uploaded_images = test_dir_uploaded_images
+    settings.dir_rendered_images = test_dir_rendered_images
+    settings.dir_staged_uploads = test_dir_staged_uploads
+    render_cache.cache_dir = test_dir_rendered_images
+    social_graph.directory = tempfile.mkdtemp(prefix="social_graph_")
     yield
-    file_path = os.path.join(test_dir_uploaded_images, "light_image.jpg")
-    os.remove(file_path)
+    shutil.rmtree(social_graph.directory)
+    for test_images_dir in (
+        test_dir_uploaded_images,
+        test_dir_rendered_images,
+        test_dir_staged_uploads,
+    ):
+        for entry in os.scandir(test_images_dir):
+            if entry.is_dir():
+                shutil.rmtree(entry.path)
+            elif entry.name != ".gitkeep":
+                os.remove(entry.path)
 
 
 @pytest.fixture(autouse=True, scope="session")
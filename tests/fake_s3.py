@@ -0,0 +1,118 @@
+import base64
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from urllib.parse import parse_qsl
+
+import httpx
+
+from api.routers.storage import UNSIGNED_PAYLOAD, S3Storage, presign_url, sign_headers
+
+ENDPOINT_URL = "http://minio.test"
+BUCKET = "media"
+ACCESS_KEY = "test-access-key"
+SECRET_KEY = "test-secret-key"
+REGION = "us-east-1"
+
+
+class FakeS3:
+    """
+    In-memory stand-in for an S3-compatible service, such as MinIO.
+
+    It serves one bucket with path-style URLs through an `httpx.MockTransport`
+    and rejects requests whose signature or checksum does not match, like S3.
+
+    Attributes
+    ----------
+    objects : dict of str to tuple of (bytes, datetime)
+        The content and modification time of every object, by key.
+    requests : list of httpx.Request
+        The requests received.
+    """
+
+    def __init__(self):
+        self.objects: dict[str, tuple[bytes, datetime]] = {}
+        self.requests: list[httpx.Request] = []
+        self.transport = httpx.MockTransport(self.handle)
+
+    def storage(self, public_url: str | None = None) -> S3Storage:
+        """Return a store over the bucket of this service."""
+        return S3Storage(
+            endpoint_url=ENDPOINT_URL,
+            bucket=BUCKET,
+            access_key=ACCESS_KEY,
+            secret_key=SECRET_KEY,
+            region=REGION,
+            public_url=public_url,
+            transport=self.transport,
+        )
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer a request like S3 would."""
+        self.requests.append(request)
+        bucket, _, key = request.url.path.lstrip("/").partition("/")
+        if bucket != BUCKET or not key:
+            return httpx.Response(404)
+        if not self._is_signed(request):
+            return httpx.Response(403)
+
+        if request.method == "PUT":
+            content = request.read()
+            if len(content) != int(request.headers["content-length"]):
+                return httpx.Response(400)
+            checksum = request.headers.get("x-amz-checksum-sha256")
+            content_checksum = base64.b64encode(hashlib.sha256(content).digest()).decode()
+            if checksum and checksum != content_checksum:
+                return httpx.Response(400)
+            self.objects[key] = (content, datetime.now(timezone.utc).replace(microsecond=0))
+            return httpx.Response(200)
+
+        if key not in self.objects:
+            return httpx.Response(404)
+        content, modified_at = self.objects[key]
+        if request.method == "DELETE":
+            del self.objects[key]
+            return httpx.Response(204)
+        headers = {"last-modified": format_datetime(modified_at, usegmt=True)}
+        if request.method == "HEAD":
+            return httpx.Response(200, headers=headers)
+        return httpx.Response(200, headers=headers, content=content)
+
+    def _is_signed(self, request: httpx.Request) -> bool:
+        """Check the Signature Version 4 of a request."""
+        url = str(request.url.copy_with(query=None))
+        query = dict(parse_qsl(request.url.query.decode()))
+        if "X-Amz-Signature" in query:
+            signed_names = query["X-Amz-SignedHeaders"].split(";")
+            expected_url = presign_url(
+                request.method,
+                url,
+                headers={name: request.headers[name] for name in signed_names if name != "host"},
+                expires=int(query["X-Amz-Expires"]),
+                access_key=ACCESS_KEY,
+                secret_key=SECRET_KEY,
+                region=REGION,
+                now=datetime.strptime(query["X-Amz-Date"], "%Y%m%dT%H%M%SZ"),
+            )
+            return expected_url == str(request.url)
+
+        authorization = request.headers.get("authorization", "")
+        payload_hash = request.headers.get("x-amz-content-sha256")
+        if payload_hash not in {UNSIGNED_PAYLOAD, hashlib.sha256(request.read()).hexdigest()}:
+            return False
+        signed_names = authorization.partition("SignedHeaders=")[2].partition(",")[0].split(";")
+        expected_headers = sign_headers(
+            request.method,
+            url,
+            headers={
+                name: request.headers[name]
+                for name in signed_names
+                if name not in {"host", "x-amz-date", "x-amz-content-sha256"}
+            },
+            payload_hash=payload_hash,
+            access_key=ACCESS_KEY,
+            secret_key=SECRET_KEY,
+            region=REGION,
+            now=datetime.strptime(request.headers["x-amz-date"], "%Y%m%dT%H%M%SZ"),
+        )
+        return expected_headers["authorization"] == authorization
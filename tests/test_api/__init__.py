@@ -4,4 +4,6 @@ Package 'test_api'.
 Package components:
 1. The 'test_routers' package contains tests for testing all routes of the 'api'.
 2. The 'test_dependencies' module contains tests for the dependencies of the 'api'.
+3. The 'test_auth_cache' module contains tests for the authentication cache.
+4. The 'test_dbhelper' module contains tests for the database helper.
 """
@@ -0,0 +1,64 @@
+import pytest
+
+from api.core.auth_cache import ApiKeyCache
+from api.db import UserOut
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return ApiKeyCache(max_size=2, ttl=60, negative_max_size=2, negative_ttl=5, clock=clock)
+
+
+def test_ttl(cache, clock):
+    cache.set("known", UserOut(id=1, name="first"))
+    cache.set("unknown", None)
+    clock.now = 10
+    assert cache.get("known").id == 1
+    assert cache.get("unknown") is cache.MISSING
+    clock.now = 60
+    assert cache.get("known") is cache.MISSING
+    assert cache.stats() == {
+        "size": 0, "negative_size": 0, "hits": 1, "negative_hits": 0, "misses": 2,
+    }
+
+
+def test_lru_eviction(cache):
+    cache.set("first", UserOut(id=1, name="first"))
+    cache.set("second", UserOut(id=2, name="second"))
+    cache.get("first")
+    cache.set("third", UserOut(id=3, name="third"))
+    assert cache.get("second") is cache.MISSING
+    assert cache.get("first").id == 1
+    assert cache.get("third").id == 3
+
+
+def test_unknown_keys_do_not_evict_users(cache):
+    cache.set("first", UserOut(id=1, name="first"))
+    for api_key in ("unknown", "other", "third"):
+        cache.set(api_key, None)
+    assert cache.get("first").id == 1
+    assert cache.get("unknown") is cache.MISSING
+    assert cache.get("third") is None
+    cache.set("third", UserOut(id=3, name="third"))
+    assert cache.get("third").id == 3
+
+
+def test_invalidate_user(cache):
+    cache.set("first", UserOut(id=1, name="first"))
+    cache.set("second", UserOut(id=2, name="second"))
+    cache.invalidate_user(1)
+    assert cache.get("first") is cache.MISSING
+    assert cache.get("second").id == 2
@@ -4,7 +4,8 @@ import pytest
 from fastapi import HTTPException
 
 from api import dependencies
-from api.core import test_db_helper
+from api.core import api_key_cache, test_db_helper
+from api.db import User
 
 
 @pytest.mark.asyncio(scope="session")
@@ -30,3 +31,57 @@ async def test_get_current_user_by_api_key(api_key, exp_err_msg):
     else:
         user = await dependencies.get_current_user_by_api_key(session=session, api_key=api_key)
         assert user.id == 1
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_current_user_by_api_key_cache():
+    api_key_cache.clear()
+    session = test_db_helper.get_scoped_session()
+    for _ in range(2):
+        user = await dependencies.get_current_user_by_api_key(session=session, api_key="test")
+        with pytest.raises(HTTPException):
+            await dependencies.get_current_user_by_api_key(session=session, api_key="unknown")
+    assert user.id == 1
+    assert api_key_cache.stats() == {
+        "size": 1, "negative_size": 1, "hits": 1, "negative_hits": 1, "misses": 2,
+    }
+
+    db_user = await session.get(User, 1)
+    name = db_user.name
+    db_user.name = "renamed"
+    await session.flush()
+    assert api_key_cache.get("test").id == 1  # not committed yet
+    await session.rollback()
+    assert api_key_cache.get("test").id == 1
+
+    db_user = await session.get(User, 1)
+    db_user.name = "renamed"
+    await session.commit()
+    assert api_key_cache.get("test") is api_key_cache.MISSING
+    db_user.name = name
+    await session.commit()
+    await session.close()
+
+
+@pytest.mark.parametrize(
+    "ids, exp_result",
+    [
+        ("3,1,3,2", [3, 1, 2]),
+        ("1,a", None),
+        ("0,1", None),
+        (",".join(["1"] * 10 + [str(num) for num in range(2, 600)]), None),
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_get_batch_ids(ids, exp_result):
+    if exp_result is None:
+        with pytest.raises(HTTPException):
+            await dependencies.get_batch_ids(ids=ids)
+    else:
+        assert await dependencies.get_batch_ids(ids=ids) == exp_result
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_optional_batch_ids():
+    assert await dependencies.get_optional_batch_ids(ids=None) is None
+    assert await dependencies.get_optional_batch_ids(ids="2,1") == [2, 1]
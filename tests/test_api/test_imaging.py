@@ -0,0 +1,60 @@
+import os
+import shutil
+
+import pytest
+from PIL import Image as PILImage
+from PIL import UnidentifiedImageError
+
+from api.core import imaging
+
+path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_routers", "test_images")
+
+
+def test_render_variants(tmp_path):
+    image_path = tmp_path / "photo.jpg"
+    exif = PILImage.Exif()
+    exif[0x0112] = 6  # Orientation: rotated 90 degrees clockwise
+    exif[0x010F] = "Test camera"  # Make
+    PILImage.new("RGB", (300, 200), "red").save(image_path, exif=exif)
+
+    rendered = imaging.render_variants(
+        str(image_path), "hash", {"thumbnail": 50, "full": 2048}, quality=80,
+    )
+
+    assert rendered == {
+        "width": 200,
+        "height": 300,
+        "variants": {
+            "thumbnail": {"file_name": "hash_thumbnail.webp", "width": 33, "height": 50},
+            "full": {"file_name": "hash_full.webp", "width": 200, "height": 300},
+        },
+    }
+    for variant in rendered["variants"].values():
+        with PILImage.open(tmp_path / variant["file_name"]) as variant_image:
+            assert variant_image.format == "WEBP"
+            assert not variant_image.getexif()
+    assert sorted(os.listdir(tmp_path)) == ["hash_full.webp", "hash_thumbnail.webp", "photo.jpg"]
+
+
+def test_render_variants_not_image(tmp_path):
+    image_path = tmp_path / "not_image.jpg"
+    shutil.copy(os.path.join(path, "not_image.txt"), image_path)
+    with pytest.raises(UnidentifiedImageError):
+        imaging.render_variants(str(image_path), "hash", {"thumbnail": 50}, quality=80)
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_create_variants(tmp_path):
+    image_path = tmp_path / "light_image.jpg"
+    shutil.copy(os.path.join(path, "light_image.jpg"), image_path)
+
+    rendered = await imaging.create_variants(str(image_path), "hash")
+    rendered_again = await imaging.create_variants(str(image_path), "hash")
+    imaging.shutdown_executor()
+
+    assert rendered == rendered_again
+    assert (rendered["width"], rendered["height"]) == (2560, 1600)
+    assert {
+        name: (variant["width"], variant["height"])
+        for name, variant in rendered["variants"].items()
+    } == {"thumbnail": (160, 100), "feed": (640, 400), "full": (2048, 1280)}
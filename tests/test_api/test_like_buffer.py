@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import select
+
+from api.core import settings, test_db_helper
+from api.db import Tweet, TweetLike
+from api.like_buffer import LikeBuffer, flush_likes, like_buffer
+
+
+def test_like_buffer_coalesces_intents():
+    buffer = LikeBuffer(max_size=2)
+    buffer.add(1, 10, True)
+    buffer.add(1, 10, False)
+    assert len(buffer) == 1
+    assert buffer.get(1, 10) is False
+    assert not buffer._full.is_set()
+
+    buffer.add(2, 10, True)
+    assert buffer._full.is_set()
+    assert buffer.take() == {1: {10: False}, 2: {10: True}}
+    assert len(buffer) == 0
+    assert buffer.get(2, 10) is True  # still visible while it is flushed
+
+    buffer.add(2, 10, False)
+    buffer.finish(flushed=False)
+    assert buffer.pending_for(1) == {10: False}
+    assert buffer.pending_for(2) == {10: False}  # the newer intent wins
+    buffer.take()
+    buffer.finish(flushed=True)
+    assert buffer.get(1, 10) is None
+
+
+async def _get_like_state(tweet_id):
+    session = test_db_helper.get_scoped_session()
+    like = await session.scalar(
+        select(TweetLike).where(TweetLike.user_id == 1, TweetLike.tweet_id == tweet_id),
+    )
+    like_count = await session.scalar(select(Tweet.like_count).where(Tweet.id == tweet_id))
+    await session.close()
+    return like is not None, like_count
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_buffered_likes(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "like_buffer_enabled", True)
+    headers = {"Api-Key": "test"}
+    likes_url = "http://127.0.0.1:8000/api/tweets/3/likes"
+
+    liked = await async_client.post(likes_url, headers=headers)
+    liked_again = await async_client.post(likes_url, headers=headers)
+    missing = await async_client.post(
+        "http://127.0.0.1:8000/api/tweets/100/likes", headers=headers,
+    )
+    feed = await async_client.get("http://127.0.0.1:8000/api/tweets/", headers=headers)
+    buffered_state = await _get_like_state(3)
+
+    assert (liked.status_code, liked_again.status_code, missing.status_code) == (200, 404, 404)
+    tweet = next(tweet for tweet in feed.json()["tweets"] if tweet["id"] == 3)
+    assert (tweet["liked_by_me"], tweet["like_count"]) == (True, 1)
+    assert buffered_state == (False, 0)
+
+    session = test_db_helper.get_scoped_session()
+    assert await flush_likes(session) == 1
+    await session.close()
+    assert await _get_like_state(3) == (True, 1)
+
+    unliked = await async_client.delete(likes_url, headers=headers)
+    relike = await async_client.post(likes_url, headers=headers)
+    unliked_again = await async_client.delete(likes_url, headers=headers)
+    assert [unliked.status_code, relike.status_code, unliked_again.status_code] == [200] * 3
+    assert len(like_buffer) == 1
+
+    session = test_db_helper.get_scoped_session()
+    assert await flush_likes(session) == 1
+    assert await flush_likes(session) == 0
+    await session.close()
+    assert await _get_like_state(3) == (False, 0)
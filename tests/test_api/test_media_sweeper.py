@@ -0,0 +1,49 @@
+import os
+import time
+
+import pytest
+
+from api.core import render_cache, settings
+from api.media_sweeper import remove_image_files
+
+CONTENT_HASH = "ab" * 32
+
+
+def _touch(file_path, age):
+    with open(file_path, "wb"):
+        pass
+    modified_at = time.time() - age
+    os.utime(file_path, (modified_at, modified_at))
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_remove_image_files(tmp_path, monkeypatch):
+    uploaded_dir = tmp_path / "uploaded"
+    rendered_dir = tmp_path / "rendered"
+    shard_dir = uploaded_dir / "ab" / "ab"
+    os.makedirs(shard_dir)
+    os.makedirs(rendered_dir)
+    monkeypatch.setattr(settings, "dir_uploaded_images", str(uploaded_dir))
+    monkeypatch.setattr(render_cache, "cache_dir", str(rendered_dir))
+    for file_name in (f"{CONTENT_HASH}.jpg", f"{CONTENT_HASH}_feed.webp", "cd" * 32 + ".png"):
+        _touch(shard_dir / file_name, age=3600)
+    _touch(rendered_dir / f"{CONTENT_HASH}_100x0.webp", age=0)
+    _touch(uploaded_dir / "legacy.jpg", age=3600)
+    _touch(uploaded_dir / "legacy_photo.jpg", age=3600)
+
+    assert await remove_image_files(f"tweets_images/ab/ab/{CONTENT_HASH}.jpg") is True
+    assert await remove_image_files("tweets_images/legacy.jpg") is True
+    assert await remove_image_files("tweets_images/missing.jpg") is True
+
+    assert os.listdir(shard_dir) == ["cd" * 32 + ".png"]
+    assert os.listdir(rendered_dir) == []
+    assert sorted(os.listdir(uploaded_dir)) == ["ab", "legacy_photo.jpg"]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_remove_image_files_keeps_reused_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "dir_uploaded_images", str(tmp_path))
+    _touch(tmp_path / f"{CONTENT_HASH}.jpg", age=settings.media_file_reuse_window - 60)
+
+    assert await remove_image_files(f"tweets_images/{CONTENT_HASH}.jpg") is False
+    assert os.listdir(tmp_path) == [f"{CONTENT_HASH}.jpg"]
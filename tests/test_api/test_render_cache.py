@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+import pytest
+
+from api.core.render_cache import RenderCache
+
+
+def _write_cached_file(cache_dir, name, size, access_time):
+    file_path = os.path.join(cache_dir, name)
+    with open(file_path, "wb") as cached_file:
+        cached_file.write(b"x" * size)
+    os.utime(file_path, (access_time, access_time))
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_concurrent_requests_share_render(tmp_path):
+    cache = RenderCache(cache_dir=str(tmp_path), max_bytes=1000)
+    rendered_paths = []
+
+    async def render(target_path):
+        rendered_paths.append(target_path)
+        await asyncio.sleep(0.05)
+        with open(target_path, "wb") as rendered_file:
+            rendered_file.write(b"x" * 10)
+
+    paths = await asyncio.gather(*(cache.get_or_render("image.webp", render) for _ in range(5)))
+    cached_path = await cache.get_or_render("image.webp", render)
+
+    assert rendered_paths == [str(tmp_path / "image.webp")]
+    assert set(paths) == {cached_path}
+    assert cache.stats() == {
+        "size_bytes": 10, "hits": 1, "misses": 1, "shared": 4, "evictions": 0,
+    }
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_failed_render_is_not_cached(tmp_path):
+    cache = RenderCache(cache_dir=str(tmp_path), max_bytes=1000)
+
+    async def render(target_path):
+        raise OSError("cannot identify image file")
+
+    for _ in range(2):
+        with pytest.raises(OSError):
+            await cache.get_or_render("image.webp", render)
+    assert cache.misses == 2
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_eviction_by_access_time(tmp_path):
+    cache = RenderCache(cache_dir=str(tmp_path), max_bytes=250)
+    _write_cached_file(tmp_path, "old.webp", 100, access_time=1000)
+    _write_cached_file(tmp_path, "used.webp", 100, access_time=1001)
+    await cache.get_or_render("used.webp", render=None)  # a hit refreshes the access time
+
+    async def render(target_path):
+        with open(target_path, "wb") as rendered_file:
+            rendered_file.write(b"x" * 100)
+
+    await cache.get_or_render("new.webp", render)
+
+    assert sorted(os.listdir(tmp_path)) == ["new.webp", "used.webp"]
+    assert cache.stats()["size_bytes"] == 200
+    assert cache.evictions == 1
@@ -8,4 +8,5 @@ that passed validation during testing.
 3. The 'test_media' module tests the media route.
 4. The 'test_tweets' module tests the tweets route.
 5. The 'test_users' module tests the users route.
+6. The 'test_metrics' module tests the metrics route.
 """
@@ -1,8 +1,23 @@
+import hashlib
 import io
 import os
+from tempfile import SpooledTemporaryFile
 
 import aiofiles  # type: ignore
+import httpx
 import pytest
+from fastapi import UploadFile
+from fastapi.responses import PlainTextResponse
+from PIL import Image as PILImage
+from sqlalchemy import func, select
+
+from api.core import settings, test_db_helper
+from api.db import Image, User, medias_qr
+from api.main import MaxUploadSizeMiddleware
+from api.routers import storage
+from api.routers.router_helpers import save_tweet_image
+
+from ...fake_s3 import BUCKET, ENDPOINT_URL, FakeS3
 
 path = os.path.dirname(os.path.abspath(__file__))
 
@@ -42,6 +57,379 @@ async def test_load_media(async_client, image_path, image_name, exp_response):
         image_io = io.BytesIO(image_data)
 
     response = await async_client.post(
-        "http://127.0.0.1:8000/api/medias/", files={"file": (image_name, image_io)},
+        "http://127.0.0.1:8000/api/medias/",
+        headers={"Api-Key": "test"},
+        files={"file": (image_name, image_io)},
     )
     assert response.json() == exp_response
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_load_media_renders_variants():
+    async with aiofiles.open(os.path.join(path, "test_images", "light_image.jpg"), "rb") as image:
+        content_hash = hashlib.sha256(await image.read()).hexdigest()
+    shard_dir = os.path.join(settings.dir_uploaded_images, content_hash[:2], content_hash[2:4])
+    assert sorted(os.listdir(shard_dir)) == [
+        f"{content_hash}.jpg",
+        f"{content_hash}_feed.webp",
+        f"{content_hash}_full.webp",
+        f"{content_hash}_thumbnail.webp",
+    ]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_load_medias(async_client):
+    async with aiofiles.open(os.path.join(path, "test_images", "light_image.jpg"), "rb") as image:
+        light_image = await image.read()
+    png_image = io.BytesIO()
+    PILImage.new("RGB", (20, 10), "blue").save(png_image, format="PNG")
+
+    response = await async_client.post(
+        "http://127.0.0.1:8000/api/medias/batch",
+        headers={"Api-Key": "test"},
+        files=[
+            ("files", ("small.png", png_image.getvalue())),
+            ("files", ("light_image.jpg", light_image)),
+        ],
+    )
+    assert response.json() == {"result": True, "media_ids": [2, 3]}
+
+    session = test_db_helper.get_scoped_session()
+    images = (await session.scalars(select(Image).where(Image.id.in_([1, 2, 3])))).all()
+    await session.close()
+    images_by_id = {image.id: image for image in images}
+    assert (images_by_id[2].width, images_by_id[2].height) == (20, 10)
+    assert images_by_id[3].src == images_by_id[1].src
+    assert images_by_id[3].variants == images_by_id[1].variants
+
+
+@pytest.mark.parametrize(
+    "file_names, expected_status",
+    [
+        (["light_image.jpg", "not_image.txt"], 415),  # test with one file that is not an image
+        (["light_image.jpg"] * (settings.media_batch_max_files + 1), 422),  # test with too many
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_load_medias_errors(async_client, file_names, expected_status):
+    files = []
+    for file_name in file_names:
+        async with aiofiles.open(os.path.join(path, "test_images", file_name), "rb") as image:
+            files.append(("files", (file_name, await image.read())))
+
+    response = await async_client.post(
+        "http://127.0.0.1:8000/api/medias/batch", headers={"Api-Key": "test"}, files=files,
+    )
+    session = test_db_helper.get_scoped_session()
+    images_count = await session.scalar(select(func.count(Image.id)))
+    queued_count, unused_srcs = await medias_qr.take_file_deletions(session, batch_size=10)
+    await session.close()
+    assert response.status_code == expected_status
+    assert response.json()["result"] is False
+    assert images_count == 3
+    # The stored light image is queued for removal but kept, since media 1 uses it.
+    assert (queued_count, unused_srcs) == ((1, []) if expected_status == 415 else (0, []))
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_resumable_upload(async_client):
+    async with aiofiles.open(os.path.join(path, "test_images", "light_image.jpg"), "rb") as image:
+        image_data = await image.read()
+    half = len(image_data) // 2
+    uploads_url = "http://127.0.0.1:8000/api/medias/uploads"
+    session = test_db_helper.get_scoped_session()
+    other_user = await session.get(User, 2)
+    await session.close()
+    other_headers = {"Api-Key": other_user.api_key}
+
+    created = await async_client.post(
+        uploads_url,
+        headers={"Api-Key": "test"},
+        json={"file_name": "large.jpg", "size": len(image_data)},
+    )
+    upload_id = created.json()["upload_id"]
+    first_chunk = await async_client.patch(
+        f"{uploads_url}/{upload_id}",
+        headers={"Api-Key": "test", "Upload-Offset": "0"},
+        content=image_data[:half],
+    )
+    stale_chunk = await async_client.patch(
+        f"{uploads_url}/{upload_id}",
+        headers={"Api-Key": "test", "Upload-Offset": "0"},
+        content=image_data[:half],
+    )
+    early_finalize = await async_client.post(
+        f"{uploads_url}/{upload_id}/finalize", headers={"Api-Key": "test"},
+    )
+    status_response = await async_client.get(
+        f"{uploads_url}/{upload_id}", headers={"Api-Key": "test"},
+    )
+    anonymous_status = await async_client.get(f"{uploads_url}/{upload_id}")
+    foreign_status = await async_client.get(f"{uploads_url}/{upload_id}", headers=other_headers)
+    foreign_chunk = await async_client.patch(
+        f"{uploads_url}/{upload_id}",
+        headers={**other_headers, "Upload-Offset": str(half)},
+        content=image_data[half:],
+    )
+    foreign_finalize = await async_client.post(
+        f"{uploads_url}/{upload_id}/finalize", headers=other_headers,
+    )
+    oversized_chunk = await async_client.patch(
+        f"{uploads_url}/{upload_id}",
+        headers={"Api-Key": "test", "Upload-Offset": str(half)},
+        content=image_data[half:] + b"extra",
+    )
+    last_chunk = await async_client.patch(
+        f"{uploads_url}/{upload_id}",
+        headers={"Api-Key": "test", "Upload-Offset": str(half)},
+        content=image_data[half:],
+    )
+    finalized = await async_client.post(
+        f"{uploads_url}/{upload_id}/finalize", headers={"Api-Key": "test"},
+    )
+    finalized_again = await async_client.post(
+        f"{uploads_url}/{upload_id}/finalize", headers={"Api-Key": "test"},
+    )
+
+    assert created.json() == {"result": True, "upload_id": upload_id, "offset": 0}
+    assert first_chunk.json() == {"result": True, "offset": half}
+    assert stale_chunk.status_code == 409
+    assert early_finalize.status_code == 409
+    assert status_response.json() == {"result": True, "offset": half, "size": len(image_data)}
+    assert anonymous_status.status_code == 422
+    assert (foreign_status.status_code, foreign_chunk.status_code) == (404, 404)
+    assert foreign_finalize.status_code == 404
+    assert oversized_chunk.status_code == 413
+    assert last_chunk.json() == {"result": True, "offset": len(image_data)}
+    assert finalized.json() == {"result": True, "media_id": 4}
+    assert finalized_again.status_code == 404
+    assert os.listdir(settings.dir_staged_uploads) == [".gitkeep"]
+
+    session = test_db_helper.get_scoped_session()
+    image = await session.get(Image, 4)
+    await session.close()
+    assert image.src == f"tweets_images/{image.content_hash[:2]}/{image.content_hash[2:4]}/" \
+        f"{image.content_hash}.jpg"
+    assert image.content_hash == hashlib.sha256(image_data).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "method, url, body, expected_status",
+    [
+        ("post", "uploads", {"file_name": "video.mp4", "size": 10}, 415),  # unsupported type
+        (
+            "post",
+            "uploads",
+            {"file_name": "large.gif", "size": settings.max_resumable_upload_bytes + 1},
+            422,
+        ),  # test with a too large file
+        ("get", f"uploads/{'ab' * 16}", None, 404),  # test with not existing upload
+        ("get", "uploads/not-an-upload-id", None, 422),  # test with malformed upload id
+        ("post", f"uploads/{'ab' * 16}/finalize", None, 404),  # test with not existing upload
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_resumable_upload_errors(async_client, method, url, body, expected_status):
+    response = await async_client.request(
+        method.upper(),
+        f"http://127.0.0.1:8000/api/medias/{url}",
+        headers={"Api-Key": "test"},
+        json=body,
+    )
+    assert response.status_code == expected_status
+    assert response.json()["result"] is False
+
+
+@pytest.mark.parametrize(
+    "params, exp_media_type, exp_size",
+    [
+        ({"w": 100}, "image/webp", (100, 63)),
+        ({"w": 400, "h": 100, "fmt": "jpeg"}, "image/jpeg", (160, 100)),
+        ({"w": 100}, "image/webp", (100, 63)),  # served from the render cache
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_get_resized_media(async_client, params, exp_media_type, exp_size):
+    response = await async_client.get("http://127.0.0.1:8000/api/medias/1", params=params)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == exp_media_type
+    assert "immutable" in response.headers["cache-control"]
+    with PILImage.open(io.BytesIO(response.content)) as resized_image:
+        assert resized_image.size == exp_size
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_resized_media_accel_redirect(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "render_accel_redirect", True)
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/medias/1", params={"w": 100},
+    )
+    assert response.status_code == 200
+    assert response.content == b""
+    redirect_dir, file_name = os.path.split(response.headers["x-accel-redirect"])
+    assert redirect_dir == "/rendered_images"
+    assert os.path.exists(os.path.join(settings.dir_rendered_images, file_name))
+
+
+@pytest.mark.parametrize(
+    "media_id, params, expected_status",
+    [
+        (20, {"w": 100}, 404),  # test with not existing media id
+        (1, {"w": settings.image_max_render_size + 1}, 422),  # test with too large width
+        (1, {"fmt": "gif"}, 422),  # test with unsupported format
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_get_resized_media_errors(async_client, media_id, params, expected_status):
+    response = await async_client.get(
+        f"http://127.0.0.1:8000/api/medias/{media_id}", params=params,
+    )
+    assert response.status_code == expected_status
+    assert response.json()["result"] is False
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_load_media_chunked_too_large(async_client):
+    async with aiofiles.open(os.path.join(path, "test_images", "heavy_image.png"), "rb") as image:
+        image_data = await image.read()
+    boundary = "test-boundary"
+    body = b"".join((
+        f"--{boundary}\r\n".encode(),
+        b'Content-Disposition: form-data; name="file"; filename="chunked.png"\r\n\r\n',
+        image_data,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ))
+
+    async def body_chunks():
+        for start in range(0, len(body), 65536):
+            yield body[start:start + 65536]
+
+    response = await async_client.post(
+        "http://127.0.0.1:8000/api/medias/",
+        headers={"Api-Key": "test", "Content-Type": f"multipart/form-data; boundary={boundary}"},
+        content=body_chunks(),
+    )
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413
+    assert response.json()["error_type"] == "error max size"
+    assert not os.path.exists(os.path.join(settings.dir_uploaded_images, "chunked.png"))
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_max_upload_size_per_path():
+    async def read_body(scope, receive, send):
+        while (await receive()).get("more_body"):
+            continue
+        await PlainTextResponse("read")(scope, receive, send)
+
+    megabyte = 1024 * 1024
+    app = MaxUploadSizeMiddleware(
+        read_body, max_size=megabyte, path_max_sizes={"/batch": 3 * megabyte},
+    )
+    headers = {"Content-Type": "multipart/form-data; boundary=test-boundary"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app)) as client:
+        single = await client.post(
+            "http://test/single", headers=headers, content=b"x" * 2 * megabyte,
+        )
+        batch = await client.post(
+            "http://test/batch", headers=headers, content=b"x" * 2 * megabyte,
+        )
+        too_large = await client.post(
+            "http://test/batch", headers=headers, content=b"x" * 4 * megabyte,
+        )
+    assert single.status_code == 413
+    assert single.json()["error_message"] == "File too large. Maximum allowed size is 1MB"
+    assert batch.status_code == 200
+    assert too_large.status_code == 413
+    assert too_large.json()["error_message"] == "File too large. Maximum allowed size is 3MB"
+
+
+@pytest.mark.parametrize("spooled_to_disk", [False, True])
+@pytest.mark.asyncio(scope="session")
+async def test_save_tweet_image(tmp_path, monkeypatch, spooled_to_disk):
+    monkeypatch.setattr(settings, "dir_uploaded_images", str(tmp_path))
+    async with aiofiles.open(os.path.join(path, "test_images", "heavy_image.png"), "rb") as image:
+        image_data = await image.read()
+    content_hash = hashlib.sha256(image_data).hexdigest()
+    spooled_file = SpooledTemporaryFile(max_size=len(image_data) + 1)
+    spooled_file.write(image_data)
+    if spooled_to_disk:
+        spooled_file.rollover()
+
+    key, saved_hash = await save_tweet_image(UploadFile(spooled_file, filename="saved.PNG"))
+    duplicate_key, _ = await save_tweet_image(
+        UploadFile(io.BytesIO(image_data), filename="duplicate.jpeg"),
+    )
+
+    relative_path = os.path.join(content_hash[:2], content_hash[2:4], f"{content_hash}.png")
+    assert saved_hash == content_hash
+    assert key == duplicate_key == relative_path
+    async with aiofiles.open(tmp_path / relative_path, "rb") as saved_image:
+        assert await saved_image.read() == image_data
+    assert os.listdir(tmp_path) == [content_hash[:2]]
+    assert os.listdir(tmp_path / content_hash[:2] / content_hash[2:4]) == [f"{content_hash}.png"]
+    assert os.stat(tmp_path / relative_path).st_mode & 0o777 == 0o644
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_presign_media_upload_local_storage(async_client):
+    response = await async_client.post(
+        "http://127.0.0.1:8000/api/medias/presign",
+        headers={"Api-Key": "test"},
+        json={"content_hash": "ab" * 32, "content_type": "image/jpeg", "size": 1024},
+    )
+    assert response.status_code == 501
+    assert response.json()["result"] is False
+
+
+@pytest.mark.parametrize(
+    "body, expected_status",
+    [
+        ({"content_hash": "ab" * 32, "content_type": "image/jpeg", "size": 1024}, 200),
+        ({"content_hash": "ab" * 32, "content_type": "text/plain", "size": 1024}, 415),
+        ({"content_hash": "AB" * 32, "content_type": "image/jpeg", "size": 1024}, 422),
+        (
+            {
+                "content_hash": "ab" * 32,
+                "content_type": "image/jpeg",
+                "size": settings.max_direct_upload_bytes + 1,
+            },
+            422,
+        ),
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_presign_media_upload(async_client, monkeypatch, body, expected_status):
+    monkeypatch.setattr(storage, "media_storage", FakeS3().storage())
+    response = await async_client.post(
+        "http://127.0.0.1:8000/api/medias/presign", headers={"Api-Key": "test"}, json=body,
+    )
+    assert response.status_code == expected_status
+    if expected_status == 200:
+        response_json = response.json()
+        assert response_json["key"] == f"ab/ab/{'ab' * 32}.jpg"
+        assert response_json["upload"]["method"] == "PUT"
+        assert response_json["upload"]["url"].startswith(
+            f"{ENDPOINT_URL}/{BUCKET}/{response_json['key']}?",
+        )
+        assert response_json["upload"]["headers"]["content-length"] == "1024"
+
+
+@pytest.mark.parametrize(
+    "key, expected_status",
+    [
+        (f"ab/ab/{'ab' * 32}.jpg", 404),  # test with a file that was not uploaded
+        (f"cd/cd/{'ab' * 32}.jpg", 422),  # test with a shard not matching the hash
+        ("../../etc/passwd", 422),  # test with a path outside of the storage
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_register_media_errors(async_client, monkeypatch, key, expected_status):
+    monkeypatch.setattr(storage, "media_storage", FakeS3().storage())
+    response = await async_client.post(
+        "http://127.0.0.1:8000/api/medias/register",
+        headers={"Api-Key": "test"},
+        json={"key": key},
+    )
+    assert response.status_code == expected_status
+    assert response.json()["result"] is False
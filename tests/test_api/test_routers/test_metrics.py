@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_metrics(async_client):
+    response = await async_client.get("http://127.0.0.1:8000/api/metrics/")
+    assert response.status_code == 200
+    assert response.json().get("result") is True
+    assert set(response.json().get("auth_cache")) == {
+        "size", "negative_size", "hits", "negative_hits", "misses",
+    }
+    assert response.json().get("db_pool").get("checked_out") == 0
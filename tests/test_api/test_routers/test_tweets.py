@@ -1,5 +1,9 @@
+import json
+
 import pytest
 
+from api.core import settings
+
 
 @pytest.mark.parametrize(
     "tweet_id, expected_status, exp_response_json",
@@ -105,7 +109,147 @@ async def test_get_tweets(async_client):
     assert response.json().get("result") is True
     assert len(response.json().get("tweets")) == 6
     for tweet in response.json().get("tweets"):
-        assert tuple(tweet.keys()) == ("id", "content", "attachments", "author", "likes")
+        assert tuple(tweet.keys()) == (
+            "id", "content", "attachments", "media", "author", "like_count", "liked_by_me",
+        )
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_liked_by_me(async_client):
+    headers = {"Api-Key": "test"}
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+    )
+    liked_tweet_ids = {
+        tweet["id"] for tweet in response.json().get("tweets") if tweet["liked_by_me"]
+    }
+    assert liked_tweet_ids == {2}
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_pagination(async_client):
+    headers = {"Api-Key": "test"}
+    first_page = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"limit": 4},
+    )
+    next_cursor = first_page.json().get("next_cursor")
+    assert len(first_page.json().get("tweets")) == 4
+    assert next_cursor is not None
+
+    second_page = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"limit": 4, "cursor": next_cursor},
+    )
+    assert len(second_page.json().get("tweets")) == 2
+    assert second_page.json().get("next_cursor") is None
+
+    first_ids = {tweet["id"] for tweet in first_page.json().get("tweets")}
+    second_ids = {tweet["id"] for tweet in second_page.json().get("tweets")}
+    assert not first_ids & second_ids
+
+
+@pytest.mark.parametrize("limit", [4, 20])
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_sql_rendering(async_client, monkeypatch, limit):
+    headers = {"Api-Key": "test"}
+    orm_response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"limit": limit},
+    )
+    monkeypatch.setattr(settings, "feed_sql_rendering", True)
+    sql_response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"limit": limit},
+    )
+    assert sql_response.status_code == 200
+    assert sql_response.headers["content-type"] == "application/json"
+    assert sql_response.json() == orm_response.json()
+
+
+@pytest.mark.parametrize("limit", [4, None])
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_stream(async_client, limit):
+    headers = {"Api-Key": "test"}
+    params = {} if limit is None else {"limit": limit}
+    page_response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params=params,
+    )
+    stream_response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={**params, "stream": True},
+    )
+    assert stream_response.status_code == 200
+    assert stream_response.headers["content-type"] == "application/json"
+    assert stream_response.json() == page_response.json()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_stream_ndjson(async_client):
+    headers = {"Api-Key": "test", "Accept": "application/x-ndjson"}
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"stream": True},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    tweets = [json.loads(line) for line in response.text.splitlines()]
+    assert [tweet["id"] for tweet in tweets] == [6, 5, 4, 3, 2, 1]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_limit_too_large(async_client):
+    headers = {"Api-Key": "test"}
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"limit": settings.feed_max_page_size + 1},
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_stream_limit(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "feed_stream_max_size", 4)
+    headers = {"Api-Key": "test"}
+    capped = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"stream": True},
+    )
+    too_large = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"stream": True, "limit": 5},
+    )
+    assert [tweet["id"] for tweet in capped.json()["tweets"]] == [6, 5, 4, 3]
+    assert capped.json()["next_cursor"] is not None
+    assert too_large.status_code == 422
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_invalid_cursor(async_client):
+    headers = {"Api-Key": "test"}
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 422
+    assert response.json() == {
+        "result": False,
+        "error_type": "HTTPException",
+        "error_message": "Invalid cursor",
+    }
 
 
 @pytest.mark.parametrize(
@@ -129,6 +273,18 @@ async def test_get_tweets(async_client):
                 "tweet_id": 8,
             },
         ),  # Test with images
+        (
+            "Tweet with attached image",
+            [1, 3],
+            404,
+            {
+                "result": False,
+                "error_type": "HTTPException",
+                "error_message": (
+                    "Media doesn't exist, doesn't belong to you or is already attached"
+                ),
+            },
+        ),  # Test with an image attached to another tweet
         (
             "A" * 501,
             [3],
@@ -209,3 +365,69 @@ async def test_delete_tweet(async_client, tweet_id, expected_status, exp_respons
     )
     assert response.status_code == expected_status
     assert response.json() == exp_response_json
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_home_timeline(async_client):
+    headers = {"Api-Key": "test"}
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/home",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [tweet["id"] for tweet in response.json().get("tweets")] == [8, 7]
+    assert response.json().get("next_cursor") is None
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_by_ids(async_client):
+    headers = {"Api-Key": "test"}
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets",
+        headers=headers,
+        params={"ids": "8,999,7,8"},
+    )
+    too_many = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"ids": ",".join(str(num) for num in range(1, 502))},
+    )
+    assert response.status_code == 200
+    assert [tweet["id"] for tweet in response.json()["tweets"]] == [8, 7]
+    assert response.json()["tweets"][0]["author"] == {"id": 1, "name": "Aleksiy"}
+    assert response.json()["missing_ids"] == [999]
+    assert too_many.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"ids": "7,8", "limit": 1},  # test with a limit
+        {"ids": "7,8", "stream": "true"},  # test with streaming
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_by_ids_with_feed_params(async_client, params):
+    headers = {"Api-Key": "test"}
+    first_page = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"limit": 1},
+    )
+    with_cursor = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params={"ids": "7,8", "cursor": first_page.json()["next_cursor"]},
+    )
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/tweets/",
+        headers=headers,
+        params=params,
+    )
+    assert with_cursor.status_code == 422
+    assert response.json() == {
+        "result": False,
+        "error_type": "HTTPException",
+        "error_message": "ids cannot be combined with cursor, limit or stream.",
+    }
+    assert response.status_code == 422
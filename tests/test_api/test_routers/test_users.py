@@ -1,5 +1,9 @@
 import pytest
 
+from api.core import test_db_helper
+from api.db import users_qr
+from api.follow_suggestions import rebuild_social_graph
+
 
 @pytest.mark.parametrize(
     "api_key, exr_status_code, exp_response_json",
@@ -9,7 +13,16 @@ import pytest
             200,
             {
                 "result": True,
-                "user": {"id": 1, "name": "Aleksiy", "followers": [], "following": []},
+                "user": {
+                    "id": 1,
+                    "name": "Aleksiy",
+                    "followers": [],
+                    "following": [],
+                    "follower_count": 0,
+                    "following_count": 0,
+                    "followers_next_cursor": None,
+                    "following_next_cursor": None,
+                },
             },
         ),  # test with correct data
         (
@@ -80,6 +93,15 @@ async def test_current_user_profile(async_client, api_key, exr_status_code, exp_
                 "error_message": "User with id: 100 not found",
             },
         ),
+        (
+            1,
+            422,
+            {
+                "result": False,
+                "error_type": "HTTPException",
+                "error_message": "You can't subscribe to yourself",
+            },
+        ),  # try to subscribe to yourself
     ],
 )
 @pytest.mark.asyncio(scope="session")
@@ -155,7 +177,16 @@ async def test_delete_user_following_node(
             200,
             {
                 "result": True,
-                "user": {"id": 1, "name": "Aleksiy", "followers": [], "following": []},
+                "user": {
+                    "id": 1,
+                    "name": "Aleksiy",
+                    "followers": [],
+                    "following": [],
+                    "follower_count": 0,
+                    "following_count": 0,
+                    "followers_next_cursor": None,
+                    "following_next_cursor": None,
+                },
             },
         ),  # test with correct data
         (
@@ -176,3 +207,213 @@ async def test_user_profile(async_client, user_id, exr_status_code, exp_response
     )
     assert response.json() == exp_response_json
     assert response.status_code == exr_status_code
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_follow_lists_pagination(async_client):
+    headers = {"Api-Key": "test"}
+    for user_id in (2, 3, 4):
+        await async_client.post(
+            f"http://127.0.0.1:8000/api/users/{user_id}/follow", headers=headers,
+        )
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = await async_client.get(
+            "http://127.0.0.1:8000/api/users/1/following", params=params,
+        )
+        assert response.status_code == 200
+        pages.append([user["id"] for user in response.json()["users"]])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+    followers = await async_client.get(
+        "http://127.0.0.1:8000/api/users/3/followers", params={"limit": 1},
+    )
+    profile = await async_client.get("http://127.0.0.1:8000/api/users/me", headers=headers)
+    missing = await async_client.get("http://127.0.0.1:8000/api/users/100/followers")
+    too_long = await async_client.get(
+        "http://127.0.0.1:8000/api/users/1/followers", params={"limit": 1000},
+    )
+
+    for user_id in (2, 3, 4):
+        await async_client.delete(
+            f"http://127.0.0.1:8000/api/users/{user_id}/follow", headers=headers,
+        )
+
+    assert pages == [[2, 3], [4]]
+    assert followers.json() == {
+        "result": True,
+        "users": [{"id": 1, "name": "Aleksiy"}],
+        "next_cursor": None,
+    }
+    user = profile.json()["user"]
+    assert (user["following_count"], len(user["following"])) == (3, 3)
+    assert user["following_next_cursor"] is None
+    assert missing.status_code == 404
+    assert too_long.status_code == 422
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_follow_suggestions(async_client):
+    headers = {"Api-Key": "test"}
+    suggestions_url = "http://127.0.0.1:8000/api/users/me/suggestions"
+    follows = [(2, 4), (3, 4), (2, 5), (5, 1)]
+    session = test_db_helper.get_scoped_session()
+    for user_id in (2, 3):
+        await async_client.post(
+            f"http://127.0.0.1:8000/api/users/{user_id}/follow", headers=headers,
+        )
+    for follower_id, user_id in follows:
+        await users_qr.create_user_following_node(
+            session, user_id=user_id, follower_id=follower_id,
+        )
+
+    from_journal = await async_client.get(suggestions_url, headers=headers)
+    await rebuild_social_graph(session)
+    from_snapshot = await async_client.get(suggestions_url, headers=headers, params={"limit": 1})
+
+    for follower_id, user_id in follows:
+        await users_qr.delete_user_following_node(
+            session, user_id=user_id, follower_id=follower_id,
+        )
+    await session.close()
+    for user_id in (2, 3):
+        await async_client.delete(
+            f"http://127.0.0.1:8000/api/users/{user_id}/follow", headers=headers,
+        )
+    after_unfollow = await async_client.get(suggestions_url, headers=headers)
+
+    def ranking(response):
+        return [
+            (user["id"], user["mutual_count"], user["follows_you"])
+            for user in response.json()["users"]
+        ]
+
+    assert ranking(from_journal) == [(4, 2, False), (5, 1, True)]
+    assert ranking(from_snapshot) == [(4, 2, False)]
+    assert after_unfollow.json() == {"result": True, "users": []}
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_user_relationships(async_client):
+    headers = {"Api-Key": "test"}
+    session = test_db_helper.get_scoped_session()
+    await async_client.post("http://127.0.0.1:8000/api/users/2/follow", headers=headers)
+    await async_client.post("http://127.0.0.1:8000/api/users/3/follow", headers=headers)
+    await users_qr.create_user_following_node(session, user_id=1, follower_id=3)
+    await users_qr.create_user_following_node(session, user_id=1, follower_id=4)
+
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/users/relationships",
+        headers=headers,
+        params={"ids": "4,3,2,100"},
+    )
+    invalid = await async_client.get(
+        "http://127.0.0.1:8000/api/users/relationships",
+        headers=headers,
+        params={"ids": "4,x"},
+    )
+
+    await users_qr.delete_user_following_node(session, user_id=1, follower_id=3)
+    await users_qr.delete_user_following_node(session, user_id=1, follower_id=4)
+    await session.close()
+    await async_client.delete("http://127.0.0.1:8000/api/users/2/follow", headers=headers)
+    await async_client.delete("http://127.0.0.1:8000/api/users/3/follow", headers=headers)
+
+    assert response.json() == {
+        "result": True,
+        "relationships": {
+            "4": {"following": False, "followed_by": True, "mutual": False},
+            "3": {"following": True, "followed_by": True, "mutual": True},
+            "2": {"following": True, "followed_by": False, "mutual": False},
+            "100": {"following": False, "followed_by": False, "mutual": False},
+        },
+    }
+    assert invalid.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "ids, exr_status_code, exp_response_json",
+    [
+        (
+            [4, 2, 100, 4],
+            200,
+            {
+                "result": True,
+                "followed_count": 2,
+                "outcomes": {"4": "followed", "2": "followed", "100": "not_found"},
+            },
+        ),  # test with correct data
+        (
+            [2, 3],
+            200,
+            {
+                "result": True,
+                "followed_count": 1,
+                "outcomes": {"2": "already_following", "3": "followed"},
+            },
+        ),  # try to follow a user again
+        (
+            [1, 2],
+            200,
+            {
+                "result": True,
+                "followed_count": 0,
+                "outcomes": {"1": "self", "2": "already_following"},
+            },
+        ),  # try to follow yourself
+        (
+            [],
+            422,
+            {
+                "result": False,
+                "error_type": "too_short",
+                "error_message": "List should have at least 1 item after validation, not 0",
+            },
+        ),  # test with an empty list
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_create_user_following_nodes(
+    async_client, ids, exr_status_code, exp_response_json,
+):
+    headers = {"Api-Key": "test"}
+    response = await async_client.post(
+        "http://127.0.0.1:8000/api/users/follow",
+        headers=headers,
+        json={"ids": ids},
+    )
+    assert response.json() == exp_response_json
+    assert response.status_code == exr_status_code
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_bulk_followed_users_are_unfollowed(async_client):
+    headers = {"Api-Key": "test"}
+    for user_id in (2, 3, 4):
+        response = await async_client.delete(
+            f"http://127.0.0.1:8000/api/users/{user_id}/follow", headers=headers,
+        )
+        assert response.status_code == 200
+    profile = await async_client.get("http://127.0.0.1:8000/api/users/me", headers=headers)
+    assert profile.json()["user"]["following_count"] == 0
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_users(async_client):
+    headers = {"Api-Key": "test"}
+    response = await async_client.get(
+        "http://127.0.0.1:8000/api/users", headers=headers, params={"ids": "3,100,1"},
+    )
+    missing_ids = await async_client.get("http://127.0.0.1:8000/api/users/", headers=headers)
+    anonymous = await async_client.get(
+        "http://127.0.0.1:8000/api/users", params={"ids": "3,100,1"},
+    )
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()["users"]] == [3, 1]
+    assert response.json()["users"][1] == {"id": 1, "name": "Aleksiy"}
+    assert response.json()["missing_ids"] == [100]
+    assert missing_ids.status_code == 422
+    assert anonymous.status_code == 422
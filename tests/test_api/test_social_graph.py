@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from api import follow_suggestions
+from api.core import social_graph
+from api.core.social_graph import SocialGraph
+
+EDGES = [(1, 2), (1, 3), (2, 4), (2, 5), (3, 4), (4, 1), (5, 1)]
+
+
+def _build(directory):
+    graph = SocialGraph(str(directory))
+    with graph.rebuilding():
+        graph.write_snapshot(6, EDGES)
+    return graph
+
+
+def test_snapshot_suggestions(tmp_path):
+    graph = _build(tmp_path)
+    assert graph.following(1) == {2, 3}
+    assert graph.following(100) == set()
+    assert graph.suggest(1, limit=10) == [(4, 2, True), (5, 1, True)]
+    assert graph.suggest(3, limit=10) == [(1, 1, True)]
+    assert graph.suggest(1, limit=1) == [(4, 2, True)]
+
+
+def test_journal_is_shared_and_compacted(tmp_path):
+    graph = _build(tmp_path)
+    other_worker = SocialGraph(str(tmp_path))
+    graph.record(1, 5, followed=True)
+    graph.record(3, 4, followed=False)
+    graph.record(7, 1, followed=True)
+
+    assert other_worker.following(1) == {2, 3, 5}
+    assert other_worker.following(3) == set()
+    assert other_worker.suggest(1, limit=10) == [(4, 1, True)]
+    assert other_worker.pending_events() == 3
+
+    assert graph.compact()
+    assert other_worker.pending_events() == 0
+    assert other_worker.following(7) == {1}
+    assert other_worker.suggest(7, limit=10) == [(2, 1, False), (3, 1, False), (5, 1, False)]
+    assert other_worker.suggest(1, limit=10) == [(4, 1, True)]
+
+    graph.record(1, 5, followed=False)
+    assert other_worker.following(1) == {2, 3}
+    with graph.rebuilding():
+        assert os.path.getsize(graph.journal_path) == 0
+        assert not other_worker.compact()  # a rebuild is running
+        graph.write_snapshot(6, EDGES)
+    assert other_worker.suggest(1, limit=10) == [(4, 2, True), (5, 1, True)]
+
+
+def test_rebuild_if_missing(tmp_path):
+    graph = SocialGraph(str(tmp_path))
+    with graph.rebuilding(if_missing=True) as rebuilding:
+        assert rebuilding
+        graph.write_snapshot(6, EDGES)
+    graph.record(1, 5, followed=True)
+    with graph.rebuilding(if_missing=True) as rebuilding:
+        assert not rebuilding  # another worker built the snapshot meanwhile
+    assert graph.following(1) == {2, 3, 5}
+
+
+def test_record_many(tmp_path):
+    graph = _build(tmp_path)
+    graph.record_many([(1, 5, True), (1, 2, False)])
+    graph.record_many([])
+    assert graph.following(1) == {3, 5}
+    assert graph.pending_events() == 2
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_maintainer_retries_failed_build(tmp_path, monkeypatch):
+    attempts = []
+
+    async def build_in_new_session():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise OperationalError("SELECT 1", {}, ConnectionRefusedError())
+        with social_graph.rebuilding(if_missing=True):
+            social_graph.write_snapshot(6, EDGES)
+
+    async def wait_for_snapshot():
+        while not os.path.exists(social_graph.snapshot_path):
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(social_graph, "directory", str(tmp_path))
+    monkeypatch.setattr(follow_suggestions, "_build_in_new_session", build_in_new_session)
+    maintainer = asyncio.create_task(follow_suggestions.run_social_graph_maintainer(0.01))
+    try:
+        await asyncio.wait_for(wait_for_snapshot(), timeout=5)
+    finally:
+        maintainer.cancel()
+    assert attempts == [0, 1]
+    assert social_graph.following(1) == {2, 3}
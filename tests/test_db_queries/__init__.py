@@ -6,6 +6,8 @@ This package contains tests for testing database queries.
 Package components:
 1. test_likes_qr: Creating and deleting records in the database for liking tweets by users.
 2. test_medias_qr: Creating and updating records about attached images to tweets.
-3. test_tweets_qr: Testing CRUD operations for tweets.
-4. test_users_qr: Retrieving user data, creating, and deleting subscription records for other users.
+3. test_query_plans: Checking that no query falls back to a sequential scan on large data.
+4. test_timelines_qr: Reading home timelines and keeping them in sync with follows.
+5. test_tweets_qr: Testing CRUD operations for tweets.
+6. test_users_qr: Retrieving user data, creating, and deleting subscription records for other users.
 """
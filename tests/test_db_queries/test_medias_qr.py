@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 import pytest
 from sqlalchemy import select
 
@@ -9,23 +11,136 @@ from api.db import Image, medias_qr
 async def test_create_media():
     session = test_db_helper.get_scoped_session()
     test_file_name = "test_images/image.jpg"
-    image = await medias_qr.create_media(session=session, image_src=test_file_name)
+    image = await medias_qr.create_media(session=session, image_src=test_file_name, user_id=1)
     await session.commit()
     await session.close()
-    assert image.id == 2
+    assert image.id == 5
 
 
 @pytest.mark.asyncio(scope="session")
 async def test_update_data_medias():
     test_tweet_id = 2
     session = test_db_helper.get_scoped_session()
-    await medias_qr.update_data_medias(session=session, tweet_id=test_tweet_id, tweet_media_ids=[2])
+    foreign_ids = await medias_qr.update_data_medias(
+        session=session, tweet_id=test_tweet_id, tweet_media_ids=[5], user_id=2,
+    )
+    attached_ids = await medias_qr.update_data_medias(
+        session=session, tweet_id=test_tweet_id, tweet_media_ids=[5], user_id=1,
+    )
+    attached_again_ids = await medias_qr.update_data_medias(
+        session=session, tweet_id=test_tweet_id, tweet_media_ids=[5], user_id=1,
+    )
+    await session.commit()
     await session.close()
+    assert (foreign_ids, attached_ids, attached_again_ids) == ([], [5], [])
 
     stmt = select(Image).where(
-        Image.id == 2,
+        Image.id == 5,
         Image.src == "test_images/image.jpg",
     )
     image = await session.scalar(stmt)
     await session.close()
     assert image.tweet_id == test_tweet_id
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_create_media_reuses_src_of_same_content():
+    session = test_db_helper.get_scoped_session()
+    content_hash = "ab" * 32
+    first_image = await medias_qr.create_media(
+        session=session, image_src="tweets_images/first.jpg", content_hash=content_hash,
+    )
+    second_image = await medias_qr.create_media(
+        session=session, image_src="tweets_images/second.png", content_hash=content_hash,
+    )
+    await session.close()
+    assert first_image.id != second_image.id
+    assert second_image.src == "tweets_images/first.jpg"
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_delete_unattached_medias():
+    session = test_db_helper.get_scoped_session()
+    session.add(Image(src="tweets_images/expired.jpg", created_at=datetime(2020, 1, 1)))
+    await session.commit()
+    deleted_count = await medias_qr.delete_unattached_medias(
+        session=session, grace_period=timedelta(days=1), batch_size=10,
+    )
+    expired_image = await session.scalar(
+        select(Image).where(Image.src == "tweets_images/expired.jpg"),
+    )
+    await session.close()
+    assert deleted_count == 1
+    assert expired_image is None
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_take_file_deletions():
+    session = test_db_helper.get_scoped_session()
+    await medias_qr.queue_file_deletions(
+        session=session, image_srcs=["tweets_images/first.jpg"],  # still used by an image
+    )
+    await session.commit()
+    taken_count, unused_srcs = await medias_qr.take_file_deletions(session=session, batch_size=10)
+    next_taken_count, _ = await medias_qr.take_file_deletions(session=session, batch_size=10)
+    await session.close()
+    assert taken_count == 2
+    assert unused_srcs == ["tweets_images/expired.jpg"]
+    assert next_taken_count == 0
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_create_medias():
+    session = test_db_helper.get_scoped_session()
+    media_ids = await medias_qr.create_medias(
+        session=session,
+        images=[
+            {"image_src": "tweets_images/batch.jpg", "content_hash": "cd" * 32, "width": 10},
+            {"image_src": "tweets_images/batch_copy.png", "content_hash": "ab" * 32},
+            {"image_src": "tweets_images/batch.gif"},
+        ],
+    )
+    images = (await session.scalars(select(Image).where(Image.id.in_(media_ids)))).all()
+    await session.close()
+    srcs_by_id = {image.id: image.src for image in images}
+    assert len(media_ids) == 3
+    assert [srcs_by_id[media_id] for media_id in media_ids] == [
+        "tweets_images/batch.jpg",
+        "tweets_images/first.jpg",
+        "tweets_images/batch.gif",
+    ]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_resumable_upload():
+    session = test_db_helper.get_scoped_session()
+    upload_id = await medias_qr.create_upload(
+        session=session, user_id=1, file_name="video.gif", size=100, ttl=timedelta(days=1),
+    )
+    expired_id = await medias_qr.create_upload(
+        session=session, user_id=1, file_name="old.gif", size=100, ttl=timedelta(days=-1),
+    )
+    advanced = await medias_qr.advance_upload(
+        session=session, upload_id=upload_id, offset=0, new_offset=60,
+    )
+    advanced_twice = await medias_qr.advance_upload(
+        session=session, upload_id=upload_id, offset=0, new_offset=60,
+    )
+    upload = await medias_qr.get_upload(session=session, upload_id=upload_id, user_id=1)
+    foreign_upload = await medias_qr.get_upload(session=session, upload_id=upload_id, user_id=2)
+    expired_upload = await medias_qr.get_upload(
+        session=session, upload_id=expired_id, user_id=1,
+    )
+    deleted_ids = await medias_qr.delete_expired_uploads(session=session, batch_size=10)
+    await medias_qr.delete_upload(session=session, upload_id=upload_id)
+    await session.commit()
+    deleted_upload = await medias_qr.get_upload(
+        session=session, upload_id=upload_id, user_id=1,
+    )
+    await session.close()
+    assert (advanced, advanced_twice) == (True, False)
+    assert (upload.offset, upload.size, upload.file_name) == (60, 100, "video.gif")
+    assert foreign_upload is None
+    assert expired_upload is None
+    assert deleted_ids == [expired_id]
+    assert deleted_upload is None
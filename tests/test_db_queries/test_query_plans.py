@@ -0,0 +1,295 @@
+from datetime import timedelta
+from hashlib import md5
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.core import settings, test_db_helper
+from api.db import likes_qr, medias_qr, timelines_qr, tweets_qr, users_qr
+
+USERS_COUNT = 10000
+TWEETS_COUNT = 40000
+FIRST_USER_ID = 100001
+FIRST_TWEET_ID = 1000001
+VIEWER_ID = FIRST_USER_ID + 1
+CELEBRITY_ID = FIRST_USER_ID + 2
+PLAN_UPLOAD_ID = md5(b"5000").hexdigest()
+PLAN_UPLOAD_USER_ID = FIRST_USER_ID + 5000
+SERIAL_TABLES = ("users", "tweets", "images", "pending_file_deletions")
+EXPLAINABLE = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"))
+
+SEED_STATEMENTS = (
+    f"""
+    INSERT INTO users (id, name, api_key, follower_count, following_count)
+    SELECT {FIRST_USER_ID} + num, 'plan user ' || num, 'plan-key-' || num, 10, 10
+    FROM generate_series(0, {USERS_COUNT - 1}) AS num
+    """,
+    f"""
+    INSERT INTO user_followers (user_id, follower)
+    SELECT {FIRST_USER_ID} + (num + shift) % {USERS_COUNT}, {FIRST_USER_ID} + num
+    FROM generate_series(0, {USERS_COUNT - 1}) AS num, generate_series(1, 5) AS shift
+    """,
+    f"UPDATE users SET follower_count = 10000 WHERE id = {CELEBRITY_ID}",
+    f"""
+    INSERT INTO tweets (id, content, created_at, user_id, like_count)
+    SELECT {FIRST_TWEET_ID} + num, 'plan tweet ' || num,
+        now() - num * interval '1 minute', {FIRST_USER_ID} + num % {USERS_COUNT}, 2
+    FROM generate_series(0, {TWEETS_COUNT - 1}) AS num
+    """,
+    f"""
+    INSERT INTO tweet_likes (user_id, tweet_id)
+    SELECT {FIRST_USER_ID} + (num + shift) % {USERS_COUNT}, {FIRST_TWEET_ID} + num
+    FROM generate_series(0, {TWEETS_COUNT - 1}) AS num, generate_series(1, 2) AS shift
+    """,
+    f"""
+    INSERT INTO images (id, tweet_id, user_id, src)
+    SELECT {FIRST_TWEET_ID} + num, {FIRST_TWEET_ID} + num, {FIRST_USER_ID} + num % {USERS_COUNT},
+        'plan/' || num || '.jpg'
+    FROM generate_series(0, {TWEETS_COUNT - 1}, 3) AS num
+    """,
+    f"""
+    INSERT INTO home_timelines (user_id, tweet_id, author_id, created_at)
+    SELECT {FIRST_USER_ID} + (tweets.user_id - {FIRST_USER_ID} + shift) % {USERS_COUNT},
+        tweets.id, tweets.user_id, tweets.created_at
+    FROM tweets, generate_series(1, 2) AS shift
+    WHERE tweets.id >= {FIRST_TWEET_ID}
+    """,
+    f"""
+    UPDATE images SET created_at = now() - interval '2 days', tweet_id = NULL
+    WHERE id >= {FIRST_TWEET_ID} AND id % 10 = 0
+    """,
+    f"""
+    INSERT INTO pending_file_deletions (src, created_at)
+    SELECT 'plan/' || num || '.jpg', now() FROM generate_series(0, {TWEETS_COUNT - 1}, 4) AS num
+    """,
+    f"""
+    INSERT INTO media_uploads (id, user_id, file_name, size, "offset", expires_at)
+    SELECT md5(num::text), {FIRST_USER_ID} + num, 'plan.gif', 1000, 0,
+        now() + (num - 100) * interval '1 minute'
+    FROM generate_series(0, 9999) AS num
+    """,
+    """
+    ANALYZE users, user_followers, tweets, tweet_likes, images, home_timelines,
+        pending_file_deletions, media_uploads
+    """,
+)
+
+
+async def _read_sequences(conn) -> dict[str, tuple[int, bool]]:
+    states = {}
+    for table in SERIAL_TABLES:
+        sequence = await conn.scalar(text(f"SELECT pg_get_serial_sequence('{table}', 'id')"))
+        state = await conn.execute(text(f"SELECT last_value, is_called FROM {sequence}"))
+        states[sequence] = tuple(state.one())
+    return states
+
+
+async def _restore_sequences(conn, states: dict[str, tuple[int, bool]]) -> None:
+    for sequence, (last_value, is_called) in states.items():
+        await conn.execute(
+            text("SELECT setval(:sequence, :last_value, :is_called)"),
+            {"sequence": sequence, "last_value": last_value, "is_called": is_called},
+        )
+
+
+def _seq_scans(plan: dict) -> list[str]:
+    scans = []
+    if plan["Node Type"] == "Seq Scan":
+        scans.append(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        scans.extend(_seq_scans(subplan))
+    return scans
+
+
+async def _consume_edges(session):
+    async for _ in users_qr.stream_follow_edges(session):
+        continue
+
+
+async def _consume_stream(session, **kwargs):
+    async for _ in tweets_qr.stream_tweets(session, **kwargs):
+        continue
+
+
+QUERY_CALLS = {
+    "likes_qr.get_tweet_like": lambda session: likes_qr.get_tweet_like(
+        session, tweet_id=FIRST_TWEET_ID, user_id=VIEWER_ID,
+    ),
+    "likes_qr.create_tweet_like": lambda session: likes_qr.create_tweet_like(
+        session, tweet_id=FIRST_TWEET_ID + 10, current_user_id=VIEWER_ID,
+    ),
+    "likes_qr.delete_tweet_like": lambda session: likes_qr.delete_tweet_like(
+        session, tweet_id=FIRST_TWEET_ID + 10, current_user_id=VIEWER_ID,
+    ),
+    "likes_qr.get_like_state": lambda session: likes_qr.get_like_state(
+        session, tweet_id=FIRST_TWEET_ID, user_id=VIEWER_ID,
+    ),
+    "likes_qr.apply_like_changes": lambda session: likes_qr.apply_like_changes(
+        session,
+        likes=[(VIEWER_ID, FIRST_TWEET_ID + 11), (VIEWER_ID, FIRST_TWEET_ID + 12)],
+        unlikes=[(VIEWER_ID, FIRST_TWEET_ID + 11), (VIEWER_ID + 1, FIRST_TWEET_ID + 12)],
+    ),
+    "likes_qr.reconcile_like_counts": lambda session: likes_qr.reconcile_like_counts(
+        session, batch_size=2000,
+    ),
+    "medias_qr.create_media": lambda session: medias_qr.create_media(
+        session, image_src="plan/new.jpg",
+    ),
+    "medias_qr.create_medias": lambda session: medias_qr.create_medias(
+        session,
+        images=[
+            {"image_src": "plan/new.jpg", "content_hash": "ab" * 32},
+            {"image_src": "plan/other.jpg", "content_hash": "cd" * 32},
+        ],
+    ),
+    "medias_qr.create_upload": lambda session: medias_qr.create_upload(
+        session, user_id=VIEWER_ID, file_name="plan.gif", size=1000, ttl=timedelta(days=1),
+    ),
+    "medias_qr.get_upload": lambda session: medias_qr.get_upload(
+        session, upload_id=PLAN_UPLOAD_ID, user_id=PLAN_UPLOAD_USER_ID,
+    ),
+    "medias_qr.advance_upload": lambda session: medias_qr.advance_upload(
+        session, upload_id=PLAN_UPLOAD_ID, offset=0, new_offset=500,
+    ),
+    "medias_qr.delete_upload": lambda session: medias_qr.delete_upload(
+        session, upload_id=PLAN_UPLOAD_ID,
+    ),
+    "medias_qr.delete_expired_uploads": lambda session: medias_qr.delete_expired_uploads(
+        session, batch_size=50,
+    ),
+    "medias_qr.get_media": lambda session: medias_qr.get_media(
+        session, media_id=FIRST_TWEET_ID,
+    ),
+    "medias_qr.delete_unattached_medias": lambda session: medias_qr.delete_unattached_medias(
+        session, grace_period=timedelta(days=1), batch_size=500,
+    ),
+    "medias_qr.queue_file_deletions": lambda session: medias_qr.queue_file_deletions(
+        session, image_srcs=["plan/1.jpg", "plan/new.jpg"],
+    ),
+    "medias_qr.take_file_deletions": lambda session: medias_qr.take_file_deletions(
+        session, batch_size=50,
+    ),
+    "medias_qr.update_data_medias": lambda session: medias_qr.update_data_medias(
+        session,
+        tweet_id=FIRST_TWEET_ID + 1,
+        tweet_media_ids=[FIRST_TWEET_ID + 3],
+        user_id=VIEWER_ID,
+    ),
+    "timelines_qr.backfill_home_timelines": lambda session: timelines_qr.backfill_home_timelines(
+        session, batch_size=100,
+    ),
+    "timelines_qr.get_home_timeline_page": lambda session: timelines_qr.get_home_timeline_page(
+        session, user_id=VIEWER_ID, limit=settings.feed_page_size,
+    ),
+    "tweets_qr.get_tweet": lambda session: tweets_qr.get_tweet(
+        session, tweet_id=FIRST_TWEET_ID,
+    ),
+    "tweets_qr.get_tweets_page": lambda session: tweets_qr.get_tweets_page(
+        session, limit=settings.feed_page_size, viewer_id=VIEWER_ID,
+    ),
+    "tweets_qr.get_tweets_by_ids": lambda session: tweets_qr.get_tweets_by_ids(
+        session, tweet_ids=[FIRST_TWEET_ID, FIRST_TWEET_ID + 10, 1], viewer_id=VIEWER_ID,
+    ),
+    "tweets_qr.stream_tweets": lambda session: _consume_stream(
+        session, viewer_id=VIEWER_ID, limit=settings.feed_page_size,
+    ),
+    "tweets_qr.get_tweets_page_json": lambda session: tweets_qr.get_tweets_page_json(
+        session, limit=settings.feed_page_size, viewer_id=VIEWER_ID,
+    ),
+    "tweets_qr.create_tweet": lambda session: tweets_qr.create_tweet(
+        session,
+        tweet_content="plan",
+        current_user_id=VIEWER_ID,
+        tweet_media_ids=[FIRST_TWEET_ID + 10, FIRST_TWEET_ID + 20],
+    ),
+    "tweets_qr.delete_tweet": lambda session: tweets_qr.delete_tweet(
+        session, tweet_id=FIRST_TWEET_ID + 1, current_user_id=VIEWER_ID,
+    ),
+    "users_qr.get_user_by_id": lambda session: users_qr.get_user_by_id(
+        session, user_id=VIEWER_ID,
+    ),
+    "users_qr.get_current_user": lambda session: users_qr.get_current_user(
+        session, api_key="plan-key-1",
+    ),
+    "users_qr.get_full_user_info_by_id": lambda session: users_qr.get_full_user_info_by_id(
+        session, user_id=VIEWER_ID, page_size=20,
+    ),
+    "users_qr.get_relationships": lambda session: users_qr.get_relationships(
+        session, user_id=VIEWER_ID, other_ids=list(range(FIRST_USER_ID, FIRST_USER_ID + 200)),
+    ),
+    "users_qr.get_users_by_ids": lambda session: users_qr.get_users_by_ids(
+        session, user_ids=[VIEWER_ID, CELEBRITY_ID],
+    ),
+    "users_qr.stream_follow_edges": lambda session: _consume_edges(session),
+    "users_qr.get_followers_page": lambda session: users_qr.get_followers_page(
+        session, user_id=VIEWER_ID, limit=20, cursor=FIRST_USER_ID,
+    ),
+    "users_qr.get_following_page": lambda session: users_qr.get_following_page(
+        session, user_id=VIEWER_ID, limit=20, cursor=FIRST_USER_ID,
+    ),
+    "users_qr.create_user_following_node": lambda session: users_qr.create_user_following_node(
+        session, user_id=FIRST_USER_ID + 100, follower_id=VIEWER_ID,
+    ),
+    "users_qr.delete_user_following_node": lambda session: users_qr.delete_user_following_node(
+        session, user_id=FIRST_USER_ID + 100, follower_id=VIEWER_ID,
+    ),
+    "users_qr.create_user_following_nodes": lambda session: (
+        users_qr.create_user_following_nodes(
+            session,
+            follower_id=VIEWER_ID,
+            user_ids=list(range(FIRST_USER_ID + 100, FIRST_USER_ID + 150)) + [CELEBRITY_ID],
+        )
+    ),
+    "users_qr.reconcile_follow_counts": lambda session: users_qr.reconcile_follow_counts(
+        session, batch_size=1000,
+    ),
+}
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_query_plans_use_indexes():
+    async with test_db_helper.engine.connect() as conn:
+        sequences = await _read_sequences(conn)
+        await conn.commit()
+        transaction = await conn.begin()
+        for statement in SEED_STATEMENTS:
+            await conn.execute(text(statement))
+
+        executed: list[tuple[str, str, tuple]] = []
+        current_call = [""]
+
+        def capture(connection, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().split(None, 1)[0].upper() in EXPLAINABLE:
+                if executemany and isinstance(parameters, list):
+                    # Batches of "insertmanyvalues" already come as one flat row.
+                    parameters = parameters[0]
+                executed.append((current_call[0], statement, parameters))
+
+        session = AsyncSession(
+            bind=conn,
+            join_transaction_mode="create_savepoint",
+            expire_on_commit=False,
+        )
+        event.listen(conn.sync_connection, "before_cursor_execute", capture)
+        for query_name, query_call in QUERY_CALLS.items():
+            current_call[0] = query_name
+            await query_call(session)
+        event.remove(conn.sync_connection, "before_cursor_execute", capture)
+        await session.close()
+
+        seq_scans: dict[str, set[str]] = {}
+        for call_name, statement, parameters in executed:
+            plan = await conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}",
+                parameters,
+            )
+            scanned_tables = _seq_scans(plan.scalar()[0]["Plan"])
+            if scanned_tables:
+                seq_scans.setdefault(call_name, set()).update(scanned_tables)
+
+        await transaction.rollback()
+        await _restore_sequences(conn, sequences)
+        await conn.commit()
+
+    assert seq_scans == {}
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import delete, select, tuple_
+
+from api.core import settings, test_db_helper
+from api.db import TimelineEntry, timelines_qr, users_qr
+
+
+@pytest.mark.parametrize(
+    "fanout_threshold",
+    [
+        5000,  # the followed user is fanned out on write
+        0,  # the followed user is merged into the timeline at read time
+    ],
+)
+@pytest.mark.asyncio(scope="session")
+async def test_home_timeline_follow_and_unfollow(monkeypatch, fanout_threshold):
+    monkeypatch.setattr(settings, "timeline_fanout_threshold", fanout_threshold)
+    session = test_db_helper.get_scoped_session()
+
+    await users_qr.create_user_following_node(session=session, follower_id=3, user_id=2)
+    followed_tweets, _ = await timelines_qr.get_home_timeline_page(
+        session=session, user_id=3, limit=10,
+    )
+    await users_qr.delete_user_following_node(session=session, follower_id=3, user_id=2)
+    unfollowed_tweets, _ = await timelines_qr.get_home_timeline_page(
+        session=session, user_id=3, limit=10,
+    )
+    await session.close()
+
+    assert {tweet.user_id for tweet in followed_tweets} == {2}
+    assert unfollowed_tweets == []
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_home_timeline_page_cursor():
+    session = test_db_helper.get_scoped_session()
+    first_page, first_has_more = await timelines_qr.get_home_timeline_page(
+        session=session, user_id=1, limit=1,
+    )
+    last_tweet = first_page[-1]
+    second_page, second_has_more = await timelines_qr.get_home_timeline_page(
+        session=session, user_id=1, limit=1, cursor=(last_tweet.created_at, last_tweet.id),
+    )
+    await session.close()
+
+    assert [tweet.id for tweet in first_page] == [8]
+    assert first_has_more is True
+    assert [tweet.id for tweet in second_page] == [7]
+    assert second_has_more is False
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_backfill_home_timelines(monkeypatch):
+    monkeypatch.setattr(settings, "timeline_backfill_size", 1)
+    session = test_db_helper.get_scoped_session()
+    entries = set(await session.execute(select(TimelineEntry.user_id, TimelineEntry.tweet_id)))
+    await users_qr.create_user_following_node(session=session, follower_id=3, user_id=1)
+    inserted = await timelines_qr.backfill_home_timelines(session=session, batch_size=2)
+    inserted_again = await timelines_qr.backfill_home_timelines(session=session)
+    timeline, _ = await timelines_qr.get_home_timeline_page(session=session, user_id=3, limit=10)
+    await users_qr.delete_user_following_node(session=session, follower_id=3, user_id=1)
+    await session.execute(
+        delete(TimelineEntry).where(
+            tuple_(TimelineEntry.user_id, TimelineEntry.tweet_id).not_in(entries),
+        ),
+    )
+    await session.commit()
+    await session.close()
+
+    assert inserted > 0
+    assert inserted_again == 0
+    assert [(tweet.id, tweet.user_id) for tweet in timeline] == [(8, 1), (3, 3)]
@@ -1,8 +1,23 @@
+import json
+from datetime import datetime
+
 import pytest
-from sqlalchemy import select
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from api.core import test_db_helper
-from api.db import Tweet, tweets_qr
+from api.db import (
+    Base,
+    Image,
+    PendingFileDeletion,
+    Tweet,
+    TweetLike,
+    User,
+    likes_qr,
+    medias_qr,
+    tweets_qr,
+    users_qr,
+)
 
 
 @pytest.mark.asyncio(scope="session")
@@ -15,6 +30,153 @@ async def test_get_all_tweets():
     assert len(result) == 7
 
 
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_page():
+    session = test_db_helper.get_scoped_session()
+    first_page, first_has_more = await tweets_qr.get_tweets_page(session=session, limit=5)
+    last_tweet = first_page[-1]
+    second_page, second_has_more = await tweets_qr.get_tweets_page(
+        session=session, limit=5, cursor=(last_tweet.created_at, last_tweet.id),
+    )
+    await session.close()
+
+    assert len(first_page) == 5
+    assert first_has_more is True
+    assert len(second_page) == 2
+    assert second_has_more is False
+    assert [tweet.id for tweet in first_page] == sorted(
+        (tweet.id for tweet in first_page), reverse=True,
+    )
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_tweets_page_json_sqlite():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session = async_sessionmaker(engine, expire_on_commit=False)()
+    thumbnail = {"src": "tweets_images/b_thumbnail.webp", "width": 160, "height": 120}
+    session.add_all(
+        [
+            User(id=1, name="Alice", api_key="alice"),
+            User(id=2, name="Bob", api_key="bob"),
+            Tweet(id=1, content="first", user_id=1, created_at=datetime(2024, 1, 1)),
+            Tweet(id=2, content="second", user_id=2, created_at=datetime(2024, 1, 2), like_count=1),
+            Tweet(id=3, content="third", user_id=1, created_at=datetime(2024, 1, 3)),
+            TweetLike(user_id=1, tweet_id=2),
+            Image(id=1, tweet_id=2, src="tweets_images/a.jpg"),
+            Image(
+                id=2,
+                tweet_id=2,
+                src="tweets_images/b.jpg",
+                width=800,
+                height=600,
+                variants={"thumbnail": thumbnail},
+            ),
+        ],
+    )
+    await session.commit()
+
+    first_page, last_key = await tweets_qr.get_tweets_page_json(
+        session=session, limit=2, viewer_id=1,
+    )
+    second_page, no_key = await tweets_qr.get_tweets_page_json(
+        session=session, limit=2, cursor=last_key, viewer_id=1,
+    )
+    await session.close()
+    await engine.dispose()
+
+    assert json.loads(first_page) == [
+        {
+            "id": 3,
+            "content": "third",
+            "attachments": [],
+            "media": [],
+            "author": {"id": 1, "name": "Alice"},
+            "like_count": 0,
+            "liked_by_me": False,
+        },
+        {
+            "id": 2,
+            "content": "second",
+            "attachments": ["tweets_images/a.jpg", "tweets_images/b.jpg"],
+            "media": [
+                {"src": "tweets_images/a.jpg", "width": None, "height": None, "variants": {}},
+                {
+                    "src": "tweets_images/b.jpg",
+                    "width": 800,
+                    "height": 600,
+                    "variants": {"thumbnail": thumbnail},
+                },
+            ],
+            "author": {"id": 2, "name": "Bob"},
+            "like_count": 1,
+            "liked_by_me": True,
+        },
+    ]
+    assert last_key == (datetime(2024, 1, 2), 2)
+    assert [tweet["id"] for tweet in json.loads(second_page)] == [1]
+    assert no_key is None
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_write_paths_sqlite():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session = async_sessionmaker(engine, expire_on_commit=False)()
+    session.add_all(
+        [
+            User(id=1, name="Alice", api_key="alice"),
+            User(id=2, name="Bob", api_key="bob"),
+            Tweet(id=1, content="first", user_id=1, created_at=datetime(2024, 1, 1)),
+            Image(id=1, tweet_id=1, src="tweets_images/a.jpg"),
+        ],
+    )
+    await session.commit()
+
+    like_results = [
+        await likes_qr.create_tweet_like(session, tweet_id=1, current_user_id=2),
+        await likes_qr.create_tweet_like(session, tweet_id=1, current_user_id=2),
+        await likes_qr.create_tweet_like(session, tweet_id=5, current_user_id=2),
+    ]
+    like_count = await session.scalar(select(Tweet.like_count).where(Tweet.id == 1))
+    unlike_results = [
+        await likes_qr.delete_tweet_like(session, tweet_id=1, current_user_id=2),
+        await likes_qr.delete_tweet_like(session, tweet_id=1, current_user_id=2),
+    ]
+    follow_results = [
+        await users_qr.create_user_following_node(session, user_id=1, follower_id=2),
+        await users_qr.create_user_following_node(session, user_id=1, follower_id=2),
+        await users_qr.create_user_following_node(session, user_id=5, follower_id=2),
+    ]
+    follow_counts = (
+        await session.execute(select(User.follower_count, User.following_count).order_by(User.id))
+    ).all()
+    unfollow_results = [
+        await users_qr.delete_user_following_node(session, user_id=1, follower_id=2),
+        await users_qr.delete_user_following_node(session, user_id=1, follower_id=2),
+    ]
+    delete_results = [
+        await tweets_qr.delete_tweet(session, tweet_id=1, current_user_id=2),
+        await tweets_qr.delete_tweet(session, tweet_id=1, current_user_id=1),
+    ]
+    queued_srcs = list(await session.scalars(select(PendingFileDeletion.src)))
+    await session.close()
+    await engine.dispose()
+
+    assert like_results == [True, False, False]
+    assert like_count == 1
+    assert unlike_results == [True, False]
+    assert follow_results == [True, False, None]
+    assert follow_counts == [(1, 0), (0, 1)]
+    assert unfollow_results == [True, False]
+    assert delete_results == [False, True]
+    assert queued_srcs == ["tweets_images/a.jpg"]
+
+
 @pytest.mark.asyncio(scope="session")
 async def test_create_tweet():
     session = test_db_helper.get_scoped_session()
@@ -29,14 +191,14 @@ async def test_create_tweet():
     test_tweet = await session.scalar(stmt)
     await session.close()
 
-    assert result == 9
+    assert result == 10
     assert test_tweet.content == "Some text"
 
 
 @pytest.mark.parametrize(
     "tweet_id, user_id, exp_result",
     [
-        (9, 2, True),
+        (10, 2, True),
         (20, 2, False),
     ],
 )
@@ -48,3 +210,55 @@ async def test_delete_tweet(tweet_id, user_id, exp_result):
     )
     await session.close()
     assert result == exp_result
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_delete_tweet_queues_image_files():
+    session = test_db_helper.get_scoped_session()
+    image = await medias_qr.create_media(
+        session=session, image_src="tweets_images/deleted.jpg", user_id=2,
+    )
+    await session.commit()
+    tweet_id = await tweets_qr.create_tweet(
+        session=session,
+        tweet_content="With image",
+        current_user_id=2,
+        tweet_media_ids=[image.id],
+    )
+    assert await session.scalar(select(Image.tweet_id).where(Image.id == image.id)) == tweet_id
+    await tweets_qr.delete_tweet(session=session, tweet_id=tweet_id, current_user_id=2)
+
+    queued_srcs = set(await session.scalars(select(PendingFileDeletion.src)))
+    remaining_image = await session.scalar(select(Image).where(Image.id == image.id))
+    await session.close()
+    assert "tweets_images/deleted.jpg" in queued_srcs
+    assert remaining_image is None
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_create_tweet_rejects_unavailable_media():
+    session = test_db_helper.get_scoped_session()
+    foreign_image = await medias_qr.create_media(
+        session=session, image_src="tweets_images/foreign.jpg", user_id=1,
+    )
+    own_image = await medias_qr.create_media(
+        session=session, image_src="tweets_images/own.jpg", user_id=2,
+    )
+    await session.commit()
+    own_image_id = own_image.id
+    tweets_count = await session.scalar(select(func.count(Tweet.id)))
+
+    result = await tweets_qr.create_tweet(
+        session=session,
+        tweet_content="Not my image",
+        current_user_id=2,
+        tweet_media_ids=[own_image_id, foreign_image.id],
+    )
+    own_image_tweet_id = await session.scalar(
+        select(Image.tweet_id).where(Image.id == own_image_id),
+    )
+    tweets_count_after = await session.scalar(select(func.count(Tweet.id)))
+    await session.close()
+    assert result is None
+    assert own_image_tweet_id is None
+    assert tweets_count_after == tweets_count
@@ -1,7 +1,8 @@
 import pytest
+from sqlalchemy import func, select, update
 
 from api.core import test_db_helper
-from api.db import User, users_qr
+from api.db import TimelineEntry, Tweet, User, users_qr
 
 
 @pytest.mark.parametrize(
@@ -53,6 +54,7 @@ async def test_get_full_user_info_user_by_id(id, user_data):
     [
         (1, 2, True),  # try to create a new user following record
         (1, 2, False),  # try to create a record again with the same data
+        (1, 100, None),  # try to follow a non-existent user
     ],
 )
 @pytest.mark.asyncio(scope="session")
@@ -63,8 +65,12 @@ async def test_create_user_following_node(follower_id, user_id, exp_result):
         follower_id=follower_id,
         user_id=user_id,
     )
+    follower = await users_qr.get_user_by_id(session, follower_id)
+    user = await users_qr.get_user_by_id(session, 2)
     await session.close()
     assert result == exp_result
+    assert follower.following_count == 1
+    assert user.follower_count == 1
 
 
 @pytest.mark.parametrize(
@@ -84,3 +90,48 @@ async def test_delete_user_following_node(follower_id, user_id, exp_result):
     )
     await session.close()
     assert result == exp_result
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_create_user_following_nodes():
+    session = test_db_helper.get_scoped_session()
+    outcomes = await users_qr.create_user_following_nodes(
+        session, follower_id=6, user_ids=[4, 100, 3],
+    )
+    outcomes_again = await users_qr.create_user_following_nodes(
+        session, follower_id=6, user_ids=[3, 5, 6],
+    )
+    counts = (
+        await session.execute(
+            select(User.id, User.follower_count, User.following_count)
+            .where(User.id.in_([3, 4, 5, 6]))
+            .order_by(User.id),
+        )
+    ).all()
+    timeline_size = await session.scalar(
+        select(func.count()).select_from(TimelineEntry).where(TimelineEntry.user_id == 6),
+    )
+    authored_size = await session.scalar(
+        select(func.count()).select_from(Tweet).where(Tweet.user_id.in_([3, 4, 5])),
+    )
+    for user_id in (3, 4, 5):
+        await users_qr.delete_user_following_node(session, follower_id=6, user_id=user_id)
+    await session.close()
+
+    assert list(outcomes.items()) == [(4, "followed"), (100, "not_found"), (3, "followed")]
+    assert outcomes_again == {3: "already_following", 5: "followed", 6: "self"}
+    assert counts == [(3, 1, 0), (4, 1, 0), (5, 1, 0), (6, 0, 3)]
+    assert timeline_size == authored_size
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_reconcile_follow_counts():
+    session = test_db_helper.get_scoped_session()
+    await session.execute(update(User).where(User.id == 3).values(follower_count=7))
+    await session.commit()
+    repaired = await users_qr.reconcile_follow_counts(session=session)
+    user = await users_qr.get_user_by_id(session, 3)
+    await session.close()
+
+    assert repaired == 1
+    assert user.follower_count == 0